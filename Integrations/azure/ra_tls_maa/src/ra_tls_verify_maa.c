@@ -22,13 +22,18 @@
  * {instanceUrl} is the attestation provider URL, e.g. `shareduks.uks.attest.azure.net`.
  *
  * This file is part of the RA-TLS verification library which is typically linked into client
- * applications. This library is *not* thread-safe.
+ * applications. Verifications may run concurrently in multiple threads: curl is initialized only
+ * once, connections to MAA are kept alive in a pool of curl handles, and DNS results and TLS
+ * sessions are shared between these handles. Note however that the RA_TLS_MAA_* environment
+ * variables exposed on successful verification are process-wide.
  */
 
 #define _GNU_SOURCE
 #include <assert.h>
 #include <ctype.h>
 #include <errno.h>
+#include <inttypes.h>
+#include <pthread.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -54,8 +59,18 @@ extern verify_measurements_cb_t g_verify_measurements_cb;
         fprintf(stderr, "%s: " fmt, __FUNCTION__, ##__VA_ARGS__); \
     } while (0)
 
+#define INFO(fmt, ...)                            \
+    do {                                          \
+        fprintf(stderr, fmt, ##__VA_ARGS__);      \
+    } while (0)
+
 #define RA_TLS_MAA_PROVIDER_URL         "RA_TLS_MAA_PROVIDER_URL"
 #define RA_TLS_MAA_PROVIDER_API_VERSION "RA_TLS_MAA_PROVIDER_API_VERSION"
+#define RA_TLS_MAA_JWKS_CACHE_TTL       "RA_TLS_MAA_JWKS_CACHE_TTL"
+#define RA_TLS_MAA_VERDICT_CACHE_SIZE   "RA_TLS_MAA_VERDICT_CACHE_SIZE"
+#define RA_TLS_MAA_VERDICT_CACHE_TTL    "RA_TLS_MAA_VERDICT_CACHE_TTL"
+#define RA_TLS_MAA_TIMING               "RA_TLS_MAA_TIMING"
+#define RA_TLS_MAA_EXPOSE_JWT           "RA_TLS_MAA_EXPOSE_JWT"
 
 #define MAA_URL_MAX_SIZE 256
 
@@ -68,20 +83,131 @@ extern verify_measurements_cb_t g_verify_measurements_cb;
 /** Default API version for MAA API endpoints. */
 #define DEFAULT_MAA_PROVIDER_API_VERSION "2022-08-01"
 
-/* Environment variables exposed by successful RA-TLS verification API */
+/** Maximum number of idle MAA contexts (each with its own kept-alive connection) kept for reuse. */
+#define MAA_CONTEXT_POOL_MAX_SIZE 16
+
+/** Default time (in seconds) for which the set of JWKs fetched from MAA is cached. */
+#define DEFAULT_MAA_JWKS_CACHE_TTL 300
+
+/** Default maximum number of cached MAA verdicts (verdict cache is disabled by default). */
+#define DEFAULT_MAA_VERDICT_CACHE_SIZE 0
+
+/** Default maximum time (in seconds) for which an MAA verdict is cached (never longer than the
+ * validity of the MAA JWT). */
+#define DEFAULT_MAA_VERDICT_CACHE_TTL 300
+
+/** Default for timing instrumentation of verifications (disabled by default). */
+#define DEFAULT_MAA_TIMING 0
+
+/** Default for exposing the JWT in environment variables (disabled by default, not thread-safe). */
+#define DEFAULT_MAA_EXPOSE_JWT 0
+
+/* Environment variables exposed by successful RA-TLS verification API (if enabled via
+ * RA_TLS_MAA_EXPOSE_JWT) */
 #define RA_TLS_MAA_JWT "RA_TLS_MAA_JWT"
 #define RA_TLS_MAA_SET_OF_JWKS "RA_TLS_MAA_SET_OF_JWKS"
 
 static char* g_maa_base_url = NULL;
 static char* g_maa_api_version = NULL;
+static long g_maa_jwks_cache_ttl = -1;
+static long g_maa_verdict_cache_size = -1;
+static long g_maa_verdict_cache_ttl = -1;
+static long g_maa_expose_jwt = -1;
+static long g_maa_timing = -1;
+
+/*! Cumulative timings (in microseconds) of one kind of HTTPS requests sent to MAA (exported) */
+struct ra_tls_maa_request_timing {
+    uint64_t count;           /*!< number of sent requests (including failed ones) */
+    uint64_t new_connections; /*!< number of newly opened connections (not reused ones) */
+    uint64_t dns_us;          /*!< name resolution */
+    uint64_t connect_us;      /*!< TCP connection establishment */
+    uint64_t tls_us;          /*!< TLS handshake */
+    uint64_t server_us;       /*!< from sending the request until the first byte of response */
+    uint64_t transfer_us;     /*!< receiving the response */
+    uint64_t total_us;        /*!< whole request, including all of the above */
+};
+
+/*! Cumulative timing statistics of RA-TLS verifications (exported) */
+struct ra_tls_maa_timing_stats {
+    uint64_t verifications;                  /*!< number of verifications (including failed) */
+    uint64_t verification_us;                /*!< time spent in verifications */
+    uint64_t local_us;                       /*!< time spent outside of HTTPS requests */
+    struct ra_tls_maa_request_timing attest; /*!< `attest/` requests */
+    struct ra_tls_maa_request_timing certs;  /*!< `certs/` requests */
+};
+
+/* exported functions (see README), declared here to satisfy -Wmissing-prototypes */
+void ra_tls_maa_get_verdict_cache_stats(uint64_t* out_hits, uint64_t* out_misses,
+                                        uint64_t* out_evictions, size_t* out_entries);
+void ra_tls_maa_get_timing_stats(struct ra_tls_maa_timing_stats* out_stats);
+const char* ra_tls_maa_get_jwt(void);
+const char* ra_tls_maa_get_set_of_jwks(void);
 
-/*! Context used in maa_*() calls */
+/*! Context used in maa_*() calls; contexts are reused across verifications (see maa_init()) */
 struct maa_context {
-    bool curl_global_init_done;
     CURL* curl;                 /*!< CURL context for this session */
     struct curl_slist* headers; /*!< Request headers sent to MAA attestation provider */
+    uint64_t network_us;        /*!< time spent in HTTPS requests in the current verification */
+    struct maa_context* next;   /*!< next idle context in the pool */
+};
+
+/* one-time global initialization (environment variables, curl), protected by `g_maa_init_lock` */
+static pthread_mutex_t g_maa_init_lock = PTHREAD_MUTEX_INITIALIZER;
+static bool g_maa_init_done = false;
+
+/* DNS cache and TLS sessions shared by all curl handles */
+static CURLSH* g_maa_curl_share = NULL;
+static pthread_mutex_t g_maa_curl_share_locks[CURL_LOCK_DATA_LAST];
+
+/* idle MAA contexts (with their kept-alive connections), protected by `g_maa_context_pool_lock` */
+static pthread_mutex_t g_maa_context_pool_lock = PTHREAD_MUTEX_INITIALIZER;
+static struct maa_context* g_maa_context_pool = NULL;
+static size_t g_maa_context_pool_size = 0;
+
+/*! JWK from the MAA set of JWKs, with its X.509 certificate already parsed */
+struct maa_jwk {
+    char* kid;            /*!< key ID, as referenced in the `kid` field of JWT header */
+    mbedtls_x509_crt crt; /*!< parsed X.509 certificate from the `x5c` field */
+};
+
+/*! Parsed set of JWKs, as received from MAA attestation provider's `certs/` API endpoint */
+struct maa_jwks {
+    char* set_of_jwks;    /*!< set of JWKs (JSON string) */
+    struct maa_jwk* keys; /*!< parsed JWKs */
+    size_t keys_cnt;      /*!< number of items in \a keys */
+    time_t fetch_time;    /*!< time when the set of JWKs was fetched from MAA */
+};
+
+/*! Process-wide cache of the set of JWKs, protected by `g_maa_jwks_lock`; JWT signatures are
+ * verified under this lock too, because mbedTLS public-key contexts must not be used
+ * concurrently */
+static struct maa_jwks* g_maa_jwks = NULL;
+static pthread_mutex_t g_maa_jwks_lock = PTHREAD_MUTEX_INITIALIZER;
+
+/*! Cached verdict of a successful verification of an SGX quote by MAA */
+struct maa_verdict {
+    uint8_t key[32];             /*!< SHA256 hash over SGX quote and MAA provider URL/version */
+    sgx_quote_body_t quote_body; /*!< SGX quote body constructed from the MAA JWT payload */
+    char* jwt;                   /*!< MAA JWT (base64url-encoded string) */
+    char* set_of_jwks;           /*!< set of JWKs used to verify the JWT (JSON string) */
+    time_t expiration_time;      /*!< verdict isn't used after this time (at latest, JWT's `exp`) */
+    struct maa_verdict* prev;    /*!< more recently used verdict */
+    struct maa_verdict* next;    /*!< less recently used verdict */
 };
 
+/* LRU cache of MAA verdicts, protected by `g_maa_verdict_cache_lock` */
+static pthread_mutex_t g_maa_verdict_cache_lock = PTHREAD_MUTEX_INITIALIZER;
+static struct maa_verdict* g_maa_verdict_cache_head = NULL; /* most recently used */
+static struct maa_verdict* g_maa_verdict_cache_tail = NULL; /* least recently used */
+static size_t g_maa_verdict_cache_entries = 0;
+static uint64_t g_maa_verdict_cache_hits = 0;
+static uint64_t g_maa_verdict_cache_misses = 0;
+static uint64_t g_maa_verdict_cache_evictions = 0;
+
+/* timing statistics (only if enabled via RA_TLS_MAA_TIMING), protected by `g_maa_timing_lock` */
+static pthread_mutex_t g_maa_timing_lock = PTHREAD_MUTEX_INITIALIZER;
+static struct ra_tls_maa_timing_stats g_maa_timing_stats = {0};
+
 /*! MAA response (JWT token for `attest/` API, set of Signing keys for `certs/` API) */
 struct maa_response {
     char* data;              /*!< response (JSON string) */
@@ -174,6 +300,28 @@ static int init_from_env(char** ptr, const char* env_name, const char* default_v
     return 0;
 }
 
+static int init_long_from_env(long* ptr, const char* env_name, long default_val) {
+    if (*ptr >= 0) {
+        /* already initialized */
+        return 0;
+    }
+
+    char* env_val = getenv(env_name);
+    if (!env_val) {
+        *ptr = default_val;
+        return 0;
+    }
+
+    char* endptr;
+    errno = 0;
+    long val = strtol(env_val, &endptr, 10);
+    if (errno || endptr == env_val || *endptr != '\0' || val < 0)
+        return MBEDTLS_ERR_X509_BAD_INPUT_DATA;
+
+    *ptr = val;
+    return 0;
+}
+
 static int verify_quote_body_enclave_attributes(sgx_quote_body_t* quote_body,
                                                 bool allow_debug_enclave) {
     if (!allow_debug_enclave && (quote_body->report_body.attributes.flags & SGX_FLAGS_DEBUG)) {
@@ -251,50 +399,199 @@ static void response_cleanup(struct maa_response* response) {
     free(response);
 }
 
-static void maa_cleanup(struct maa_context* context) {
+static void curl_share_lock(CURL* handle, curl_lock_data data, curl_lock_access access,
+                            void* userptr) {
+    (void)handle;
+    (void)access;
+    (void)userptr;
+    pthread_mutex_lock(&g_maa_curl_share_locks[data]);
+}
+
+static void curl_share_unlock(CURL* handle, curl_lock_data data, void* userptr) {
+    (void)handle;
+    (void)userptr;
+    pthread_mutex_unlock(&g_maa_curl_share_locks[data]);
+}
+
+/*! Read MAA-specific environment variables and initialize curl (only once per process; curl is
+ * never deinitialized because the curl handles are kept for reuse until the process exits) */
+static int maa_global_init(void) {
+    int ret;
+
+    pthread_mutex_lock(&g_maa_init_lock);
+    if (g_maa_init_done) {
+        ret = 0;
+        goto out;
+    }
+
+    ret = init_from_env(&g_maa_base_url, RA_TLS_MAA_PROVIDER_URL, /*default_val=*/NULL);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_MAA_PROVIDER_URL\n");
+        goto out;
+    }
+
+    ret = init_from_env(&g_maa_api_version, RA_TLS_MAA_PROVIDER_API_VERSION,
+                        DEFAULT_MAA_PROVIDER_API_VERSION);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_MAA_PROVIDER_API_VERSION\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_maa_jwks_cache_ttl, RA_TLS_MAA_JWKS_CACHE_TTL,
+                             DEFAULT_MAA_JWKS_CACHE_TTL);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_MAA_JWKS_CACHE_TTL\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_maa_verdict_cache_size, RA_TLS_MAA_VERDICT_CACHE_SIZE,
+                             DEFAULT_MAA_VERDICT_CACHE_SIZE);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_MAA_VERDICT_CACHE_SIZE\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_maa_verdict_cache_ttl, RA_TLS_MAA_VERDICT_CACHE_TTL,
+                             DEFAULT_MAA_VERDICT_CACHE_TTL);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_MAA_VERDICT_CACHE_TTL\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_maa_timing, RA_TLS_MAA_TIMING, DEFAULT_MAA_TIMING);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_MAA_TIMING\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_maa_expose_jwt, RA_TLS_MAA_EXPOSE_JWT, DEFAULT_MAA_EXPOSE_JWT);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_MAA_EXPOSE_JWT\n");
+        goto out;
+    }
+
+    CURLcode curl_ret = curl_global_init(CURL_GLOBAL_ALL);
+    if (curl_ret != CURLE_OK) {
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    for (size_t i = 0; i < CURL_LOCK_DATA_LAST; i++)
+        pthread_mutex_init(&g_maa_curl_share_locks[i], /*attr=*/NULL);
+
+    CURLSH* share = curl_share_init();
+    if (!share) {
+        curl_global_cleanup();
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    if (curl_share_setopt(share, CURLSHOPT_LOCKFUNC, curl_share_lock) != CURLSHE_OK ||
+            curl_share_setopt(share, CURLSHOPT_UNLOCKFUNC, curl_share_unlock) != CURLSHE_OK ||
+            curl_share_setopt(share, CURLSHOPT_SHARE, CURL_LOCK_DATA_DNS) != CURLSHE_OK ||
+            curl_share_setopt(share, CURLSHOPT_SHARE, CURL_LOCK_DATA_SSL_SESSION) != CURLSHE_OK) {
+        curl_share_cleanup(share);
+        curl_global_cleanup();
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    g_maa_curl_share = share;
+    g_maa_init_done = true;
+    ret = 0;
+out:
+    pthread_mutex_unlock(&g_maa_init_lock);
+    return ret;
+}
+
+static void maa_context_free(struct maa_context* context) {
     if (!context)
         return;
 
     curl_slist_free_all(context->headers);
     curl_easy_cleanup(context->curl);
+    free(context);
+}
 
-    /* every curl_global_init() must have a corresponding curl_global_cleanup() */
-    if (context->curl_global_init_done)
-        curl_global_cleanup();
+/*! Return the MAA context to the pool of idle contexts, so that its connection to MAA (if still
+ * alive) is reused by subsequent verifications */
+static void maa_release(struct maa_context* context) {
+    if (!context)
+        return;
 
-    free(context);
+    pthread_mutex_lock(&g_maa_context_pool_lock);
+    if (g_maa_context_pool_size < MAA_CONTEXT_POOL_MAX_SIZE) {
+        context->next = g_maa_context_pool;
+        g_maa_context_pool = context;
+        g_maa_context_pool_size++;
+        context = NULL;
+    }
+    pthread_mutex_unlock(&g_maa_context_pool_lock);
+
+    maa_context_free(context);
 }
 
+/*! Take an idle MAA context from the pool or create a new one; must be returned via maa_release()
+ * or freed via maa_context_free() */
 static int maa_init(struct maa_context** out_context) {
     int ret;
 
-    struct maa_context* context = calloc(1, sizeof(*context));
+    pthread_mutex_lock(&g_maa_context_pool_lock);
+    struct maa_context* context = g_maa_context_pool;
+    if (context) {
+        g_maa_context_pool = context->next;
+        g_maa_context_pool_size--;
+        context->next = NULL;
+    }
+    pthread_mutex_unlock(&g_maa_context_pool_lock);
+
+    if (context) {
+        context->network_us = 0;
+        *out_context = context;
+        return 0;
+    }
+
+    context = calloc(1, sizeof(*context));
     if (!context) {
         ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
         goto out;
     }
 
-    /* can be called multiple times */
-    CURLcode curl_ret = curl_global_init(CURL_GLOBAL_ALL);
+    context->curl = curl_easy_init();
+    if (!context->curl) {
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    CURLcode curl_ret;
+    curl_ret = curl_easy_setopt(context->curl, CURLOPT_SSLVERSION, CURL_SSLVERSION_TLSv1_2);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
-    context->curl_global_init_done = true;
 
-    context->curl = curl_easy_init();
-    if (!context->curl) {
+    curl_ret = curl_easy_setopt(context->curl, CURLOPT_SSL_VERIFYPEER, 1L);
+    if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_SSLVERSION, CURL_SSLVERSION_TLSv1_2);
+    /* share DNS cache and TLS sessions with all other handles (TLS session resumption) */
+    curl_ret = curl_easy_setopt(context->curl, CURLOPT_SHARE, g_maa_curl_share);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_SSL_VERIFYPEER, 1L);
+    /* keep the connection to MAA alive while the context is idle in the pool */
+    curl_ret = curl_easy_setopt(context->curl, CURLOPT_TCP_KEEPALIVE, 1L);
+    if (curl_ret != CURLE_OK) {
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    /* required for using curl in multi-threaded applications */
+    curl_ret = curl_easy_setopt(context->curl, CURLOPT_NOSIGNAL, 1L);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
@@ -328,11 +625,96 @@ static int maa_init(struct maa_context** out_context) {
     ret = 0;
 out:
     if (ret < 0) {
-        maa_cleanup(context);
+        maa_context_free(context);
     }
     return ret;
 }
 
+static uint64_t monotonic_time_us(void) {
+    struct timespec ts;
+    if (clock_gettime(CLOCK_MONOTONIC, &ts) < 0)
+        return 0;
+    return (uint64_t)ts.tv_sec * 1000000 + (uint64_t)ts.tv_nsec / 1000;
+}
+
+static uint64_t time_diff_us(curl_off_t end, curl_off_t start) {
+    return end > start ? (uint64_t)(end - start) : 0;
+}
+
+/*! Log the timing breakdown of the just-performed HTTPS request \a request_name (as reported by
+ * curl) and add it to \a stats; no-op unless timing instrumentation is enabled */
+static void maa_record_request_timing(struct maa_context* context, const char* request_name,
+                                      CURLcode result, struct ra_tls_maa_request_timing* stats) {
+    if (g_maa_timing <= 0)
+        return;
+
+    /* all times reported by curl are in microseconds, counted from the start of the request; on
+     * failure, the times of phases that weren't reached stay zero */
+    curl_off_t namelookup = 0, connect = 0, appconnect = 0, pretransfer = 0, starttransfer = 0;
+    curl_off_t total = 0;
+    long num_connects = 0;
+    long response_code = 0;
+    curl_easy_getinfo(context->curl, CURLINFO_NAMELOOKUP_TIME_T, &namelookup);
+    curl_easy_getinfo(context->curl, CURLINFO_CONNECT_TIME_T, &connect);
+    curl_easy_getinfo(context->curl, CURLINFO_APPCONNECT_TIME_T, &appconnect);
+    curl_easy_getinfo(context->curl, CURLINFO_PRETRANSFER_TIME_T, &pretransfer);
+    curl_easy_getinfo(context->curl, CURLINFO_STARTTRANSFER_TIME_T, &starttransfer);
+    curl_easy_getinfo(context->curl, CURLINFO_TOTAL_TIME_T, &total);
+    curl_easy_getinfo(context->curl, CURLINFO_NUM_CONNECTS, &num_connects);
+    curl_easy_getinfo(context->curl, CURLINFO_RESPONSE_CODE, &response_code);
+
+    struct ra_tls_maa_request_timing timing = {
+        .count           = 1,
+        .new_connections = num_connects > 0 ? (uint64_t)num_connects : 0,
+        .dns_us          = time_diff_us(namelookup, 0),
+        .connect_us      = connect ? time_diff_us(connect, namelookup) : 0,
+        .tls_us          = appconnect ? time_diff_us(appconnect, connect) : 0,
+        .server_us       = starttransfer ? time_diff_us(starttransfer, pretransfer) : 0,
+        .transfer_us     = starttransfer ? time_diff_us(total, starttransfer) : 0,
+        .total_us        = time_diff_us(total, 0),
+    };
+    context->network_us += timing.total_us;
+
+    INFO("ra_tls_maa_timing: request=%s curl_code=%d http_code=%ld new_connections=%" PRIu64
+         " dns_us=%" PRIu64 " connect_us=%" PRIu64 " tls_us=%" PRIu64 " server_us=%" PRIu64
+         " transfer_us=%" PRIu64 " total_us=%" PRIu64 "\n", request_name, (int)result,
+         response_code, timing.new_connections, timing.dns_us, timing.connect_us, timing.tls_us,
+         timing.server_us, timing.transfer_us, timing.total_us);
+
+    pthread_mutex_lock(&g_maa_timing_lock);
+    stats->count           += timing.count;
+    stats->new_connections += timing.new_connections;
+    stats->dns_us          += timing.dns_us;
+    stats->connect_us      += timing.connect_us;
+    stats->tls_us          += timing.tls_us;
+    stats->server_us       += timing.server_us;
+    stats->transfer_us     += timing.transfer_us;
+    stats->total_us        += timing.total_us;
+    pthread_mutex_unlock(&g_maa_timing_lock);
+}
+
+/*! Log the timing of the whole verification that started at \a start_us and ended with \a result,
+ * and add it to the cumulative statistics; no-op unless timing instrumentation is enabled */
+static void maa_record_verification_timing(uint64_t start_us, uint64_t network_us,
+                                           bool verdict_cached, int result) {
+    if (g_maa_timing <= 0)
+        return;
+
+    uint64_t end_us = monotonic_time_us();
+    uint64_t total_us = end_us > start_us ? end_us - start_us : 0;
+    uint64_t local_us = total_us > network_us ? total_us - network_us : 0;
+
+    INFO("ra_tls_maa_timing: verification result=%d cached=%d network_us=%" PRIu64 " local_us=%"
+         PRIu64 " total_us=%" PRIu64 "\n", result, verdict_cached ? 1 : 0, network_us, local_us,
+         total_us);
+
+    pthread_mutex_lock(&g_maa_timing_lock);
+    g_maa_timing_stats.verifications++;
+    g_maa_timing_stats.verification_us += total_us;
+    g_maa_timing_stats.local_us        += local_us;
+    pthread_mutex_unlock(&g_maa_timing_lock);
+}
+
 /*! Send GET request (empty) to MAA attestation provider's `certs/` API endpoint and save the
  * resulting set of JWKs in \a out_set_of_jwks; caller is responsible for its cleanup */
 static int maa_get_signing_certs(struct maa_context* context, char** out_set_of_jwks) {
@@ -387,6 +769,7 @@ static int maa_get_signing_certs(struct maa_context* context, char** out_set_of_
 
     /* send the "GET certs" request, callbacks will store results in `response` */
     curl_ret = curl_easy_perform(context->curl);
+    maa_record_request_timing(context, "certs", curl_ret, &g_maa_timing_stats.certs);
     if (curl_ret != CURLE_OK) {
         ERROR("Failed to send the MAA \"GET certs\" request to `%s`\n", request_url);
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
@@ -551,6 +934,7 @@ static int maa_send_request(struct maa_context* context, const void* quote, size
 
     /* send the attestation request, callbacks will store results in `response` */
     curl_ret = curl_easy_perform(context->curl);
+    maa_record_request_timing(context, "attest", curl_ret, &g_maa_timing_stats.attest);
     if (curl_ret != CURLE_OK) {
         ERROR("Failed to send the MAA Attestation request to `%s`\n", request_url);
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
@@ -591,11 +975,240 @@ out:
     return ret;
 }
 
+static void jwks_cleanup(struct maa_jwks* jwks) {
+    if (!jwks)
+        return;
+
+    for (size_t i = 0; i < jwks->keys_cnt; i++) {
+        free(jwks->keys[i].kid);
+        mbedtls_x509_crt_free(&jwks->keys[i].crt);
+    }
+    free(jwks->keys);
+    free(jwks->set_of_jwks);
+    free(jwks);
+}
+
+/*! Parse the set of JWKs (JSON string) received from MAA, including the X.509 certificates of all
+ * JWKs, and save the result in \a out_jwks; caller is responsible for its cleanup */
+static int jwks_parse(const char* set_of_jwks, struct maa_jwks** out_jwks) {
+    int ret;
+
+    cJSON* json_jwks = NULL;
+    char* x509cert   = NULL;
+
+    struct maa_jwks* jwks = calloc(1, sizeof(*jwks));
+    if (!jwks) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+        goto out;
+    }
+
+    jwks->fetch_time = time(NULL);
+    jwks->set_of_jwks = strdup(set_of_jwks);
+    if (!jwks->set_of_jwks) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+        goto out;
+    }
+
+    json_jwks = cJSON_Parse(set_of_jwks);
+    if (!json_jwks) {
+        ERROR("MAA set of JWKs is incorrectly formatted (the set is not proper JSON)\n");
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    cJSON* keys_json_array = cJSON_GetObjectItem(json_jwks, "keys");
+    if (!cJSON_IsArray(keys_json_array)) {
+        ERROR("MAA set of JWKs doesn't contain the `keys` JSON array\n");
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    jwks->keys = calloc(cJSON_GetArraySize(keys_json_array) + 1, sizeof(*jwks->keys));
+    if (!jwks->keys) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+        goto out;
+    }
+
+    const cJSON* key_json = NULL;
+    cJSON_ArrayForEach(key_json, keys_json_array) {
+        /* in practice, the `certs/` API endpoint doesn't have `use` and `alg` fields */
+        cJSON* key_kty = cJSON_GetObjectItem(key_json, "kty");
+        cJSON* key_kid = cJSON_GetObjectItem(key_json, "kid");
+        cJSON* key_x5c = cJSON_GetObjectItem(key_json, "x5c");
+
+        /* currently only support RSA keys */
+        if (!cJSON_IsString(key_kty) || strcmp(key_kty->valuestring, "RSA")) {
+            ERROR("MAA JWK's `kty` field contains an unexpected value (expected `%s`)\n", "RSA");
+            ret = MBEDTLS_ERR_X509_CERT_UNKNOWN_FORMAT;
+            goto out;
+        }
+
+        if (!cJSON_IsString(key_kid) || !cJSON_IsArray(key_x5c) || !cJSON_GetArraySize(key_x5c)) {
+            ERROR("MAA JWK's `kid` and/or `x5c` fields have incorrect types\n");
+            ret = MBEDTLS_ERR_X509_CERT_UNKNOWN_FORMAT;
+            goto out;
+        }
+
+        cJSON* key_first_x509cert = cJSON_GetArrayItem(key_x5c, 0);
+        if (!cJSON_IsString(key_first_x509cert)) {
+            ERROR("MAA JWK's `x5c` is not an array of string-value X.509 certificates\n");
+            ret = MBEDTLS_ERR_X509_CERT_UNKNOWN_FORMAT;
+            goto out;
+        }
+        const char* x509cert_b64 = key_first_x509cert->valuestring;
+
+        struct maa_jwk* jwk = &jwks->keys[jwks->keys_cnt++];
+        mbedtls_x509_crt_init(&jwk->crt);
+
+        jwk->kid = strdup(key_kid->valuestring);
+        if (!jwk->kid) {
+            ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+            goto out;
+        }
+
+        /* note that "x5c" field is *not* base64url encoded */
+        size_t x509cert_size = 0;
+        ret = mbedtls_base64_decode(/*dest=*/NULL, /*dlen=*/0, &x509cert_size,
+                                    (const uint8_t*)x509cert_b64, strlen(x509cert_b64));
+        if (ret != MBEDTLS_ERR_BASE64_BUFFER_TOO_SMALL) {
+            goto out;
+        }
+
+        x509cert = malloc(x509cert_size);
+        if (!x509cert) {
+            ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+            goto out;
+        }
+
+        ret = mbedtls_base64_decode((uint8_t*)x509cert, x509cert_size, &x509cert_size,
+                                    (const uint8_t*)x509cert_b64, strlen(x509cert_b64));
+        if (ret < 0) {
+            ERROR("MAA JWK's certificate is incorrectly formatted (not Base64 encoded)\n");
+            goto out;
+        }
+
+        ret = mbedtls_x509_crt_parse(&jwk->crt, (const uint8_t*)x509cert, x509cert_size);
+        if (ret < 0) {
+            ERROR("MAA JWK's certificate is incorrectly formatted (not a proper X.509 cert)\n");
+            goto out;
+        }
+
+        free(x509cert);
+        x509cert = NULL;
+    }
+
+    *out_jwks = jwks;
+    ret = 0;
+out:
+    if (ret < 0)
+        jwks_cleanup(jwks);
+    if (json_jwks)
+        cJSON_Delete(json_jwks);
+    free(x509cert);
+    return ret;
+}
+
+/*! Verify the JWT signature \a signature over \a md_sha256 using the JWK with \a kid from \a jwks
+ * and save a copy of the set of JWKs (JSON string) in \a out_set_of_jwks; caller is responsible for
+ * its cleanup. Returns 1 if there is no JWK with \a kid in \a jwks. */
+static int jwks_verify_signature(struct maa_jwks* jwks, const char* kid, const uint8_t* md_sha256,
+                                 size_t md_sha256_size, const uint8_t* signature,
+                                 size_t signature_size, char** out_set_of_jwks) {
+    struct maa_jwk* jwk = NULL;
+    for (size_t i = 0; i < jwks->keys_cnt; i++) {
+        if (!strcmp(jwks->keys[i].kid, kid)) {
+            jwk = &jwks->keys[i];
+            break;
+        }
+    }
+    if (!jwk)
+        return 1;
+
+    /* perform signature verification of attestation token using the public key from the
+     * self-signed certificate obtained from `certs/` MAA API endpoint */
+    int ret = mbedtls_pk_verify(&jwk->crt.pk, MBEDTLS_MD_SHA256, md_sha256, md_sha256_size,
+                                signature, signature_size);
+    if (ret < 0) {
+        ERROR("Failed signature verification of JWT using the JWK's certificate\n");
+        return ret;
+    }
+
+    char* set_of_jwks = strdup(jwks->set_of_jwks);
+    if (!set_of_jwks)
+        return MBEDTLS_ERR_X509_ALLOC_FAILED;
+
+    *out_set_of_jwks = set_of_jwks;
+    return 0;
+}
+
+/*! Verify the JWT signature using the JWK with \a kid, taken from the cached set of JWKs; if the
+ * set is not cached, is expired or doesn't contain \a kid (MAA may have rotated its keys), fetch
+ * the set of JWKs from MAA attestation provider's `certs/` API endpoint and update the cache. On
+ * success, a copy of the used set of JWKs is saved in \a out_set_of_jwks; caller is responsible for
+ * its cleanup. */
+static int maa_verify_jwt_signature(struct maa_context* context, const char* kid,
+                                    const uint8_t* md_sha256, size_t md_sha256_size,
+                                    const uint8_t* signature, size_t signature_size,
+                                    char** out_set_of_jwks) {
+    int ret;
+
+    char* set_of_jwks     = NULL;
+    struct maa_jwks* jwks = NULL;
+
+    if (g_maa_jwks_cache_ttl > 0) {
+        pthread_mutex_lock(&g_maa_jwks_lock);
+        ret = 1;
+        time_t curr_time = time(NULL);
+        if (g_maa_jwks && curr_time != (time_t)-1 && g_maa_jwks->fetch_time <= curr_time &&
+                curr_time - g_maa_jwks->fetch_time < g_maa_jwks_cache_ttl) {
+            ret = jwks_verify_signature(g_maa_jwks, kid, md_sha256, md_sha256_size, signature,
+                                        signature_size, out_set_of_jwks);
+        }
+        pthread_mutex_unlock(&g_maa_jwks_lock);
+        if (ret <= 0)
+            return ret;
+    }
+
+    ret = maa_get_signing_certs(context, &set_of_jwks);
+    if (ret < 0)
+        goto out;
+
+    ret = jwks_parse(set_of_jwks, &jwks);
+    if (ret < 0)
+        goto out;
+
+    int verify_ret = jwks_verify_signature(jwks, kid, md_sha256, md_sha256_size, signature,
+                                           signature_size, out_set_of_jwks);
+
+    if (g_maa_jwks_cache_ttl > 0) {
+        pthread_mutex_lock(&g_maa_jwks_lock);
+        jwks_cleanup(g_maa_jwks);
+        g_maa_jwks = jwks;
+        jwks = NULL;
+        pthread_mutex_unlock(&g_maa_jwks_lock);
+    }
+
+    if (verify_ret > 0) {
+        ERROR("Failed to find a corresponding JWK for the JWT received from MAA\n");
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+    ret = verify_ret;
+out:
+    jwks_cleanup(jwks);
+    free(set_of_jwks);
+    return ret;
+}
+
 /*! Verify the attestation response from MAA (the JWT token) and create a dummy SGX quote populated
- * with the SGX-enclave measurements from this response in \a out_quote_body; caller is responsible
- * for its cleanup */
-static int maa_verify_response_output_quote(struct maa_response* response, const char* set_of_jwks,
-                                            sgx_quote_body_t** out_quote_body) {
+ * with the SGX-enclave measurements from this response in \a out_quote_body; also save the JWT in
+ * \a out_jwt, the set of JWKs used to verify it in \a out_set_of_jwks and the JWT's expiration
+ * time in \a out_expiration_time; caller is responsible for their cleanup */
+static int maa_verify_response_output_quote(struct maa_context* context,
+                                            struct maa_response* response,
+                                            sgx_quote_body_t** out_quote_body, char** out_jwt,
+                                            char** out_set_of_jwks,
+                                            time_t* out_expiration_time) {
     int ret;
 
     sgx_quote_body_t* quote_body = NULL;
@@ -605,7 +1218,6 @@ static int maa_verify_response_output_quote(struct maa_response* response, const
     cJSON* json_response      = NULL;
     cJSON* json_token_header  = NULL;
     cJSON* json_token_payload = NULL;
-    cJSON* json_jwks          = NULL;
 
     char* token_b64_header    = NULL;
     char* token_b64_payload   = NULL;
@@ -615,15 +1227,12 @@ static int maa_verify_response_output_quote(struct maa_response* response, const
     char* token_payload   = NULL;
     char* token_signature = NULL;
 
-    char* token_signing_x509cert_b64 = NULL; /* not allocated, so no need to free it */
-    char* token_signing_x509cert     = NULL;
+    char* set_of_jwks = NULL;
+    char* jwt         = NULL;
 
     mbedtls_md_context_t md_context;
     mbedtls_md_init(&md_context);
 
-    mbedtls_x509_crt token_signing_crt;
-    mbedtls_x509_crt_init(&token_signing_crt);
-
     json_response = cJSON_Parse(response->data);
     if (!json_response) {
         ERROR("MAA Attestation response is not proper JSON\n");
@@ -793,97 +1402,9 @@ static int maa_verify_response_output_quote(struct maa_response* response, const
         goto out;
     }
 
-    /* json_token_header["kid"] contains an ID that should be found in `set_of_jwks`, so let's parse
-     * the latter, find the corresponding array item and extract the X.509 cert from `x5c` field */
-    json_jwks = cJSON_Parse(set_of_jwks);
-    if (!json_jwks) {
-        ERROR("MAA set of JWKs is incorrectly formatted (the set is not proper JSON)\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-
-    cJSON* keys_json_array = cJSON_GetObjectItem(json_jwks, "keys");
-    if (!cJSON_IsArray(keys_json_array)) {
-        ERROR("MAA set of JWKs doesn't contain the `keys` JSON array\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-
-    token_signing_x509cert_b64 = NULL; /* for sanity */
-    const cJSON* key_json = NULL;
-    cJSON_ArrayForEach(key_json, keys_json_array) {
-        /* in practice, the `certs/` API endpoint doesn't have `use` and `alg` fields */
-        cJSON* key_kty = cJSON_GetObjectItem(key_json, "kty");
-        cJSON* key_kid = cJSON_GetObjectItem(key_json, "kid");
-        cJSON* key_x5c = cJSON_GetObjectItem(key_json, "x5c");
-
-        /* currently only support RSA keys */
-        if (!cJSON_IsString(key_kty) || strcmp(key_kty->valuestring, "RSA")) {
-            ERROR("MAA JWK's `kty` field contains an unexpected value (got `%s`, expected `%s`)\n",
-                  key_kty->valuestring, "RSA");
-            ret = MBEDTLS_ERR_X509_CERT_UNKNOWN_FORMAT;
-            goto out;
-        }
-
-        if (!cJSON_IsString(key_kid) || !cJSON_IsArray(key_x5c) || !cJSON_GetArraySize(key_x5c)) {
-            ERROR("MAA JWK's `kid` and/or `x5c` fields have incorrect types\n");
-            ret = MBEDTLS_ERR_X509_CERT_UNKNOWN_FORMAT;
-            goto out;
-        }
-
-        /* compare kid from the set of JWKs with the one in JWT */
-        if (!strcmp(key_kid->valuestring, token_header_kid->valuestring)) {
-            cJSON* key_first_x509cert = cJSON_GetArrayItem(key_x5c, 0);
-            if (!cJSON_IsString(key_first_x509cert)) {
-                ERROR("MAA JWK's `x5c` is not an array of string-value X.509 certificates\n");
-                ret = MBEDTLS_ERR_X509_CERT_UNKNOWN_FORMAT;
-                goto out;
-            }
-
-            token_signing_x509cert_b64 = key_first_x509cert->valuestring;
-            break;
-        }
-    }
-
-    if (!token_signing_x509cert_b64) {
-        ERROR("Failed to find a corresponding JWK for the JWT received from MAA\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-
-    /* note that "x5c" field is *not* base64url encoded */
-    size_t token_signing_x509cert_size = 0;
-    ret = mbedtls_base64_decode(/*dest=*/NULL, /*dlen=*/0, &token_signing_x509cert_size,
-                                (const uint8_t*)token_signing_x509cert_b64,
-                                strlen(token_signing_x509cert_b64));
-    if (ret != MBEDTLS_ERR_BASE64_BUFFER_TOO_SMALL) {
-        goto out;
-    }
-
-    token_signing_x509cert = malloc(token_signing_x509cert_size);
-    if (!token_signing_x509cert) {
-        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
-        goto out;
-    }
-
-    ret = mbedtls_base64_decode((uint8_t*)token_signing_x509cert, token_signing_x509cert_size,
-                                &token_signing_x509cert_size,
-                                (const uint8_t*)token_signing_x509cert_b64,
-                                strlen(token_signing_x509cert_b64));
-    if (ret < 0) {
-        ERROR("MAA JWK's certificate is incorrectly formatted (not Base64 encoded)\n");
-        goto out;
-    }
-
-    ret = mbedtls_x509_crt_parse(&token_signing_crt, (const uint8_t*)token_signing_x509cert,
-                                 token_signing_x509cert_size);
-    if (ret < 0) {
-        ERROR("MAA JWK's certificate is incorrectly formatted (not a proper X.509 cert)\n");
-        goto out;
-    }
-
-    /* perform signature verification of attestation token using the public key from the self-signed
-     * certificate obtained from `certs/` MAA API endpoint */
+    /* perform signature verification of attestation token using the public key of the JWK with
+     * json_token_header["kid"] ID, found in the set of JWKs obtained from `certs/` MAA API
+     * endpoint */
     uint8_t md_sha256[32];
     mbedtls_md_setup(&md_context, mbedtls_md_info_from_type(MBEDTLS_MD_SHA256), /*hmac=*/0);
     mbedtls_md_starts(&md_context);
@@ -893,12 +1414,11 @@ static int maa_verify_response_output_quote(struct maa_response* response, const
                       strlen(token_b64_payload));
     mbedtls_md_finish(&md_context, md_sha256);
 
-    ret = mbedtls_pk_verify(&token_signing_crt.pk, MBEDTLS_MD_SHA256, md_sha256, sizeof(md_sha256),
-                            (const uint8_t*)token_signature, token_signature_size);
-    if (ret < 0) {
-        ERROR("Failed signature verification of JWT using the JWK's certificate\n");
+    ret = maa_verify_jwt_signature(context, token_header_kid->valuestring, md_sha256,
+                                   sizeof(md_sha256), (const uint8_t*)token_signature,
+                                   token_signature_size, &set_of_jwks);
+    if (ret < 0)
         goto out;
-    }
 
     /*
      * FIXME: the self-signed token-signing certificate obtained from the `certs/` MAA API endpoint
@@ -1047,42 +1567,18 @@ static int maa_verify_response_output_quote(struct maa_response* response, const
     ERROR("--- set_of_jwks is ```%s``` ---\n", set_of_jwks);
 #endif
 
-    /*
-     * Expose JWT (as base64-formatted string) and "set of JWKs" (as JSON string) in envvars;
-     * at this point we know that JWT and "set of JWKs" are correctly formatted strings.
-     *
-     * NOTE: manipulations with envvars are not thread-safe.
-     */
-    if (getenv(RA_TLS_MAA_JWT)) {
-        ERROR("MAA JWT cannot be exposed through RA_TLS_MAA_JWT envvar because this envvar is "
-              "already used (you must unsetenv before calling RA-TLS verification)\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-    ret = setenv(RA_TLS_MAA_JWT, token_b64->valuestring, /*overwrite=*/1);
-    if (ret < 0) {
-        ERROR("MAA JWT cannot be exposed through RA_TLS_MAA_JWT envvar because setenv() failed "
-              "with error %d\n", errno);
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-
-    if (getenv(RA_TLS_MAA_SET_OF_JWKS)) {
-        ERROR("MAA \"Set of JWKs\" cannot be exposed through RA_TLS_MAA_SET_OF_JWKS envvar because "
-              "this envvar is already used (you must unsetenv before calling RA-TLS "
-              "verification)\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-    ret = setenv(RA_TLS_MAA_SET_OF_JWKS, set_of_jwks, /*overwrite=*/1);
-    if (ret < 0) {
-        ERROR("MAA \"Set of JWKs\" cannot be exposed through RA_TLS_MAA_SET_OF_JWKS envvar because "
-              "setenv() failed with error %d\n", errno);
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+    jwt = strdup(token_b64->valuestring);
+    if (!jwt) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
         goto out;
     }
 
-    *out_quote_body = quote_body;
+    *out_quote_body      = quote_body;
+    *out_jwt             = jwt;
+    *out_set_of_jwks     = set_of_jwks;
+    *out_expiration_time = (time_t)expiration_time->valueint;
+    jwt         = NULL;
+    set_of_jwks = NULL;
     ret = 0;
 out:
     if (ret < 0) {
@@ -1095,8 +1591,6 @@ out:
         cJSON_Delete(json_token_header);
     if (json_token_payload)
         cJSON_Delete(json_token_payload);
-    if (json_jwks)
-        cJSON_Delete(json_jwks);
 
     free(token_b64_header);
     free(token_b64_payload);
@@ -1107,12 +1601,273 @@ out:
     free(token_signature);
 
     free(maa_certs_url);
-    free(token_signing_x509cert);
-    mbedtls_x509_crt_free(&token_signing_crt);
+    free(set_of_jwks);
+    free(jwt);
+    mbedtls_md_free(&md_context);
+    return ret;
+}
+
+/* JWT and set of JWKs of the last verification on each thread (NULL if it failed), returned by
+ * ra_tls_maa_get_jwt() and ra_tls_maa_get_set_of_jwks() */
+static __thread char* g_maa_thread_jwt = NULL;
+static __thread char* g_maa_thread_set_of_jwks = NULL;
+
+/* serializes setenv() calls of concurrent verifications (if RA_TLS_MAA_EXPOSE_JWT is enabled) */
+static pthread_mutex_t g_maa_expose_jwt_lock = PTHREAD_MUTEX_INITIALIZER;
+
+static void maa_clear_thread_jwt(void) {
+    free(g_maa_thread_jwt);
+    free(g_maa_thread_set_of_jwks);
+    g_maa_thread_jwt = NULL;
+    g_maa_thread_set_of_jwks = NULL;
+}
+
+/*! Expose JWT (as base64-formatted string) and "set of JWKs" (as JSON string) of a successful
+ * verification to the calling thread (see ra_tls_maa_get_jwt()) and, if enabled via
+ * RA_TLS_MAA_EXPOSE_JWT, in envvars; takes ownership of \a jwt and \a set_of_jwks (and sets them
+ * to NULL) on success. JWT and "set of JWKs" must be already verified to be correctly formatted
+ * strings */
+static int maa_expose_jwt(char** jwt, char** set_of_jwks) {
+    if (g_maa_expose_jwt > 0) {
+        /* NOTE: setenv() is not thread-safe w.r.t. getenv() in other threads, so envvars should
+         * only be enabled if verifications don't run concurrently; the lock only prevents
+         * concurrent verifications from corrupting the environment */
+        pthread_mutex_lock(&g_maa_expose_jwt_lock);
+        int ret = setenv(RA_TLS_MAA_JWT, *jwt, /*overwrite=*/1);
+        if (ret < 0) {
+            pthread_mutex_unlock(&g_maa_expose_jwt_lock);
+            ERROR("MAA JWT cannot be exposed through RA_TLS_MAA_JWT envvar because setenv() failed "
+                  "with error %d\n", errno);
+            return MBEDTLS_ERR_X509_FATAL_ERROR;
+        }
+
+        ret = setenv(RA_TLS_MAA_SET_OF_JWKS, *set_of_jwks, /*overwrite=*/1);
+        pthread_mutex_unlock(&g_maa_expose_jwt_lock);
+        if (ret < 0) {
+            ERROR("MAA \"Set of JWKs\" cannot be exposed through RA_TLS_MAA_SET_OF_JWKS envvar "
+                  "because setenv() failed with error %d\n", errno);
+            return MBEDTLS_ERR_X509_FATAL_ERROR;
+        }
+    }
+
+    maa_clear_thread_jwt();
+    g_maa_thread_jwt = *jwt;
+    g_maa_thread_set_of_jwks = *set_of_jwks;
+    *jwt = NULL;
+    *set_of_jwks = NULL;
+    return 0;
+}
+
+static void verdict_free(struct maa_verdict* verdict) {
+    if (!verdict)
+        return;
+
+    free(verdict->jwt);
+    free(verdict->set_of_jwks);
+    free(verdict);
+}
+
+/* must be called with `g_maa_verdict_cache_lock` held */
+static void verdict_cache_unlink(struct maa_verdict* verdict) {
+    if (verdict->prev)
+        verdict->prev->next = verdict->next;
+    else
+        g_maa_verdict_cache_head = verdict->next;
+
+    if (verdict->next)
+        verdict->next->prev = verdict->prev;
+    else
+        g_maa_verdict_cache_tail = verdict->prev;
+
+    verdict->prev = NULL;
+    verdict->next = NULL;
+    g_maa_verdict_cache_entries--;
+}
+
+/* must be called with `g_maa_verdict_cache_lock` held */
+static void verdict_cache_push_front(struct maa_verdict* verdict) {
+    verdict->prev = NULL;
+    verdict->next = g_maa_verdict_cache_head;
+    if (g_maa_verdict_cache_head)
+        g_maa_verdict_cache_head->prev = verdict;
+    else
+        g_maa_verdict_cache_tail = verdict;
+    g_maa_verdict_cache_head = verdict;
+    g_maa_verdict_cache_entries++;
+}
+
+/* must be called with `g_maa_verdict_cache_lock` held */
+static struct maa_verdict* verdict_cache_find(const uint8_t key[32]) {
+    struct maa_verdict* verdict = g_maa_verdict_cache_head;
+    while (verdict && memcmp(verdict->key, key, sizeof(verdict->key)))
+        verdict = verdict->next;
+    return verdict;
+}
+
+/*! Calculate the key of the verdict cache: SHA256 hash over the SGX \a quote and the verification
+ * policy, i.e. the MAA provider URL and API version (MAA appraises the quote against the policy
+ * configured in the provider) */
+static int maa_verdict_key(const void* quote, size_t quote_size, uint8_t out_key[32]) {
+    int ret;
+
+    mbedtls_md_context_t md_context;
+    mbedtls_md_init(&md_context);
+
+    ret = mbedtls_md_setup(&md_context, mbedtls_md_info_from_type(MBEDTLS_MD_SHA256), /*hmac=*/0);
+    if (ret < 0)
+        goto out;
+
+    mbedtls_md_starts(&md_context);
+    mbedtls_md_update(&md_context, quote, quote_size);
+    mbedtls_md_update(&md_context, (const uint8_t*)g_maa_base_url, strlen(g_maa_base_url) + 1);
+    mbedtls_md_update(&md_context, (const uint8_t*)g_maa_api_version,
+                      strlen(g_maa_api_version) + 1);
+    ret = mbedtls_md_finish(&md_context, out_key);
+out:
     mbedtls_md_free(&md_context);
     return ret;
 }
 
+/*! Find a non-expired verdict with \a key in the verdict cache and copy its SGX quote body, JWT and
+ * set of JWKs into \a out_quote_body, \a out_jwt and \a out_set_of_jwks; caller is responsible for
+ * their cleanup. Returns 1 if there is no such verdict. */
+static int maa_verdict_cache_lookup(const uint8_t key[32], sgx_quote_body_t** out_quote_body,
+                                    char** out_jwt, char** out_set_of_jwks) {
+    int ret;
+
+    sgx_quote_body_t* quote_body = NULL;
+    char* jwt                    = NULL;
+    char* set_of_jwks            = NULL;
+
+    time_t curr_time = time(NULL);
+
+    pthread_mutex_lock(&g_maa_verdict_cache_lock);
+    struct maa_verdict* verdict = verdict_cache_find(key);
+    if (verdict && (curr_time == (time_t)-1 || curr_time > verdict->expiration_time)) {
+        /* expired (or current time is unknown), drop it */
+        verdict_cache_unlink(verdict);
+        verdict_free(verdict);
+        verdict = NULL;
+    }
+
+    if (!verdict) {
+        g_maa_verdict_cache_misses++;
+        ret = 1;
+        goto out;
+    }
+
+    quote_body  = malloc(sizeof(*quote_body));
+    jwt         = strdup(verdict->jwt);
+    set_of_jwks = strdup(verdict->set_of_jwks);
+    if (!quote_body || !jwt || !set_of_jwks) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+        goto out;
+    }
+    memcpy(quote_body, &verdict->quote_body, sizeof(*quote_body));
+
+    verdict_cache_unlink(verdict);
+    verdict_cache_push_front(verdict);
+    g_maa_verdict_cache_hits++;
+
+    *out_quote_body  = quote_body;
+    *out_jwt         = jwt;
+    *out_set_of_jwks = set_of_jwks;
+    quote_body  = NULL;
+    jwt         = NULL;
+    set_of_jwks = NULL;
+    ret = 0;
+out:
+    pthread_mutex_unlock(&g_maa_verdict_cache_lock);
+    free(quote_body);
+    free(jwt);
+    free(set_of_jwks);
+    return ret;
+}
+
+/*! Add the verdict of a successful verification to the verdict cache, evicting the least recently
+ * used verdicts if the cache is full; failures are ignored (the verdict is simply not cached) */
+static void maa_verdict_cache_insert(const uint8_t key[32], const sgx_quote_body_t* quote_body,
+                                     const char* jwt, const char* set_of_jwks,
+                                     time_t jwt_expiration_time) {
+    time_t curr_time = time(NULL);
+    if (curr_time == (time_t)-1)
+        return;
+
+    struct maa_verdict* verdict = calloc(1, sizeof(*verdict));
+    if (!verdict)
+        return;
+
+    verdict->jwt         = strdup(jwt);
+    verdict->set_of_jwks = strdup(set_of_jwks);
+    if (!verdict->jwt || !verdict->set_of_jwks) {
+        verdict_free(verdict);
+        return;
+    }
+
+    memcpy(verdict->key, key, sizeof(verdict->key));
+    memcpy(&verdict->quote_body, quote_body, sizeof(verdict->quote_body));
+
+    /* the verdict must not outlive the JWT it was derived from */
+    verdict->expiration_time = curr_time + g_maa_verdict_cache_ttl;
+    if (verdict->expiration_time > jwt_expiration_time)
+        verdict->expiration_time = jwt_expiration_time;
+
+    pthread_mutex_lock(&g_maa_verdict_cache_lock);
+    /* the same quote may have been verified concurrently, replace the older verdict */
+    struct maa_verdict* old_verdict = verdict_cache_find(key);
+    if (old_verdict) {
+        verdict_cache_unlink(old_verdict);
+        verdict_free(old_verdict);
+    }
+
+    while (g_maa_verdict_cache_tail &&
+            g_maa_verdict_cache_entries >= (size_t)g_maa_verdict_cache_size) {
+        struct maa_verdict* lru_verdict = g_maa_verdict_cache_tail;
+        verdict_cache_unlink(lru_verdict);
+        verdict_free(lru_verdict);
+        g_maa_verdict_cache_evictions++;
+    }
+
+    verdict_cache_push_front(verdict);
+    pthread_mutex_unlock(&g_maa_verdict_cache_lock);
+}
+
+/*! Get statistics of the verdict cache (exported function); any of the pointers may be NULL */
+void ra_tls_maa_get_verdict_cache_stats(uint64_t* out_hits, uint64_t* out_misses,
+                                        uint64_t* out_evictions, size_t* out_entries) {
+    pthread_mutex_lock(&g_maa_verdict_cache_lock);
+    if (out_hits)
+        *out_hits = g_maa_verdict_cache_hits;
+    if (out_misses)
+        *out_misses = g_maa_verdict_cache_misses;
+    if (out_evictions)
+        *out_evictions = g_maa_verdict_cache_evictions;
+    if (out_entries)
+        *out_entries = g_maa_verdict_cache_entries;
+    pthread_mutex_unlock(&g_maa_verdict_cache_lock);
+}
+
+/*! Get cumulative timing statistics of verifications (exported function); all counters stay zero
+ * unless timing instrumentation is enabled via RA_TLS_MAA_TIMING */
+void ra_tls_maa_get_timing_stats(struct ra_tls_maa_timing_stats* out_stats) {
+    pthread_mutex_lock(&g_maa_timing_lock);
+    *out_stats = g_maa_timing_stats;
+    pthread_mutex_unlock(&g_maa_timing_lock);
+}
+
+/*! Get the JWT (as base64-formatted string) of the last verification on the calling thread
+ * (exported function); NULL if it failed. Valid until the next verification on this thread. */
+const char* ra_tls_maa_get_jwt(void) {
+    return g_maa_thread_jwt;
+}
+
+/*! Get the set of JWKs (as JSON string) that verified the JWT of the last verification on the
+ * calling thread (exported function); NULL if it failed. Valid until the next verification on
+ * this thread. */
+const char* ra_tls_maa_get_set_of_jwks(void) {
+    return g_maa_thread_set_of_jwks;
+}
+
 /*! parse the public key \p pk into DER format and copy it into \p out_pk_der */
 static int parse_pk(mbedtls_pk_context* pk, uint8_t* out_pk_der, size_t* out_pk_der_size) {
     /* below function writes data at the end of the buffer */
@@ -1126,6 +1881,41 @@ static int parse_pk(mbedtls_pk_context* pk, uint8_t* out_pk_der, size_t* out_pk_
     return 0;
 }
 
+/*! Check the enclave attributes and measurements of the SGX quote body \a quote_body (taken from
+ * the RA-TLS certificate and not yet verified) against the configured policy. This allows to
+ * reject enclaves that would be rejected anyway before any network I/O; it does *not* replace the
+ * same checks on the SGX quote body constructed from the MAA JWT. Measurements are only checked
+ * here against the environment variables: a user-supplied measurements callback is invoked once,
+ * on the SGX quote body constructed from the MAA JWT. */
+static int precheck_quote_body(sgx_quote_body_t* quote_body,
+                               struct ra_tls_verify_callback_results* results) {
+    int ret;
+
+    if (results)
+        results->err_loc = AT_VERIFY_ENCLAVE_ATTRS;
+
+    ret = verify_quote_body_enclave_attributes(quote_body, getenv_allow_debug_enclave());
+    if (ret < 0) {
+        ERROR("Failed verification of SGX enclave attributes in the quote (before contacting "
+              "MAA)\n");
+        return MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
+    }
+
+    if (g_verify_measurements_cb)
+        return 0;
+
+    if (results)
+        results->err_loc = AT_VERIFY_ENCLAVE_MEASUREMENTS;
+
+    ret = verify_quote_body_against_envvar_measurements(quote_body);
+    if (ret < 0) {
+        ERROR("Failed verification of SGX measurements in the quote (before contacting MAA)\n");
+        return MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
+    }
+
+    return 0;
+}
+
 int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_t* flags) {
     struct ra_tls_verify_callback_results* results = (struct ra_tls_verify_callback_results*)data;
 
@@ -1133,10 +1923,19 @@ int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_
 
     struct maa_context* context   = NULL;
     struct maa_response* response = NULL;
+    char* jwt                     = NULL;
     char* set_of_jwks             = NULL;
+    time_t jwt_expiration_time    = 0;
 
     sgx_quote_body_t* quote_from_maa = NULL;
 
+    uint8_t verdict_key[32];
+    bool verdict_cached = false;
+
+    uint64_t start_us = monotonic_time_us();
+
+    maa_clear_thread_jwt();
+
     if (results) {
         /* TODO: when MAA becomes standard, add RA_TLS_ATTESTATION_SCHEME_MAA to core RA-TLS lib */
         results->attestation_scheme = RA_TLS_ATTESTATION_SCHEME_UNKNOWN;
@@ -1155,18 +1954,9 @@ int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_
         *flags = 0;
     }
 
-    ret = init_from_env(&g_maa_base_url, RA_TLS_MAA_PROVIDER_URL, /*default_val=*/NULL);
-    if (ret < 0) {
-        ERROR("Failed to read the environment variable RA_TLS_MAA_PROVIDER_URL\n");
-        goto out;
-    }
-
-    ret = init_from_env(&g_maa_api_version, RA_TLS_MAA_PROVIDER_API_VERSION,
-                        DEFAULT_MAA_PROVIDER_API_VERSION);
-    if (ret < 0) {
-        ERROR("Failed to read the environment variable RA_TLS_MAA_PROVIDER_API_VERSION\n");
+    ret = maa_global_init();
+    if (ret < 0)
         goto out;
-    }
 
     if (results)
         results->err_loc = AT_EXTRACT_QUOTE;
@@ -1198,36 +1988,52 @@ int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_
     if (ret < 0)
         goto out;
 
+    /* fast local reject: check the SGX quote from the certificate against the policy before
+     * contacting MAA (the MAA verdict is still required to accept the enclave) */
+    ret = precheck_quote_body(&quote->body, results);
+    if (ret < 0)
+        goto out;
+
     /* TODO: when MAA becomes standard, use results->maa.<fields> to expose more info on error */
     if (results)
         results->err_loc = AT_VERIFY_EXTERNAL;
 
-    /* initialize the MAA context, get the set of JWKs from the `certs/` MAA API endpoint, send the
-     * SGX quote to the `attest/` MAA API endpoint, and finally receive and verify the attestation
-     * response (JWT) */
-    ret = maa_init(&context);
-    if (ret < 0) {
-        goto out;
-    }
+    if (g_maa_verdict_cache_size > 0) {
+        /* look up the verdict for exactly this SGX quote in the verdict cache; all local checks
+         * below are performed on the cached verdict as well */
+        ret = maa_verdict_key(quote, quote_size, verdict_key);
+        if (ret < 0)
+            goto out;
 
-    /* a set of JWKs may change over time, so we better get them every time */
-    ret = maa_get_signing_certs(context, &set_of_jwks);
-    if (ret < 0) {
-        goto out;
+        ret = maa_verdict_cache_lookup(verdict_key, &quote_from_maa, &jwt, &set_of_jwks);
+        if (ret < 0)
+            goto out;
+        verdict_cached = ret == 0;
     }
 
-    ret = maa_send_request(context, quote, quote_size, pk_der, pk_der_size, &response);
-    if (ret < 0 || !response || !response->data) {
-        goto out;
-    }
+    if (!verdict_cached) {
+        /* take a (pooled) MAA context, send the SGX quote to the `attest/` MAA API endpoint, and
+         * finally receive and verify the attestation response (JWT); the set of JWKs needed to
+         * verify the JWT is taken from the cache or fetched from the `certs/` MAA API endpoint */
+        ret = maa_init(&context);
+        if (ret < 0) {
+            goto out;
+        }
 
-    /* The attestation response is JWT -- we need to verify its signature using one of the set of
-     * JWKs, as well as verify its header and payload, and construct an SGX quote from the
-     * JWT-payload values to be used in further `verify_*` functions */
-    ret = maa_verify_response_output_quote(response, set_of_jwks, &quote_from_maa);
-    if (ret < 0) {
-        ret = MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
-        goto out;
+        ret = maa_send_request(context, quote, quote_size, pk_der, pk_der_size, &response);
+        if (ret < 0 || !response || !response->data) {
+            goto out;
+        }
+
+        /* The attestation response is JWT -- we need to verify its signature using one of the set
+         * of JWKs, as well as verify its header and payload, and construct an SGX quote from the
+         * JWT-payload values to be used in further `verify_*` functions */
+        ret = maa_verify_response_output_quote(context, response, &quote_from_maa, &jwt,
+                                               &set_of_jwks, &jwt_expiration_time);
+        if (ret < 0) {
+            ret = MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
+            goto out;
+        }
     }
 
     /* verify that the SGX quote sent to MAA has the same measurements as the constructed from the
@@ -1276,16 +2082,29 @@ int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_
         goto out;
     }
 
+    if (g_maa_verdict_cache_size > 0 && !verdict_cached) {
+        maa_verdict_cache_insert(verdict_key, quote_from_maa, jwt, set_of_jwks,
+                                 jwt_expiration_time);
+    }
+
+    ret = maa_expose_jwt(&jwt, &set_of_jwks);
+    if (ret < 0)
+        goto out;
+
     if (results)
         results->err_loc = AT_NONE;
     ret = 0;
 out:
+    maa_record_verification_timing(start_us, context ? context->network_us : 0, verdict_cached,
+                                   ret);
+
     if (context)
-        maa_cleanup(context);
+        maa_release(context);
 
     if (response)
         response_cleanup(response);
 
+    free(jwt);
     free(set_of_jwks);
     free(quote_from_maa);
     return ret;
@@ -25,14 +25,21 @@
  *   a public key that corresponds to the private key with which the JWT was signed), e.g.
  *   `https://portal.trustauthority.intel.com`.
  *
+ * The two requests are independent, so they are sent concurrently (via the curl multi interface).
+ *
  * This file is part of the RA-TLS verification library which is typically linked into client
- * applications. This library is *not* thread-safe.
+ * applications. Verifications may run concurrently in multiple threads: curl is initialized only
+ * once, connections to ITA are kept alive in a pool of ITA contexts, and DNS results and TLS
+ * sessions are shared between these contexts. Note however that the RA_TLS_ITA_* environment
+ * variables exposed on successful verification are process-wide.
  */
 
 #define _GNU_SOURCE
 #include <assert.h>
 #include <ctype.h>
 #include <errno.h>
+#include <inttypes.h>
+#include <pthread.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -71,6 +78,10 @@ extern verify_measurements_cb_t g_verify_measurements_cb;
 #define RA_TLS_ITA_API_KEY              "RA_TLS_ITA_API_KEY"
 #define RA_TLS_ITA_POLICY_IDS           "RA_TLS_ITA_POLICY_IDS"
 #define RA_TLS_ITA_PORTAL_URL           "RA_TLS_ITA_PORTAL_URL"
+#define RA_TLS_ITA_VERDICT_CACHE_SIZE   "RA_TLS_ITA_VERDICT_CACHE_SIZE"
+#define RA_TLS_ITA_VERDICT_CACHE_TTL    "RA_TLS_ITA_VERDICT_CACHE_TTL"
+#define RA_TLS_ITA_TIMING               "RA_TLS_ITA_TIMING"
+#define RA_TLS_ITA_EXPOSE_JWT           "RA_TLS_ITA_EXPOSE_JWT"
 
 #define ITA_URL_MAX_SIZE 256
 #define ITA_API_KEY_MAX_SIZE 256
@@ -84,7 +95,24 @@ extern verify_measurements_cb_t g_verify_measurements_cb;
 /** Default API version for ITA API endpoints. */
 #define DEFAULT_ITA_PROVIDER_API_VERSION "v1"
 
-/* Environment variables exposed by successful RA-TLS verification API */
+/** Maximum number of idle ITA contexts (each with its kept-alive connections) kept for reuse. */
+#define ITA_CONTEXT_POOL_MAX_SIZE 16
+
+/** Default maximum number of cached ITA verdicts (verdict cache is disabled by default). */
+#define DEFAULT_ITA_VERDICT_CACHE_SIZE 0
+
+/** Default maximum time (in seconds) for which an ITA verdict is cached (never longer than the
+ * validity of the ITA JWT). */
+#define DEFAULT_ITA_VERDICT_CACHE_TTL 300
+
+/** Default for timing instrumentation of verifications (disabled by default). */
+#define DEFAULT_ITA_TIMING 0
+
+/** Default for exposing the JWT in environment variables (disabled by default, not thread-safe). */
+#define DEFAULT_ITA_EXPOSE_JWT 0
+
+/* Environment variables exposed by successful RA-TLS verification API (if enabled via
+ * RA_TLS_ITA_EXPOSE_JWT) */
 #define RA_TLS_ITA_JWT "RA_TLS_ITA_JWT"
 #define RA_TLS_ITA_SET_OF_JWKS "RA_TLS_ITA_SET_OF_JWKS"
 
@@ -92,14 +120,87 @@ static char* g_ita_base_url    = NULL;
 static char* g_ita_api_version = NULL;
 static char* g_ita_api_key     = NULL;
 static char* g_ita_portal_url  = NULL;
+static char* g_ita_policy_ids  = NULL; /* NULL if RA_TLS_ITA_POLICY_IDS is not set */
+static long g_ita_verdict_cache_size = -1;
+static long g_ita_verdict_cache_ttl  = -1;
+static long g_ita_expose_jwt         = -1;
+static long g_ita_timing             = -1;
+
+/*! Cumulative timings (in microseconds) of one kind of HTTPS requests sent to ITA (exported) */
+struct ra_tls_ita_request_timing {
+    uint64_t count;           /*!< number of sent requests (including failed ones) */
+    uint64_t new_connections; /*!< number of newly opened connections (not reused ones) */
+    uint64_t dns_us;          /*!< name resolution */
+    uint64_t connect_us;      /*!< TCP connection establishment */
+    uint64_t tls_us;          /*!< TLS handshake */
+    uint64_t server_us;       /*!< from sending the request until the first byte of response */
+    uint64_t transfer_us;     /*!< receiving the response */
+    uint64_t total_us;        /*!< whole request, including all of the above */
+};
+
+/*! Cumulative timing statistics of RA-TLS verifications (exported) */
+struct ra_tls_ita_timing_stats {
+    uint64_t verifications;                  /*!< number of verifications (including failed) */
+    uint64_t verification_us;                /*!< time spent in verifications */
+    uint64_t local_us;                       /*!< time spent outside of HTTPS requests */
+    struct ra_tls_ita_request_timing attest; /*!< `attest/` requests */
+    struct ra_tls_ita_request_timing certs;  /*!< `certs/` requests */
+};
+
+/* exported functions (see README), declared here to satisfy -Wmissing-prototypes */
+void ra_tls_ita_get_verdict_cache_stats(uint64_t* out_hits, uint64_t* out_misses,
+                                        uint64_t* out_evictions, size_t* out_entries);
+void ra_tls_ita_get_timing_stats(struct ra_tls_ita_timing_stats* out_stats);
+const char* ra_tls_ita_get_jwt(void);
+const char* ra_tls_ita_get_set_of_jwks(void);
 
-/*! Context used in ita_*() calls */
+/*! Context used in ita_*() calls; contexts are reused across verifications (see ita_init()) */
 struct ita_context {
-    bool curl_global_init_done;
-    CURL* curl;                 /*!< CURL context for this session */
-    struct curl_slist* headers; /*!< Request headers sent to ITA attestation provider */
+    CURLM* multi;               /*!< CURL multi handle that runs both requests concurrently */
+    CURL* certs_curl;           /*!< CURL context for `certs/` requests to ITA portal */
+    CURL* attest_curl;          /*!< CURL context for `attest/` requests to ITA provider */
+    struct curl_slist* headers; /*!< Request headers sent to ITA */
+    uint64_t network_us;        /*!< time spent in HTTPS requests in the current verification */
+    struct ita_context* next;   /*!< next idle context in the pool */
+};
+
+/* one-time global initialization (environment variables, curl), protected by `g_ita_init_lock` */
+static pthread_mutex_t g_ita_init_lock = PTHREAD_MUTEX_INITIALIZER;
+static bool g_ita_init_done = false;
+
+/* DNS cache and TLS sessions shared by all curl handles */
+static CURLSH* g_ita_curl_share = NULL;
+static pthread_mutex_t g_ita_curl_share_locks[CURL_LOCK_DATA_LAST];
+
+/* idle ITA contexts (with their kept-alive connections), protected by `g_ita_context_pool_lock` */
+static pthread_mutex_t g_ita_context_pool_lock = PTHREAD_MUTEX_INITIALIZER;
+static struct ita_context* g_ita_context_pool = NULL;
+static size_t g_ita_context_pool_size = 0;
+
+/*! Cached verdict of a successful verification of an SGX quote by ITA */
+struct ita_verdict {
+    uint8_t key[32];             /*!< SHA256 hash over SGX quote and verification policy */
+    sgx_quote_body_t quote_body; /*!< SGX quote body constructed from the ITA JWT payload */
+    char* jwt;                   /*!< ITA JWT (base64url-encoded string) */
+    char* set_of_jwks;           /*!< set of JWKs used to verify the JWT (JSON string) */
+    time_t expiration_time;      /*!< verdict isn't used after this time (at latest, JWT's `exp`) */
+    struct ita_verdict* prev;    /*!< more recently used verdict */
+    struct ita_verdict* next;    /*!< less recently used verdict */
 };
 
+/* LRU cache of ITA verdicts, protected by `g_ita_verdict_cache_lock` */
+static pthread_mutex_t g_ita_verdict_cache_lock = PTHREAD_MUTEX_INITIALIZER;
+static struct ita_verdict* g_ita_verdict_cache_head = NULL; /* most recently used */
+static struct ita_verdict* g_ita_verdict_cache_tail = NULL; /* least recently used */
+static size_t g_ita_verdict_cache_entries = 0;
+static uint64_t g_ita_verdict_cache_hits = 0;
+static uint64_t g_ita_verdict_cache_misses = 0;
+static uint64_t g_ita_verdict_cache_evictions = 0;
+
+/* timing statistics (only if enabled via RA_TLS_ITA_TIMING), protected by `g_ita_timing_lock` */
+static pthread_mutex_t g_ita_timing_lock = PTHREAD_MUTEX_INITIALIZER;
+static struct ra_tls_ita_timing_stats g_ita_timing_stats = {0};
+
 /*! ITA response (JWT token for `attest/` API, set of Signing keys for `certs/` API) */
 struct ita_response {
     char* data;              /*!< response (JSON string) */
@@ -197,6 +298,28 @@ static int init_from_env(char** ptr, const char* env_name, const char* default_v
     return 0;
 }
 
+static int init_long_from_env(long* ptr, const char* env_name, long default_val) {
+    if (*ptr >= 0) {
+        /* already initialized */
+        return 0;
+    }
+
+    char* env_val = getenv(env_name);
+    if (!env_val) {
+        *ptr = default_val;
+        return 0;
+    }
+
+    char* endptr;
+    errno = 0;
+    long val = strtol(env_val, &endptr, 10);
+    if (errno || endptr == env_val || *endptr != '\0' || val < 0)
+        return MBEDTLS_ERR_X509_BAD_INPUT_DATA;
+
+    *ptr = val;
+    return 0;
+}
+
 static int verify_quote_body_enclave_attributes(sgx_quote_body_t* quote_body,
                                                 bool allow_debug_enclave) {
     if (!allow_debug_enclave && (quote_body->report_body.attributes.flags & SGX_FLAGS_DEBUG)) {
@@ -274,225 +397,381 @@ static void response_cleanup(struct ita_response* response) {
     free(response);
 }
 
-static void ita_cleanup(struct ita_context* context) {
-    if (!context)
-        return;
-
-    curl_slist_free_all(context->headers);
-    curl_easy_cleanup(context->curl);
-
-    /* every curl_global_init() must have a corresponding curl_global_cleanup() */
-    if (context->curl_global_init_done)
-        curl_global_cleanup();
+static void curl_share_lock(CURL* handle, curl_lock_data data, curl_lock_access access,
+                            void* userptr) {
+    (void)handle;
+    (void)access;
+    (void)userptr;
+    pthread_mutex_lock(&g_ita_curl_share_locks[data]);
+}
 
-    free(context);
+static void curl_share_unlock(CURL* handle, curl_lock_data data, void* userptr) {
+    (void)handle;
+    (void)userptr;
+    pthread_mutex_unlock(&g_ita_curl_share_locks[data]);
 }
 
-static int ita_init(struct ita_context** out_context) {
+/*! Read ITA-specific environment variables and initialize curl (only once per process; curl is
+ * never deinitialized because the curl handles are kept for reuse until the process exits) */
+static int ita_global_init(void) {
     int ret;
-    char* api_key_hdr = NULL;
 
-    struct ita_context* context = calloc(1, sizeof(*context));
-    if (!context) {
-        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+    pthread_mutex_lock(&g_ita_init_lock);
+    if (g_ita_init_done) {
+        ret = 0;
+        goto out;
+    }
+
+    ret = init_from_env(&g_ita_base_url, RA_TLS_ITA_PROVIDER_URL, /*default_val=*/NULL);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_PROVIDER_URL\n");
+        goto out;
+    }
+
+    ret = init_from_env(&g_ita_api_version, RA_TLS_ITA_PROVIDER_API_VERSION,
+                        DEFAULT_ITA_PROVIDER_API_VERSION);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_PROVIDER_API_VERSION\n");
+        goto out;
+    }
+
+    ret = init_from_env(&g_ita_api_key, RA_TLS_ITA_API_KEY, /*default_val=*/NULL);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_API_KEY\n");
+        goto out;
+    }
+
+    ret = init_from_env(&g_ita_portal_url, RA_TLS_ITA_PORTAL_URL, /*default_val=*/NULL);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_PORTAL_URL\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_ita_verdict_cache_size, RA_TLS_ITA_VERDICT_CACHE_SIZE,
+                             DEFAULT_ITA_VERDICT_CACHE_SIZE);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_VERDICT_CACHE_SIZE\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_ita_verdict_cache_ttl, RA_TLS_ITA_VERDICT_CACHE_TTL,
+                             DEFAULT_ITA_VERDICT_CACHE_TTL);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_VERDICT_CACHE_TTL\n");
+        goto out;
+    }
+
+    const char* ita_policy_ids = getenv(RA_TLS_ITA_POLICY_IDS);
+    if (ita_policy_ids && !g_ita_policy_ids) {
+        /* sanity check that RA_TLS_ITA_POLICY_IDS specifies a JSON array of policy IDs (strings) */
+        cJSON* ita_policy_ids_parsed_check = cJSON_Parse(ita_policy_ids);
+        if (!ita_policy_ids_parsed_check || !cJSON_IsArray(ita_policy_ids_parsed_check)) {
+            ERROR("Environment variable RA_TLS_ITA_POLICY_IDS is not a JSON array of strings\n");
+            cJSON_Delete(ita_policy_ids_parsed_check);
+            ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+            goto out;
+        }
+        cJSON_Delete(ita_policy_ids_parsed_check);
+
+        g_ita_policy_ids = strdup(ita_policy_ids);
+        if (!g_ita_policy_ids) {
+            ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+            goto out;
+        }
+    }
+
+    ret = init_long_from_env(&g_ita_timing, RA_TLS_ITA_TIMING, DEFAULT_ITA_TIMING);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_TIMING\n");
+        goto out;
+    }
+
+    ret = init_long_from_env(&g_ita_expose_jwt, RA_TLS_ITA_EXPOSE_JWT, DEFAULT_ITA_EXPOSE_JWT);
+    if (ret < 0) {
+        ERROR("Failed to read the environment variable RA_TLS_ITA_EXPOSE_JWT\n");
         goto out;
     }
 
-    /* can be called multiple times */
     CURLcode curl_ret = curl_global_init(CURL_GLOBAL_ALL);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
-    context->curl_global_init_done = true;
 
-    context->curl = curl_easy_init();
-    if (!context->curl) {
+    for (size_t i = 0; i < CURL_LOCK_DATA_LAST; i++)
+        pthread_mutex_init(&g_ita_curl_share_locks[i], /*attr=*/NULL);
+
+    CURLSH* share = curl_share_init();
+    if (!share) {
+        curl_global_cleanup();
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    api_key_hdr = malloc(ITA_API_KEY_MAX_SIZE);
-    if (!api_key_hdr) {
-        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+    if (curl_share_setopt(share, CURLSHOPT_LOCKFUNC, curl_share_lock) != CURLSHE_OK ||
+            curl_share_setopt(share, CURLSHOPT_UNLOCKFUNC, curl_share_unlock) != CURLSHE_OK ||
+            curl_share_setopt(share, CURLSHOPT_SHARE, CURL_LOCK_DATA_DNS) != CURLSHE_OK ||
+            curl_share_setopt(share, CURLSHOPT_SHARE, CURL_LOCK_DATA_SSL_SESSION) != CURLSHE_OK) {
+        curl_share_cleanup(share);
+        curl_global_cleanup();
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    assert(g_ita_api_key);
-    ret = snprintf(api_key_hdr, ITA_API_KEY_MAX_SIZE, "x-api-key: %s", g_ita_api_key);
-    if (ret < 0 || (size_t)ret >= ITA_API_KEY_MAX_SIZE) {
-        ret = MBEDTLS_ERR_X509_BUFFER_TOO_SMALL;
+    g_ita_curl_share = share;
+    g_ita_init_done = true;
+    ret = 0;
+out:
+    pthread_mutex_unlock(&g_ita_init_lock);
+    return ret;
+}
+
+static void ita_context_free(struct ita_context* context) {
+    if (!context)
+        return;
+
+    /* easy handles are never left attached to the multi handle (see ita_perform_requests()) */
+    curl_easy_cleanup(context->certs_curl);
+    curl_easy_cleanup(context->attest_curl);
+    curl_multi_cleanup(context->multi);
+    curl_slist_free_all(context->headers);
+    free(context);
+}
+
+/*! Return the ITA context to the pool of idle contexts, so that its connections to ITA (if still
+ * alive) are reused by subsequent verifications */
+static void ita_release(struct ita_context* context) {
+    if (!context)
+        return;
+
+    pthread_mutex_lock(&g_ita_context_pool_lock);
+    if (g_ita_context_pool_size < ITA_CONTEXT_POOL_MAX_SIZE) {
+        context->next = g_ita_context_pool;
+        g_ita_context_pool = context;
+        g_ita_context_pool_size++;
+        context = NULL;
+    }
+    pthread_mutex_unlock(&g_ita_context_pool_lock);
+
+    ita_context_free(context);
+}
+
+/*! Create a CURL context for requests to \a url with common settings (ITA headers, shared DNS
+ * cache and TLS sessions, response callbacks) */
+static int ita_curl_init(struct curl_slist* headers, const char* url, CURL** out_curl) {
+    int ret;
+
+    CURL* curl = curl_easy_init();
+    if (!curl) {
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_SSLVERSION, CURL_SSLVERSION_MAX_DEFAULT);
+    CURLcode curl_ret;
+    curl_ret = curl_easy_setopt(curl, CURLOPT_SSLVERSION, CURL_SSLVERSION_MAX_DEFAULT);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_SSL_VERIFYPEER, 1L);
+    curl_ret = curl_easy_setopt(curl, CURLOPT_SSL_VERIFYPEER, 1L);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    /* set ITA API key as a header (required by ITA API for client authorization) */
-    context->headers = curl_slist_append(context->headers, api_key_hdr);
-    if (!context->headers) {
+    /* share DNS cache and TLS sessions with all other handles (TLS session resumption) */
+    curl_ret = curl_easy_setopt(curl, CURLOPT_SHARE, g_ita_curl_share);
+    if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    /* this `Accept:` header is required by ITA API */
-    context->headers = curl_slist_append(context->headers, "Accept: application/json");
-    if (!context->headers) {
+    /* keep the connection to ITA alive while the context is idle in the pool */
+    curl_ret = curl_easy_setopt(curl, CURLOPT_TCP_KEEPALIVE, 1L);
+    if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    context->headers = curl_slist_append(context->headers, "Content-Type: application/json");
-    if (!context->headers) {
+    /* required for using curl in multi-threaded applications */
+    curl_ret = curl_easy_setopt(curl, CURLOPT_NOSIGNAL, 1L);
+    if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_HTTPHEADER, context->headers);
+    curl_ret = curl_easy_setopt(curl, CURLOPT_HTTPHEADER, headers);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_HEADERFUNCTION, header_callback);
+    curl_ret = curl_easy_setopt(curl, CURLOPT_HEADERFUNCTION, header_callback);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_WRITEFUNCTION, body_callback);
+    curl_ret = curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, body_callback);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    *out_context = context;
+    curl_ret = curl_easy_setopt(curl, CURLOPT_URL, url);
+    if (curl_ret != CURLE_OK) {
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+        goto out;
+    }
+
+    *out_curl = curl;
     ret = 0;
 out:
     if (ret < 0) {
-        ita_cleanup(context);
+        curl_easy_cleanup(curl);
     }
-    free(api_key_hdr);
     return ret;
 }
 
-/*! Send GET request (empty) to ITA portal's `certs/` API endpoint and save the resulting set of
- * JWKs in \a out_set_of_jwks; caller is responsible for its cleanup */
-static int ita_get_signing_certs(struct ita_context* context, char** out_set_of_jwks) {
+/*! Take an idle ITA context from the pool or create a new one; must be returned via ita_release()
+ * or freed via ita_context_free() */
+static int ita_init(struct ita_context** out_context) {
     int ret;
-
+    char* api_key_hdr = NULL;
     char* request_url = NULL;
-    struct ita_response* response = NULL;
 
-    /* prepare sending "GET certs" to ITA and receiving a response (using Curl) */
-    response = calloc(1, sizeof(*response));
-    if (!response) {
+    pthread_mutex_lock(&g_ita_context_pool_lock);
+    struct ita_context* context = g_ita_context_pool;
+    if (context) {
+        g_ita_context_pool = context->next;
+        g_ita_context_pool_size--;
+        context->next = NULL;
+    }
+    pthread_mutex_unlock(&g_ita_context_pool_lock);
+
+    if (context) {
+        context->network_us = 0;
+        *out_context = context;
+        return 0;
+    }
+
+    context = calloc(1, sizeof(*context));
+    if (!context) {
         ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
         goto out;
     }
 
-    request_url = malloc(ITA_URL_MAX_SIZE);
-    if (!request_url) {
+    api_key_hdr = malloc(ITA_API_KEY_MAX_SIZE);
+    if (!api_key_hdr) {
         ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
         goto out;
     }
 
-    ret = snprintf(request_url, ITA_URL_MAX_SIZE, "%s/%s", g_ita_portal_url,
-                   ITA_URL_CERTS_ENDPOINT);
-    if (ret < 0 || (size_t)ret >= ITA_URL_MAX_SIZE) {
+    assert(g_ita_api_key);
+    ret = snprintf(api_key_hdr, ITA_API_KEY_MAX_SIZE, "x-api-key: %s", g_ita_api_key);
+    if (ret < 0 || (size_t)ret >= ITA_API_KEY_MAX_SIZE) {
         ret = MBEDTLS_ERR_X509_BUFFER_TOO_SMALL;
         goto out;
     }
 
-    CURLcode curl_ret;
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_URL, request_url);
-    if (curl_ret != CURLE_OK) {
+    /* set ITA API key as a header (required by ITA API for client authorization) */
+    context->headers = curl_slist_append(context->headers, api_key_hdr);
+    if (!context->headers) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_HTTPGET, 1);
-    if (curl_ret != CURLE_OK) {
+    /* this `Accept:` header is required by ITA API */
+    context->headers = curl_slist_append(context->headers, "Accept: application/json");
+    if (!context->headers) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_HEADERDATA, response);
-    if (curl_ret != CURLE_OK) {
+    context->headers = curl_slist_append(context->headers, "Content-Type: application/json");
+    if (!context->headers) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_WRITEDATA, response);
-    if (curl_ret != CURLE_OK) {
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+    request_url = malloc(ITA_URL_MAX_SIZE);
+    if (!request_url) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
         goto out;
     }
 
-    /* send the "GET certs" request, callbacks will store results in `response` */
-    curl_ret = curl_easy_perform(context->curl);
-    if (curl_ret != CURLE_OK) {
-        ERROR("Failed to send the ITA \"GET certs\" request to `%s`\n", request_url);
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+    ret = snprintf(request_url, ITA_URL_MAX_SIZE, "%s/%s", g_ita_portal_url,
+                   ITA_URL_CERTS_ENDPOINT);
+    if (ret < 0 || (size_t)ret >= ITA_URL_MAX_SIZE) {
+        ret = MBEDTLS_ERR_X509_BUFFER_TOO_SMALL;
         goto out;
     }
 
-    long response_code;
-    curl_ret = curl_easy_getinfo(context->curl, CURLINFO_RESPONSE_CODE, &response_code);
-    if (curl_ret != CURLE_OK) {
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+    ret = ita_curl_init(context->headers, request_url, &context->certs_curl);
+    if (ret < 0)
         goto out;
-    }
 
-    if (response_code != 200) {
-        ERROR("ITA \"GET certs\" request failed with code %ld and message `%s`\n", response_code,
-              response->data);
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+    ret = snprintf(request_url, ITA_URL_MAX_SIZE, "%s/appraisal/%s/" ITA_URL_ATTEST_ENDPOINT,
+                   g_ita_base_url, g_ita_api_version);
+    if (ret < 0 || (size_t)ret >= ITA_URL_MAX_SIZE) {
+        ret = MBEDTLS_ERR_X509_BUFFER_TOO_SMALL;
         goto out;
     }
 
-    if (!response->data) {
-        ERROR("ITA \"GET certs\" response doesn't have the set of JSON Web Keys (JWKs)\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+    ret = ita_curl_init(context->headers, request_url, &context->attest_curl);
+    if (ret < 0)
         goto out;
-    }
 
-    char* set_of_jwks = strdup(response->data);
-    if (!set_of_jwks) {
-        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+    /* the multi handle owns the connection cache, so connections to both ITA portal and ITA
+     * attestation provider stay with this context */
+    context->multi = curl_multi_init();
+    if (!context->multi) {
+        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    *out_set_of_jwks = set_of_jwks;
+    *out_context = context;
     ret = 0;
 out:
-    response_cleanup(response);
+    if (ret < 0) {
+        ita_context_free(context);
+    }
+    free(api_key_hdr);
     free(request_url);
     return ret;
 }
 
-/*! Send request (with \a quote embedded in it) to ITA attestation provider's `attest/` API endpoint
- * and save response in \a out_ita_response; caller is responsible for its cleanup */
-static int ita_send_request(struct ita_context* context, const void* quote, size_t quote_size,
-                            const void* runtime_data, size_t runtime_data_size,
-                            struct ita_response** out_ita_response) {
+/*! Prepare GET request (empty) to ITA portal's `certs/` API endpoint; the resulting set of JWKs
+ * will be stored in \a response by ita_perform_requests() */
+static int ita_prepare_get_signing_certs(struct ita_context* context,
+                                         struct ita_response* response) {
+    CURLcode curl_ret;
+    curl_ret = curl_easy_setopt(context->certs_curl, CURLOPT_HTTPGET, 1);
+    if (curl_ret != CURLE_OK)
+        return MBEDTLS_ERR_X509_FATAL_ERROR;
+
+    curl_ret = curl_easy_setopt(context->certs_curl, CURLOPT_HEADERDATA, response);
+    if (curl_ret != CURLE_OK)
+        return MBEDTLS_ERR_X509_FATAL_ERROR;
+
+    curl_ret = curl_easy_setopt(context->certs_curl, CURLOPT_WRITEDATA, response);
+    if (curl_ret != CURLE_OK)
+        return MBEDTLS_ERR_X509_FATAL_ERROR;
+
+    return 0;
+}
+
+/*! Prepare request (with \a quote embedded in it) to ITA attestation provider's `attest/` API
+ * endpoint; the response will be stored in \a response by ita_perform_requests() */
+static int ita_prepare_send_request(struct ita_context* context, const void* quote,
+                                    size_t quote_size, const void* runtime_data,
+                                    size_t runtime_data_size, struct ita_response* response) {
     int ret;
 
     char* quote_b64        = NULL;
     char* runtime_data_b64 = NULL;
     char* request_json     = NULL;
-    char* request_url      = NULL;
-
-    struct ita_response* response = NULL;
 
     /* get needed base64url buffer size for quote, allocate it and encode the quote */
     size_t quote_b64_size = 0;
@@ -533,24 +812,15 @@ static int ita_send_request(struct ita_context* context, const void* quote, size
     }
 
     /* construct JSON string with the attestation request to ITA; it contains the SGX quote, the
-     * "runtime data" (SGX report user data) and policy IDs (if any specified in the envvar) */
+     * "runtime data" (SGX report user data) and policy IDs (if any specified in the envvar, already
+     * checked to be a JSON array in ita_global_init()) */
     const char* request_json_fmt = NULL;
     size_t request_json_size = quote_b64_size + runtime_data_b64_size;
 
-    char* ita_policy_ids = getenv(RA_TLS_ITA_POLICY_IDS);
-    if (ita_policy_ids) {
-        /* sanity check that RA_TLS_ITA_POLICY_IDS specifies a JSON array of policy IDs (strings) */
-        cJSON* ita_policy_ids_parsed_check = cJSON_Parse(ita_policy_ids);
-        if (!ita_policy_ids_parsed_check || !cJSON_IsArray(ita_policy_ids_parsed_check)) {
-            ERROR("Environment variable RA_TLS_ITA_POLICY_IDS is not a JSON array of strings\n");
-            ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-            goto out;
-        }
-        cJSON_Delete(ita_policy_ids_parsed_check);
-
+    if (g_ita_policy_ids) {
         request_json_fmt = "{\"quote\": \"%s\", \"runtime_data\": \"%s\","
                            " \"policy_ids\": %s}";
-        request_json_size += strlen(ita_policy_ids) + strlen(request_json_fmt) + 1;
+        request_json_size += strlen(g_ita_policy_ids) + strlen(request_json_fmt) + 1;
     } else {
         request_json_fmt = "{\"quote\": \"%s\", \"runtime_data\": \"%s\"}";
         request_json_size += strlen(request_json_fmt) + 1;
@@ -563,110 +833,254 @@ static int ita_send_request(struct ita_context* context, const void* quote, size
     }
 
     ret = snprintf(request_json, request_json_size, request_json_fmt, quote_b64, runtime_data_b64,
-                   ita_policy_ids ? ita_policy_ids : /*unused dummy*/"");
+                   g_ita_policy_ids ? g_ita_policy_ids : /*unused dummy*/"");
     if (ret < 0 || (size_t)ret >= request_json_size) {
         ret = MBEDTLS_ERR_X509_BUFFER_TOO_SMALL;
         goto out;
     }
 
-    /* prepare sending attestation request to ITA and receiving a response (using Curl) */
-    response = calloc(1, sizeof(*response));
-    if (!response) {
-        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
-        goto out;
-    }
-
-    request_url = malloc(ITA_URL_MAX_SIZE);
-    if (!request_url) {
-        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
-        goto out;
-    }
-
-    ret = snprintf(request_url, ITA_URL_MAX_SIZE, "%s/appraisal/%s/" ITA_URL_ATTEST_ENDPOINT,
-                   g_ita_base_url, g_ita_api_version);
-    if (ret < 0 || (size_t)ret >= ITA_URL_MAX_SIZE) {
-        ret = MBEDTLS_ERR_X509_BUFFER_TOO_SMALL;
-        goto out;
-    }
-
     CURLcode curl_ret;
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_URL, request_url);
+    curl_ret = curl_easy_setopt(context->attest_curl, CURLOPT_POST, 1);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_POST, 1);
+    /* copy the request, as it must outlive this function */
+    curl_ret = curl_easy_setopt(context->attest_curl, CURLOPT_COPYPOSTFIELDS, request_json);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_POSTFIELDS, request_json);
+    curl_ret = curl_easy_setopt(context->attest_curl, CURLOPT_HEADERDATA, response);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_HEADERDATA, response);
+    curl_ret = curl_easy_setopt(context->attest_curl, CURLOPT_WRITEDATA, response);
     if (curl_ret != CURLE_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    curl_ret = curl_easy_setopt(context->curl, CURLOPT_WRITEDATA, response);
-    if (curl_ret != CURLE_OK) {
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
+    ret = 0;
+out:
+    free(quote_b64);
+    free(runtime_data_b64);
+    free(request_json);
+    return ret;
+}
+
+static uint64_t monotonic_time_us(void) {
+    struct timespec ts;
+    if (clock_gettime(CLOCK_MONOTONIC, &ts) < 0)
+        return 0;
+    return (uint64_t)ts.tv_sec * 1000000 + (uint64_t)ts.tv_nsec / 1000;
+}
+
+static uint64_t time_diff_us(curl_off_t end, curl_off_t start) {
+    return end > start ? (uint64_t)(end - start) : 0;
+}
+
+/*! Log the timing breakdown of the just-finished HTTPS request \a curl (described by
+ * \a request_name), as reported by curl, and add it to \a stats; no-op unless timing
+ * instrumentation is enabled */
+static void ita_record_request_timing(CURL* curl, const char* request_name, CURLcode result,
+                                      struct ra_tls_ita_request_timing* stats) {
+    if (g_ita_timing <= 0)
+        return;
+
+    /* all times reported by curl are in microseconds, counted from the start of the request; on
+     * failure, the times of phases that weren't reached stay zero */
+    curl_off_t namelookup = 0, connect = 0, appconnect = 0, pretransfer = 0, starttransfer = 0;
+    curl_off_t total = 0;
+    long num_connects = 0;
+    long response_code = 0;
+    curl_easy_getinfo(curl, CURLINFO_NAMELOOKUP_TIME_T, &namelookup);
+    curl_easy_getinfo(curl, CURLINFO_CONNECT_TIME_T, &connect);
+    curl_easy_getinfo(curl, CURLINFO_APPCONNECT_TIME_T, &appconnect);
+    curl_easy_getinfo(curl, CURLINFO_PRETRANSFER_TIME_T, &pretransfer);
+    curl_easy_getinfo(curl, CURLINFO_STARTTRANSFER_TIME_T, &starttransfer);
+    curl_easy_getinfo(curl, CURLINFO_TOTAL_TIME_T, &total);
+    curl_easy_getinfo(curl, CURLINFO_NUM_CONNECTS, &num_connects);
+    curl_easy_getinfo(curl, CURLINFO_RESPONSE_CODE, &response_code);
+
+    struct ra_tls_ita_request_timing timing = {
+        .count           = 1,
+        .new_connections = num_connects > 0 ? (uint64_t)num_connects : 0,
+        .dns_us          = time_diff_us(namelookup, 0),
+        .connect_us      = connect ? time_diff_us(connect, namelookup) : 0,
+        .tls_us          = appconnect ? time_diff_us(appconnect, connect) : 0,
+        .server_us       = starttransfer ? time_diff_us(starttransfer, pretransfer) : 0,
+        .transfer_us     = starttransfer ? time_diff_us(total, starttransfer) : 0,
+        .total_us        = time_diff_us(total, 0),
+    };
+
+    INFO("ra_tls_ita_timing: request=%s curl_code=%d http_code=%ld new_connections=%" PRIu64
+         " dns_us=%" PRIu64 " connect_us=%" PRIu64 " tls_us=%" PRIu64 " server_us=%" PRIu64
+         " transfer_us=%" PRIu64 " total_us=%" PRIu64 "\n", request_name, (int)result,
+         response_code, timing.new_connections, timing.dns_us, timing.connect_us, timing.tls_us,
+         timing.server_us, timing.transfer_us, timing.total_us);
+
+    pthread_mutex_lock(&g_ita_timing_lock);
+    stats->count           += timing.count;
+    stats->new_connections += timing.new_connections;
+    stats->dns_us          += timing.dns_us;
+    stats->connect_us      += timing.connect_us;
+    stats->tls_us          += timing.tls_us;
+    stats->server_us       += timing.server_us;
+    stats->transfer_us     += timing.transfer_us;
+    stats->total_us        += timing.total_us;
+    pthread_mutex_unlock(&g_ita_timing_lock);
+}
+
+/*! Log the timing of the whole verification that started at \a start_us and ended with \a result,
+ * and add it to the cumulative statistics; no-op unless timing instrumentation is enabled */
+static void ita_record_verification_timing(uint64_t start_us, uint64_t network_us,
+                                           bool verdict_cached, int result) {
+    if (g_ita_timing <= 0)
+        return;
+
+    uint64_t end_us = monotonic_time_us();
+    uint64_t total_us = end_us > start_us ? end_us - start_us : 0;
+    uint64_t local_us = total_us > network_us ? total_us - network_us : 0;
+
+    INFO("ra_tls_ita_timing: verification result=%d cached=%d network_us=%" PRIu64 " local_us=%"
+         PRIu64 " total_us=%" PRIu64 "\n", result, verdict_cached ? 1 : 0, network_us, local_us,
+         total_us);
+
+    pthread_mutex_lock(&g_ita_timing_lock);
+    g_ita_timing_stats.verifications++;
+    g_ita_timing_stats.verification_us += total_us;
+    g_ita_timing_stats.local_us        += local_us;
+    pthread_mutex_unlock(&g_ita_timing_lock);
+}
+
+/*! Check the result of a finished request \a curl (described by \a request_name in error messages)
+ * and its HTTP response code */
+static int ita_check_response(CURL* curl, CURLcode result, const char* request_name,
+                              struct ita_response* response) {
+    if (result != CURLE_OK) {
+        char* request_url = NULL;
+        curl_easy_getinfo(curl, CURLINFO_EFFECTIVE_URL, &request_url);
+        ERROR("Failed to send the ITA %s request to `%s`: %s\n", request_name,
+              request_url ? request_url : "(unknown)", curl_easy_strerror(result));
+        return MBEDTLS_ERR_X509_FATAL_ERROR;
     }
 
-    /* send the attestation request, callbacks will store results in `response` */
-    curl_ret = curl_easy_perform(context->curl);
-    if (curl_ret != CURLE_OK) {
-        ERROR("Failed to send the ITA Attestation request to `%s`\n", request_url);
+    long response_code;
+    CURLcode curl_ret = curl_easy_getinfo(curl, CURLINFO_RESPONSE_CODE, &response_code);
+    if (curl_ret != CURLE_OK)
+        return MBEDTLS_ERR_X509_FATAL_ERROR;
+
+    if (response_code != 200) {
+        ERROR("ITA %s request failed with code %ld and message `%s`\n", request_name,
+              response_code, response->data);
+        return MBEDTLS_ERR_X509_FATAL_ERROR;
+    }
+
+    return 0;
+}
+
+/*! Send both prepared requests (see ita_prepare_get_signing_certs() and
+ * ita_prepare_send_request()) concurrently, wait until both complete, and check their responses;
+ * the set of JWKs is stored in \a certs_response and the JWT in \a attest_response */
+static int ita_perform_requests(struct ita_context* context, struct ita_response* certs_response,
+                                struct ita_response* attest_response) {
+    int ret;
+
+    bool certs_added  = false;
+    bool attest_added = false;
+
+    CURLcode certs_result  = CURLE_FAILED_INIT;
+    CURLcode attest_result = CURLE_FAILED_INIT;
+
+    if (curl_multi_add_handle(context->multi, context->certs_curl) != CURLM_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
+    certs_added = true;
 
-    long response_code;
-    curl_ret = curl_easy_getinfo(context->curl, CURLINFO_RESPONSE_CODE, &response_code);
-    if (curl_ret != CURLE_OK) {
+    if (curl_multi_add_handle(context->multi, context->attest_curl) != CURLM_OK) {
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
+    attest_added = true;
 
-    if (response_code != 200) {
-        ERROR("ITA Attestation request failed with code %ld and message `%s`\n", response_code,
-              response->data);
+    /* drive both transfers until they are complete; callbacks will store results in responses */
+    uint64_t start_us = g_ita_timing > 0 ? monotonic_time_us() : 0;
+    int still_running = 0;
+    do {
+        CURLMcode multi_ret = curl_multi_perform(context->multi, &still_running);
+        if (multi_ret == CURLM_OK && still_running)
+            multi_ret = curl_multi_poll(context->multi, /*extra_fds=*/NULL, /*extra_nfds=*/0,
+                                        /*timeout_ms=*/1000, /*numfds=*/NULL);
+        if (multi_ret != CURLM_OK) {
+            ERROR("Failed to send the ITA requests: %s\n", curl_multi_strerror(multi_ret));
+            ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+            goto out;
+        }
+    } while (still_running);
+
+    /* the requests overlap, so the time spent in them is the wall-clock time of the above loop */
+    if (g_ita_timing > 0)
+        context->network_us += monotonic_time_us() - start_us;
+
+    CURLMsg* msg;
+    int msgs_left;
+    while ((msg = curl_multi_info_read(context->multi, &msgs_left))) {
+        if (msg->msg != CURLMSG_DONE)
+            continue;
+        if (msg->easy_handle == context->certs_curl) {
+            certs_result = msg->data.result;
+            ita_record_request_timing(context->certs_curl, "certs", certs_result,
+                                      &g_ita_timing_stats.certs);
+        } else if (msg->easy_handle == context->attest_curl) {
+            attest_result = msg->data.result;
+            ita_record_request_timing(context->attest_curl, "attest", attest_result,
+                                      &g_ita_timing_stats.attest);
+        }
+    }
+
+    ret = ita_check_response(context->certs_curl, certs_result, "\"GET certs\"", certs_response);
+    if (ret < 0)
+        goto out;
+
+    if (!certs_response->data) {
+        ERROR("ITA \"GET certs\" response doesn't have the set of JSON Web Keys (JWKs)\n");
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    if (!response->data) {
+    ret = ita_check_response(context->attest_curl, attest_result, "Attestation", attest_response);
+    if (ret < 0)
+        goto out;
+
+    if (!attest_response->data) {
         ERROR("ITA Attestation response doesn't have the JSON Web Token (JWT)\n");
         ret = MBEDTLS_ERR_X509_FATAL_ERROR;
         goto out;
     }
 
-    *out_ita_response = response;
     ret = 0;
-
 out:
-    if (ret < 0 && response) {
-        response_cleanup(response);
-    }
-    free(quote_b64);
-    free(runtime_data_b64);
-    free(request_json);
-    free(request_url);
+    /* detach the handles, so that they can be reused by the next verification with this context */
+    if (certs_added)
+        curl_multi_remove_handle(context->multi, context->certs_curl);
+    if (attest_added)
+        curl_multi_remove_handle(context->multi, context->attest_curl);
     return ret;
 }
 
 /*! Verify the attestation response from ITA (the JWT token) and create a dummy SGX quote populated
- * with the SGX-enclave measurements from this response in \a out_quote_body; caller is responsible
- * for its cleanup */
+ * with the SGX-enclave measurements from this response in \a out_quote_body; also save the JWT in
+ * \a out_jwt and the JWT's expiration time in \a out_expiration_time; caller is responsible for
+ * their cleanup */
 static int ita_verify_response_output_quote(struct ita_response* response, const char* set_of_jwks,
-                                            sgx_quote_body_t** out_quote_body) {
+                                            sgx_quote_body_t** out_quote_body, char** out_jwt,
+                                            time_t* out_expiration_time) {
     int ret;
 
     sgx_quote_body_t* quote_body = NULL;
@@ -689,6 +1103,8 @@ static int ita_verify_response_output_quote(struct ita_response* response, const
     char* token_signing_x509cert_b64 = NULL; /* not allocated, so no need to free it */
     char* token_signing_x509cert     = NULL;
 
+    char* jwt = NULL;
+
     mbedtls_md_context_t md_context;
     mbedtls_md_init(&md_context);
 
@@ -1230,43 +1646,16 @@ static int ita_verify_response_output_quote(struct ita_response* response, const
     ERROR("--- set_of_jwks is ```%s``` ---\n", set_of_jwks);
 #endif
 
-    /*
-     * Expose JWT (as base64-formatted string) and "set of JWKs" (as JSON string) in envvars;
-     * at this point we know that JWT and "set of JWKs" are correctly formatted strings.
-     *
-     * NOTE: manipulations with envvars are not thread-safe.
-     */
-    if (getenv(RA_TLS_ITA_JWT)) {
-        ERROR("ITA JWT cannot be exposed through RA_TLS_ITA_JWT envvar because this envvar is "
-              "already used (you must unsetenv before calling RA-TLS verification)\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-    ret = setenv(RA_TLS_ITA_JWT, token_b64->valuestring, /*overwrite=*/1);
-    if (ret < 0) {
-        ERROR("ITA JWT cannot be exposed through RA_TLS_ITA_JWT envvar because setenv() failed "
-              "with error %d\n", errno);
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-
-    if (getenv(RA_TLS_ITA_SET_OF_JWKS)) {
-        ERROR("ITA \"Set of JWKs\" cannot be exposed through RA_TLS_ITA_SET_OF_JWKS envvar because "
-              "this envvar is already used (you must unsetenv before calling RA-TLS "
-              "verification)\n");
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
-        goto out;
-    }
-
-    ret = setenv(RA_TLS_ITA_SET_OF_JWKS, set_of_jwks, /*overwrite=*/1);
-    if (ret < 0) {
-        ERROR("ITA \"Set of JWKs\" cannot be exposed through RA_TLS_ITA_SET_OF_JWKS envvar because "
-              "setenv() failed with error %d\n", errno);
-        ret = MBEDTLS_ERR_X509_FATAL_ERROR;
+    jwt = strdup(token_b64->valuestring);
+    if (!jwt) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
         goto out;
     }
 
-    *out_quote_body = quote_body;
+    *out_quote_body      = quote_body;
+    *out_jwt             = jwt;
+    *out_expiration_time = (time_t)expiration_time->valueint;
+    jwt = NULL;
     ret = 0;
 out:
     if (ret < 0) {
@@ -1292,11 +1681,284 @@ out:
 
     free(ita_certs_url);
     free(token_signing_x509cert);
+    free(jwt);
     mbedtls_x509_crt_free(&token_signing_crt);
     mbedtls_md_free(&md_context);
     return ret;
 }
 
+/* JWT and set of JWKs of the last verification on each thread (NULL if it failed), returned by
+ * ra_tls_ita_get_jwt() and ra_tls_ita_get_set_of_jwks() */
+static __thread char* g_ita_thread_jwt = NULL;
+static __thread char* g_ita_thread_set_of_jwks = NULL;
+
+/* serializes setenv() calls of concurrent verifications (if RA_TLS_ITA_EXPOSE_JWT is enabled) */
+static pthread_mutex_t g_ita_expose_jwt_lock = PTHREAD_MUTEX_INITIALIZER;
+
+static void ita_clear_thread_jwt(void) {
+    free(g_ita_thread_jwt);
+    free(g_ita_thread_set_of_jwks);
+    g_ita_thread_jwt = NULL;
+    g_ita_thread_set_of_jwks = NULL;
+}
+
+/*! Expose JWT (as base64-formatted string) and "set of JWKs" (as JSON string) of a successful
+ * verification to the calling thread (see ra_tls_ita_get_jwt()) and, if enabled via
+ * RA_TLS_ITA_EXPOSE_JWT, in envvars; takes ownership of \a jwt and \a set_of_jwks (and sets them
+ * to NULL) on success. JWT and "set of JWKs" must be already verified to be correctly formatted
+ * strings */
+static int ita_expose_jwt(char** jwt, char** set_of_jwks) {
+    if (g_ita_expose_jwt > 0) {
+        /* NOTE: setenv() is not thread-safe w.r.t. getenv() in other threads, so envvars should
+         * only be enabled if verifications don't run concurrently; the lock only prevents
+         * concurrent verifications from corrupting the environment */
+        pthread_mutex_lock(&g_ita_expose_jwt_lock);
+        int ret = setenv(RA_TLS_ITA_JWT, *jwt, /*overwrite=*/1);
+        if (ret < 0) {
+            pthread_mutex_unlock(&g_ita_expose_jwt_lock);
+            ERROR("ITA JWT cannot be exposed through RA_TLS_ITA_JWT envvar because setenv() failed "
+                  "with error %d\n", errno);
+            return MBEDTLS_ERR_X509_FATAL_ERROR;
+        }
+
+        ret = setenv(RA_TLS_ITA_SET_OF_JWKS, *set_of_jwks, /*overwrite=*/1);
+        pthread_mutex_unlock(&g_ita_expose_jwt_lock);
+        if (ret < 0) {
+            ERROR("ITA \"Set of JWKs\" cannot be exposed through RA_TLS_ITA_SET_OF_JWKS envvar "
+                  "because setenv() failed with error %d\n", errno);
+            return MBEDTLS_ERR_X509_FATAL_ERROR;
+        }
+    }
+
+    ita_clear_thread_jwt();
+    g_ita_thread_jwt = *jwt;
+    g_ita_thread_set_of_jwks = *set_of_jwks;
+    *jwt = NULL;
+    *set_of_jwks = NULL;
+    return 0;
+}
+
+static void verdict_free(struct ita_verdict* verdict) {
+    if (!verdict)
+        return;
+
+    free(verdict->jwt);
+    free(verdict->set_of_jwks);
+    free(verdict);
+}
+
+/* must be called with `g_ita_verdict_cache_lock` held */
+static void verdict_cache_unlink(struct ita_verdict* verdict) {
+    if (verdict->prev)
+        verdict->prev->next = verdict->next;
+    else
+        g_ita_verdict_cache_head = verdict->next;
+
+    if (verdict->next)
+        verdict->next->prev = verdict->prev;
+    else
+        g_ita_verdict_cache_tail = verdict->prev;
+
+    verdict->prev = NULL;
+    verdict->next = NULL;
+    g_ita_verdict_cache_entries--;
+}
+
+/* must be called with `g_ita_verdict_cache_lock` held */
+static void verdict_cache_push_front(struct ita_verdict* verdict) {
+    verdict->prev = NULL;
+    verdict->next = g_ita_verdict_cache_head;
+    if (g_ita_verdict_cache_head)
+        g_ita_verdict_cache_head->prev = verdict;
+    else
+        g_ita_verdict_cache_tail = verdict;
+    g_ita_verdict_cache_head = verdict;
+    g_ita_verdict_cache_entries++;
+}
+
+/* must be called with `g_ita_verdict_cache_lock` held */
+static struct ita_verdict* verdict_cache_find(const uint8_t key[32]) {
+    struct ita_verdict* verdict = g_ita_verdict_cache_head;
+    while (verdict && memcmp(verdict->key, key, sizeof(verdict->key)))
+        verdict = verdict->next;
+    return verdict;
+}
+
+/*! Calculate the key of the verdict cache: SHA256 hash over the SGX \a quote and the verification
+ * policy, i.e. the ITA provider URL and API version, the ITA policy IDs and the allowed TCB
+ * statuses (ITA appraises the quote against the policies, and the TCB status is checked in
+ * ita_verify_response_output_quote()) */
+static int ita_verdict_key(const void* quote, size_t quote_size, uint8_t out_key[32]) {
+    int ret;
+
+    mbedtls_md_context_t md_context;
+    mbedtls_md_init(&md_context);
+
+    ret = mbedtls_md_setup(&md_context, mbedtls_md_info_from_type(MBEDTLS_MD_SHA256), /*hmac=*/0);
+    if (ret < 0)
+        goto out;
+
+    const char* ita_policy_ids = g_ita_policy_ids ? g_ita_policy_ids : "";
+
+    uint8_t allowed_tcb_statuses[3] = {
+        getenv_allow_outdated_tcb(),
+        getenv_allow_hw_config_needed(),
+        getenv_allow_sw_hardening_needed(),
+    };
+
+    mbedtls_md_starts(&md_context);
+    mbedtls_md_update(&md_context, quote, quote_size);
+    mbedtls_md_update(&md_context, (const uint8_t*)g_ita_base_url, strlen(g_ita_base_url) + 1);
+    mbedtls_md_update(&md_context, (const uint8_t*)g_ita_api_version,
+                      strlen(g_ita_api_version) + 1);
+    mbedtls_md_update(&md_context, (const uint8_t*)ita_policy_ids, strlen(ita_policy_ids) + 1);
+    mbedtls_md_update(&md_context, allowed_tcb_statuses, sizeof(allowed_tcb_statuses));
+    ret = mbedtls_md_finish(&md_context, out_key);
+out:
+    mbedtls_md_free(&md_context);
+    return ret;
+}
+
+/*! Find a non-expired verdict with \a key in the verdict cache and copy its SGX quote body, JWT and
+ * set of JWKs into \a out_quote_body, \a out_jwt and \a out_set_of_jwks; caller is responsible for
+ * their cleanup. Returns 1 if there is no such verdict. */
+static int ita_verdict_cache_lookup(const uint8_t key[32], sgx_quote_body_t** out_quote_body,
+                                    char** out_jwt, char** out_set_of_jwks) {
+    int ret;
+
+    sgx_quote_body_t* quote_body = NULL;
+    char* jwt                    = NULL;
+    char* set_of_jwks            = NULL;
+
+    time_t curr_time = time(NULL);
+
+    pthread_mutex_lock(&g_ita_verdict_cache_lock);
+    struct ita_verdict* verdict = verdict_cache_find(key);
+    if (verdict && (curr_time == (time_t)-1 || curr_time > verdict->expiration_time)) {
+        /* expired (or current time is unknown), drop it */
+        verdict_cache_unlink(verdict);
+        verdict_free(verdict);
+        verdict = NULL;
+    }
+
+    if (!verdict) {
+        g_ita_verdict_cache_misses++;
+        ret = 1;
+        goto out;
+    }
+
+    quote_body  = malloc(sizeof(*quote_body));
+    jwt         = strdup(verdict->jwt);
+    set_of_jwks = strdup(verdict->set_of_jwks);
+    if (!quote_body || !jwt || !set_of_jwks) {
+        ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+        goto out;
+    }
+    memcpy(quote_body, &verdict->quote_body, sizeof(*quote_body));
+
+    verdict_cache_unlink(verdict);
+    verdict_cache_push_front(verdict);
+    g_ita_verdict_cache_hits++;
+
+    *out_quote_body  = quote_body;
+    *out_jwt         = jwt;
+    *out_set_of_jwks = set_of_jwks;
+    quote_body  = NULL;
+    jwt         = NULL;
+    set_of_jwks = NULL;
+    ret = 0;
+out:
+    pthread_mutex_unlock(&g_ita_verdict_cache_lock);
+    free(quote_body);
+    free(jwt);
+    free(set_of_jwks);
+    return ret;
+}
+
+/*! Add the verdict of a successful verification to the verdict cache, evicting the least recently
+ * used verdicts if the cache is full; failures are ignored (the verdict is simply not cached) */
+static void ita_verdict_cache_insert(const uint8_t key[32], const sgx_quote_body_t* quote_body,
+                                     const char* jwt, const char* set_of_jwks,
+                                     time_t jwt_expiration_time) {
+    time_t curr_time = time(NULL);
+    if (curr_time == (time_t)-1)
+        return;
+
+    struct ita_verdict* verdict = calloc(1, sizeof(*verdict));
+    if (!verdict)
+        return;
+
+    verdict->jwt         = strdup(jwt);
+    verdict->set_of_jwks = strdup(set_of_jwks);
+    if (!verdict->jwt || !verdict->set_of_jwks) {
+        verdict_free(verdict);
+        return;
+    }
+
+    memcpy(verdict->key, key, sizeof(verdict->key));
+    memcpy(&verdict->quote_body, quote_body, sizeof(verdict->quote_body));
+
+    /* the verdict must not outlive the JWT it was derived from */
+    verdict->expiration_time = curr_time + g_ita_verdict_cache_ttl;
+    if (verdict->expiration_time > jwt_expiration_time)
+        verdict->expiration_time = jwt_expiration_time;
+
+    pthread_mutex_lock(&g_ita_verdict_cache_lock);
+    /* the same quote may have been verified concurrently, replace the older verdict */
+    struct ita_verdict* old_verdict = verdict_cache_find(key);
+    if (old_verdict) {
+        verdict_cache_unlink(old_verdict);
+        verdict_free(old_verdict);
+    }
+
+    while (g_ita_verdict_cache_tail &&
+            g_ita_verdict_cache_entries >= (size_t)g_ita_verdict_cache_size) {
+        struct ita_verdict* lru_verdict = g_ita_verdict_cache_tail;
+        verdict_cache_unlink(lru_verdict);
+        verdict_free(lru_verdict);
+        g_ita_verdict_cache_evictions++;
+    }
+
+    verdict_cache_push_front(verdict);
+    pthread_mutex_unlock(&g_ita_verdict_cache_lock);
+}
+
+/*! Get statistics of the verdict cache (exported function); any of the pointers may be NULL */
+void ra_tls_ita_get_verdict_cache_stats(uint64_t* out_hits, uint64_t* out_misses,
+                                        uint64_t* out_evictions, size_t* out_entries) {
+    pthread_mutex_lock(&g_ita_verdict_cache_lock);
+    if (out_hits)
+        *out_hits = g_ita_verdict_cache_hits;
+    if (out_misses)
+        *out_misses = g_ita_verdict_cache_misses;
+    if (out_evictions)
+        *out_evictions = g_ita_verdict_cache_evictions;
+    if (out_entries)
+        *out_entries = g_ita_verdict_cache_entries;
+    pthread_mutex_unlock(&g_ita_verdict_cache_lock);
+}
+
+/*! Get cumulative timing statistics of verifications (exported function); all counters stay zero
+ * unless timing instrumentation is enabled via RA_TLS_ITA_TIMING */
+void ra_tls_ita_get_timing_stats(struct ra_tls_ita_timing_stats* out_stats) {
+    pthread_mutex_lock(&g_ita_timing_lock);
+    *out_stats = g_ita_timing_stats;
+    pthread_mutex_unlock(&g_ita_timing_lock);
+}
+
+/*! Get the JWT (as base64-formatted string) of the last verification on the calling thread
+ * (exported function); NULL if it failed. Valid until the next verification on this thread. */
+const char* ra_tls_ita_get_jwt(void) {
+    return g_ita_thread_jwt;
+}
+
+/*! Get the set of JWKs (as JSON string) that verified the JWT of the last verification on the
+ * calling thread (exported function); NULL if it failed. Valid until the next verification on
+ * this thread. */
+const char* ra_tls_ita_get_set_of_jwks(void) {
+    return g_ita_thread_set_of_jwks;
+}
+
 /*! parse the public key \p pk into DER format and copy it into \p out_pk_der */
 static int parse_pk(mbedtls_pk_context* pk, uint8_t* out_pk_der, size_t* out_pk_der_size) {
     /* below function writes data at the end of the buffer */
@@ -1310,17 +1972,62 @@ static int parse_pk(mbedtls_pk_context* pk, uint8_t* out_pk_der, size_t* out_pk_
     return 0;
 }
 
+/*! Check the enclave attributes and measurements of the SGX quote body \a quote_body (taken from
+ * the RA-TLS certificate and not yet verified) against the configured policy. This allows to
+ * reject enclaves that would be rejected anyway before any network I/O; it does *not* replace the
+ * same checks on the SGX quote body constructed from the ITA JWT. Measurements are only checked
+ * here against the environment variables: a user-supplied measurements callback is invoked once,
+ * on the SGX quote body constructed from the ITA JWT. */
+static int precheck_quote_body(sgx_quote_body_t* quote_body,
+                               struct ra_tls_verify_callback_results* results) {
+    int ret;
+
+    if (results)
+        results->err_loc = AT_VERIFY_ENCLAVE_ATTRS;
+
+    ret = verify_quote_body_enclave_attributes(quote_body, getenv_allow_debug_enclave());
+    if (ret < 0) {
+        ERROR("Failed verification of SGX enclave attributes in the quote (before contacting "
+              "ITA)\n");
+        return MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
+    }
+
+    if (g_verify_measurements_cb)
+        return 0;
+
+    if (results)
+        results->err_loc = AT_VERIFY_ENCLAVE_MEASUREMENTS;
+
+    ret = verify_quote_body_against_envvar_measurements(quote_body);
+    if (ret < 0) {
+        ERROR("Failed verification of SGX measurements in the quote (before contacting ITA)\n");
+        return MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
+    }
+
+    return 0;
+}
+
 int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_t* flags) {
     struct ra_tls_verify_callback_results* results = (struct ra_tls_verify_callback_results*)data;
 
     int ret;
 
-    struct ita_context* context   = NULL;
-    struct ita_response* response = NULL;
-    char* set_of_jwks             = NULL;
+    struct ita_context* context         = NULL;
+    struct ita_response* certs_response = NULL;
+    struct ita_response* response       = NULL;
+    char* jwt                           = NULL;
+    char* set_of_jwks                   = NULL;
+    time_t jwt_expiration_time          = 0;
 
     sgx_quote_body_t* quote_from_ita = NULL;
 
+    uint8_t verdict_key[32];
+    bool verdict_cached = false;
+
+    uint64_t start_us = monotonic_time_us();
+
+    ita_clear_thread_jwt();
+
     if (results) {
         /* TODO: when ITA becomes standard, add RA_TLS_ATTESTATION_SCHEME_ita to core RA-TLS lib */
         results->attestation_scheme = RA_TLS_ATTESTATION_SCHEME_UNKNOWN;
@@ -1339,30 +2046,9 @@ int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_
         *flags = 0;
     }
 
-    ret = init_from_env(&g_ita_base_url, RA_TLS_ITA_PROVIDER_URL, /*default_val=*/NULL);
-    if (ret < 0) {
-        ERROR("Failed to read the environment variable RA_TLS_ITA_PROVIDER_URL\n");
-        goto out;
-    }
-
-    ret = init_from_env(&g_ita_api_version, RA_TLS_ITA_PROVIDER_API_VERSION,
-                        DEFAULT_ITA_PROVIDER_API_VERSION);
-    if (ret < 0) {
-        ERROR("Failed to read the environment variable RA_TLS_ITA_PROVIDER_API_VERSION\n");
-        goto out;
-    }
-
-    ret = init_from_env(&g_ita_api_key, RA_TLS_ITA_API_KEY, /*default_val=*/NULL);
-    if (ret < 0) {
-        ERROR("Failed to read the environment variable RA_TLS_ITA_API_KEY\n");
-        goto out;
-    }
-
-    ret = init_from_env(&g_ita_portal_url, RA_TLS_ITA_PORTAL_URL, /*default_val=*/NULL);
-    if (ret < 0) {
-        ERROR("Failed to read the environment variable RA_TLS_ITA_PORTAL_URL\n");
+    ret = ita_global_init();
+    if (ret < 0)
         goto out;
-    }
 
     if (results)
         results->err_loc = AT_EXTRACT_QUOTE;
@@ -1394,36 +2080,74 @@ int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_
     if (ret < 0)
         goto out;
 
+    /* fast local reject: check the SGX quote from the certificate against the policy before
+     * contacting ITA (the ITA verdict is still required to accept the enclave) */
+    ret = precheck_quote_body(&quote->body, results);
+    if (ret < 0)
+        goto out;
+
     /* TODO: when ITA becomes standard, use results->ita.<fields> to expose more info on error */
     if (results)
         results->err_loc = AT_VERIFY_EXTERNAL;
 
-    /* initialize the ITA context, get the set of JWKs from the `certs/` ITA Portal API endpoint,
-     * send the SGX quote to the `attest/` ITA Attestation Provider API endpoint, and finally
-     * receive and verify the attestation response (JWT) */
-    ret = ita_init(&context);
-    if (ret < 0) {
-        goto out;
-    }
+    if (g_ita_verdict_cache_size > 0) {
+        /* look up the verdict for exactly this SGX quote in the verdict cache; all local checks
+         * below are performed on the cached verdict as well */
+        ret = ita_verdict_key(quote, quote_size, verdict_key);
+        if (ret < 0)
+            goto out;
 
-    /* a set of JWKs may change over time, so we better get them every time */
-    ret = ita_get_signing_certs(context, &set_of_jwks);
-    if (ret < 0) {
-        goto out;
+        ret = ita_verdict_cache_lookup(verdict_key, &quote_from_ita, &jwt, &set_of_jwks);
+        if (ret < 0)
+            goto out;
+        verdict_cached = ret == 0;
     }
 
-    ret = ita_send_request(context, quote, quote_size, pk_der, pk_der_size, &response);
-    if (ret < 0 || !response || !response->data) {
-        goto out;
-    }
+    if (!verdict_cached) {
+        /* take a (pooled) ITA context, concurrently get the set of JWKs from the `certs/` ITA
+         * Portal API endpoint and send the SGX quote to the `attest/` ITA Attestation Provider API
+         * endpoint, and finally receive and verify the attestation response (JWT) */
+        ret = ita_init(&context);
+        if (ret < 0) {
+            goto out;
+        }
 
-    /* The attestation response is JWT -- we need to verify its signature using one of the set of
-     * JWKs, as well as verify its header and payload, and construct an SGX quote from the
-     * JWT-payload values to be used in further `verify_*` functions */
-    ret = ita_verify_response_output_quote(response, set_of_jwks, &quote_from_ita);
-    if (ret < 0) {
-        ret = MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
-        goto out;
+        certs_response = calloc(1, sizeof(*certs_response));
+        response = calloc(1, sizeof(*response));
+        if (!certs_response || !response) {
+            ret = MBEDTLS_ERR_X509_ALLOC_FAILED;
+            goto out;
+        }
+
+        /* a set of JWKs may change over time, so we better get them every time */
+        ret = ita_prepare_get_signing_certs(context, certs_response);
+        if (ret < 0) {
+            goto out;
+        }
+
+        ret = ita_prepare_send_request(context, quote, quote_size, pk_der, pk_der_size, response);
+        if (ret < 0) {
+            goto out;
+        }
+
+        ret = ita_perform_requests(context, certs_response, response);
+        if (ret < 0) {
+            goto out;
+        }
+
+        /* take ownership of the set of JWKs (JSON string) */
+        set_of_jwks = certs_response->data;
+        certs_response->data = NULL;
+
+        /* The attestation response is JWT -- we need to verify its signature using one of the set
+         * of JWKs, as well as verify its header and payload, and construct an SGX quote from the
+         * JWT-payload values to be used in further `verify_*` functions */
+        ret = ita_verify_response_output_quote(response, set_of_jwks, &quote_from_ita, &jwt,
+                                               &jwt_expiration_time);
+        if (ret < 0) {
+            ret = MBEDTLS_ERR_X509_CERT_VERIFY_FAILED;
+            goto out;
+        }
     }
 
     /* verify that the SGX quote sent to ITA has the same measurements as the constructed from the
@@ -1472,16 +2196,31 @@ int ra_tls_verify_callback(void* data, mbedtls_x509_crt* crt, int depth, uint32_
         goto out;
     }
 
+    if (g_ita_verdict_cache_size > 0 && !verdict_cached) {
+        ita_verdict_cache_insert(verdict_key, quote_from_ita, jwt, set_of_jwks,
+                                 jwt_expiration_time);
+    }
+
+    ret = ita_expose_jwt(&jwt, &set_of_jwks);
+    if (ret < 0)
+        goto out;
+
     if (results)
         results->err_loc = AT_NONE;
     ret = 0;
 out:
+    ita_record_verification_timing(start_us, context ? context->network_us : 0, verdict_cached,
+                                   ret);
+
     if (context)
-        ita_cleanup(context);
+        ita_release(context);
 
+    if (certs_response)
+        response_cleanup(certs_response);
     if (response)
         response_cleanup(response);
 
+    free(jwt);
     free(set_of_jwks);
     free(quote_from_ita);
     return ret;
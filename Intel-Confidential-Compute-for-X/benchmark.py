@@ -0,0 +1,359 @@
+#!/usr/bin/python
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# Copyright (C) 2024 Intel Corporation
+
+# This script quantifies the overhead of graminization for server workloads. For each requested
+# workload, it runs the original base image natively, the curated test GSC image (as generated by
+# `curate.py <workload> <base image> --test`) under gramine-direct and, if SGX is available, under
+# gramine-sgx. Each run is driven by a load generator (running in its own container on the host
+# network) at several concurrency levels, and the resulting throughput and latency percentiles of
+# all runs are collected into a single comparison report.
+#
+# The gramine-direct mode doesn't need SGX hardware, so the non-enclave overheads can be tracked on
+# any Linux machine (e.g. in CI).
+#
+# The workload-specific settings (default base image, server port, load generator and its
+# arguments) are read from `workloads/<workload>/benchmark.json`, see the "Benchmarking" section of
+# the README. The servers are run with the arguments and docker run flags of the test image (see
+# `insecure_args.txt`, `common_args.txt` and `docker_run_flags.txt`).
+
+import argparse
+import json
+import math
+import os
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import time
+
+from os import path
+
+modes = ('native', 'direct', 'sgx')
+sgx_devices = ('/dev/sgx_enclave', '/dev/sgx/enclave')
+default_memtier_image = 'redislabs/memtier_benchmark:2.0.0'
+# The default sysbench image is built locally with a pinned sysbench package (see
+# `build_sysbench_image()`), so that it doesn't change between runs like a `latest` tag
+default_sysbench_image = 'gsc-benchmark-sysbench:1.0.20'
+sysbench_dockerfile = '''FROM ubuntu:22.04
+RUN apt-get update \\
+    && apt-get install -y --no-install-recommends sysbench=1.0.20+ds-1 \\
+    && rm -rf /var/lib/apt/lists/*
+'''
+container_name = 'gsc-benchmark-server'
+
+def get_file_contents(in_file):
+    try:
+        with open(in_file, 'r') as pfile:
+            contents = pfile.read()
+    except FileNotFoundError:
+        contents = ''
+    return contents.strip()
+
+def load_workload_config(workload_type):
+    config_file = f'workloads/{workload_type}/benchmark.json'
+    try:
+        with open(config_file, 'r') as pfile:
+            config = json.load(pfile)
+    except FileNotFoundError:
+        raise ValueError(f'Workload `{workload_type}` has no benchmark settings (`{config_file}`)')
+
+    config.setdefault('load_generator_args', '')
+    config.setdefault('startup_timeout', 300)
+    if config.get('load_generator') not in ('memtier', 'sysbench') or 'port' not in config:
+        raise ValueError(f'`{config_file}` must specify `port` and `load_generator` (`memtier` or '
+                         '`sysbench`)')
+
+    workload_dir = path.abspath(f'workloads/{workload_type}')
+    docker_run_flags = get_file_contents(f'workloads/{workload_type}/docker_run_flags.txt')
+    config['docker_run_flags'] = docker_run_flags
+    config['native_docker_run_flags'] = config.get('native_docker_run_flags',
+                                                   docker_run_flags).format(
+                                                       workload_dir=workload_dir)
+    config['args'] = ' '.join(filter(None, [
+        get_file_contents(f'workloads/{workload_type}/insecure_args.txt'),
+        get_file_contents(f'workloads/{workload_type}/common_args.txt')]))
+    return config
+
+def get_sgx_device():
+    for device in sgx_devices:
+        if path.exists(device):
+            return device
+    return None
+
+def docker(*args, check=True, capture=False, timeout=None):
+    return subprocess.run(['docker', *args], check=check, text=True, timeout=timeout,
+                          stdout=subprocess.PIPE if capture else None,
+                          stderr=subprocess.STDOUT if capture else None)
+
+def image_exists(image):
+    return docker('image', 'inspect', image, check=False, capture=True).returncode == 0
+
+def build_sysbench_image(image):
+    if image != default_sysbench_image or image_exists(image):
+        return
+    print(f'Building `{image}` ...', flush=True)
+    subprocess.run(['docker', 'build', '-t', image, '-'], input=sysbench_dockerfile, text=True,
+                   check=True)
+
+def get_server_run_command(mode, image, config):
+    if mode == 'native':
+        flags = config['native_docker_run_flags']
+    elif mode == 'direct':
+        # GSC images run gramine-direct instead of gramine-sgx with `GSC_PAL=Linux`
+        flags = '-e GSC_PAL=Linux --security-opt seccomp=unconfined ' + config['docker_run_flags']
+    else:
+        device = get_sgx_device()
+        flags = f'--device={device}:{device} ' + config['docker_run_flags']
+    return (['run', '-d', '--name', container_name, '--net=host'] + shlex.split(flags) +
+            [image] + shlex.split(config['args']))
+
+def is_container_running():
+    result = docker('inspect', '-f', '{{.State.Running}}', container_name, check=False,
+                    capture=True)
+    return result.returncode == 0 and result.stdout.strip() == 'true'
+
+def wait_for_server(port, timeout):
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if not is_container_running():
+            return None
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return time.monotonic() - start
+        except OSError:
+            time.sleep(0.5)
+    return None
+
+def stop_server():
+    docker('rm', '-f', container_name, check=False, capture=True)
+
+# memtier_benchmark prints a table of results; its columns depend on the version and the requested
+# percentiles, so the `Totals` row is parsed according to the header row
+def parse_memtier_output(output):
+    header = None
+    for line in output.splitlines():
+        if line.startswith('Type '):
+            header = re.split(r'\s{2,}', line.strip())
+        elif line.startswith('Totals') and header:
+            values = dict(zip(header, line.split()))
+            latency = {}
+            for column, value in values.items():
+                match = re.fullmatch(r'(p[\d.]+|Avg\.) Latency', column)
+                if match and value != '---':
+                    name = 'avg' if match.group(1) == 'Avg.' else match.group(1)
+                    latency[name] = float(value)
+            return {'ops_per_s': float(values['Ops/sec']), 'latency_ms': latency}
+    raise ValueError('Could not find the `Totals` row in the memtier_benchmark output')
+
+def parse_sysbench_output(output):
+    match = re.search(r'transactions:\s+\d+\s+\(([\d.]+) per sec', output)
+    if not match:
+        raise ValueError('Could not find the number of transactions in the sysbench output')
+    result = {'ops_per_s': float(match.group(1)), 'latency_ms': {}}
+    match = re.search(r'queries:\s+\d+\s+\(([\d.]+) per sec', output)
+    if match:
+        result['queries_per_s'] = float(match.group(1))
+    for name, pattern in (('min', 'min'), ('avg', 'avg'), ('max', 'max'),
+                          ('p95', r'95th percentile'), ('p99', r'99th percentile')):
+        match = re.search(r'^\s*' + pattern + r':\s+([\d.]+)', output, flags=re.MULTILINE)
+        if match:
+            result['latency_ms'][name] = float(match.group(1))
+    return result
+
+def run_memtier(args, config, concurrency, duration):
+    # spread the connections over at most `--client-threads` load generator threads
+    threads = min(concurrency, args.client_threads)
+    clients = math.ceil(concurrency / threads)
+    result = docker('run', '--rm', '--net=host', '--entrypoint', 'memtier_benchmark',
+                    args.memtier_image, '--server=127.0.0.1', f'--port={config["port"]}',
+                    f'--threads={threads}', f'--clients={clients}', f'--test-time={duration}',
+                    '--print-percentiles=50,90,99,99.9', '--hide-histogram',
+                    *shlex.split(config['load_generator_args']), capture=True,
+                    timeout=duration + 120)
+    parsed = parse_memtier_output(result.stdout)
+    parsed['connections'] = threads * clients
+    return parsed
+
+def run_sysbench(args, config, concurrency, duration, command='run'):
+    result = docker('run', '--rm', '--net=host', '--entrypoint', 'sysbench', args.sysbench_image,
+                    *shlex.split(config['load_generator_args']), '--db-driver=mysql',
+                    '--mysql-host=127.0.0.1', f'--mysql-port={config["port"]}',
+                    f'--threads={concurrency}', f'--time={duration}', '--percentile=99',
+                    '--report-interval=0', command, capture=True, timeout=duration + 600)
+    if command != 'run':
+        return None
+    parsed = parse_sysbench_output(result.stdout)
+    parsed['connections'] = concurrency
+    return parsed
+
+def run_load(args, config, concurrency, duration):
+    if config['load_generator'] == 'memtier':
+        return run_memtier(args, config, concurrency, duration)
+    return run_sysbench(args, config, concurrency, duration)
+
+def benchmark_mode(args, workload_type, config, base_image, mode):
+    image = base_image if mode == 'native' else f'gsc-{base_image}'
+    run = {'workload': workload_type, 'mode': mode, 'image': image, 'results': []}
+    if not image_exists(image):
+        run['error'] = f'image `{image}` not found'
+        return run
+
+    stop_server()
+    print(f'[{workload_type}/{mode}] starting `{image}` ...', flush=True)
+    try:
+        docker(*get_server_run_command(mode, image, config), capture=True)
+        startup_time = wait_for_server(config['port'], config['startup_timeout'])
+        if startup_time is None:
+            logs = docker('logs', '--tail', '20', container_name, check=False, capture=True)
+            run['error'] = 'server did not become ready:\n' + logs.stdout
+            return run
+        run['startup_time_s'] = round(startup_time, 3)
+
+        if config['load_generator'] == 'sysbench':
+            run_sysbench(args, config, 1, args.duration, command='prepare')
+        if args.warmup:
+            run_load(args, config, max(args.concurrency), args.warmup)
+
+        for concurrency in args.concurrency:
+            result = run_load(args, config, concurrency, args.duration)
+            result['concurrency'] = concurrency
+            run['results'].append(result)
+            print(f'[{workload_type}/{mode}] concurrency {concurrency}: '
+                  f'{result["ops_per_s"]:.0f} ops/s, latency [ms] ' +
+                  ', '.join(f'{k} {v:.3f}' for k, v in result['latency_ms'].items()), flush=True)
+
+        if config['load_generator'] == 'sysbench':
+            run_sysbench(args, config, 1, args.duration, command='cleanup')
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError) as e:
+        output = getattr(e, 'stdout', None) or getattr(e, 'output', None) or ''
+        run['error'] = f'{e}\n{output}'.strip()
+    finally:
+        stop_server()
+    return run
+
+def add_relative_results(runs):
+    # throughput and latency of each Gramine run relative to the native run of the same workload
+    native = {(r['workload'], res['concurrency']): res
+              for r in runs if r['mode'] == 'native' for res in r['results']}
+    for run in runs:
+        if run['mode'] == 'native':
+            continue
+        for result in run['results']:
+            reference = native.get((run['workload'], result['concurrency']))
+            if not reference or not reference['ops_per_s']:
+                continue
+            result['relative_ops_per_s'] = round(result['ops_per_s'] / reference['ops_per_s'], 4)
+            for name, value in result['latency_ms'].items():
+                if reference['latency_ms'].get(name):
+                    result.setdefault('relative_latency', {})[name] = round(
+                        value / reference['latency_ms'][name], 4)
+
+# Latencies that the load generator doesn't report (e.g. the median of sysbench) are printed as `-`
+def format_latency(value):
+    return '-' if value is None else f'{value:.3f}'
+
+def print_report(runs):
+    print(f'\n{"Workload":<12}{"Mode":<8}{"Conc.":>6}{"Ops/s":>12}{"vs native":>11}'
+          f'{"p50 [ms]":>10}{"p99 [ms]":>10}')
+    for run in runs:
+        if 'error' in run:
+            print(f'{run["workload"]:<12}{run["mode"]:<8}  FAILED: {run["error"].splitlines()[0]}')
+            continue
+        for result in run['results']:
+            relative = result.get('relative_ops_per_s')
+            latency = result['latency_ms']
+            print(f'{run["workload"]:<12}{run["mode"]:<8}{result["concurrency"]:>6}'
+                  f'{result["ops_per_s"]:>12.0f}'
+                  f'{(f"{relative * 100:.1f}%" if relative else "-"):>11}'
+                  f'{format_latency(latency.get("p50")):>10}'
+                  f'{format_latency(latency.get("p99")):>10}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the performance of workloads run '
+                                     'natively, with gramine-direct and with gramine-sgx.')
+    parser.add_argument('workloads', nargs='+',
+        help='Workload types to benchmark, e.g. redis memcached mysql; use `<workload>=<base '
+             'image>` to benchmark another base image than the default one.')
+    parser.add_argument('-m', '--modes', default=None,
+        help='Comma-separated list of modes out of native,direct,sgx (default: native,direct and '
+             'sgx if an SGX device is present).')
+    parser.add_argument('-c', '--concurrency', default='1,8,32',
+        help='Comma-separated list of concurrency levels, i.e. client connections (default: '
+             '%(default)s).')
+    parser.add_argument('-d', '--duration', type=int, default=30,
+        help='Duration of each measurement in seconds (default: %(default)s).')
+    parser.add_argument('-w', '--warmup', type=int, default=5,
+        help='Duration of the warm-up load before the measurements in seconds (default: '
+             '%(default)s).')
+    parser.add_argument('--client-threads', type=int, default=4,
+        help='Maximum number of memtier_benchmark threads (default: %(default)s).')
+    parser.add_argument('--memtier-image', default=default_memtier_image,
+        help='Docker image with memtier_benchmark (default: %(default)s).')
+    parser.add_argument('--sysbench-image', default=default_sysbench_image,
+        help='Docker image with sysbench (default: %(default)s).')
+    parser.add_argument('--curate', action='store_true',
+        help='Curate the test GSC images (`curate.py <workload> <base image> --test`) if they '
+             'don\'t exist yet.')
+    parser.add_argument('-o', '--output', default='benchmark-report.json',
+        help='File to write the JSON report to (default: %(default)s).')
+    args = parser.parse_args()
+
+    try:
+        args.concurrency = [int(c) for c in args.concurrency.split(',') if c]
+    except ValueError:
+        parser.error('--concurrency must be a comma-separated list of integers')
+    if not args.concurrency or min(args.concurrency) < 1:
+        parser.error('--concurrency must list positive integers')
+
+    sgx_device = get_sgx_device()
+    if args.modes:
+        selected_modes = [m for m in args.modes.split(',') if m]
+        for mode in selected_modes:
+            if mode not in modes:
+                parser.error(f'Unknown mode `{mode}`')
+        if 'sgx' in selected_modes and not sgx_device:
+            parser.error('SGX mode requested, but no SGX device found')
+    else:
+        selected_modes = ['native', 'direct'] + (['sgx'] if sgx_device else [])
+
+    runs = []
+    for workload in args.workloads:
+        workload_type, _, base_image = workload.partition('=')
+        try:
+            config = load_workload_config(workload_type)
+        except ValueError as e:
+            print(f'Error: {e}')
+            return 1
+        base_image = base_image or config['base_image']
+        if config['load_generator'] == 'sysbench':
+            build_sysbench_image(args.sysbench_image)
+
+        if args.curate and set(selected_modes) - {'native'} and not image_exists(
+                f'gsc-{base_image}'):
+            subprocess.run([sys.executable, 'curate.py', workload_type, base_image, '--test'],
+                           check=False)
+
+        for mode in selected_modes:
+            runs.append(benchmark_mode(args, workload_type, config, base_image, mode))
+
+    add_relative_results(runs)
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'host': os.uname().nodename,
+        'sgx_device': sgx_device,
+        'modes': selected_modes,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'runs': runs,
+    }
+    with open(args.output, 'w') as pfile:
+        json.dump(report, pfile, indent=4)
+
+    print_report(runs)
+    print(f'\nReport written to `{args.output}`')
+    return 1 if any('error' in run for run in runs) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
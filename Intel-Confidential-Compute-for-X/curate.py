@@ -12,19 +12,32 @@
 # attestation evidence (SGX quote) sent by the latter image.
 
 import argparse
+import concurrent.futures
 import curses
 import docker
+import hashlib
+import io
 import json
+import math
 import os
 import os.path
+import posixpath
 import re
 import shlex
+import shutil
+import socket
+import socketserver
+import statistics
 import subprocess
 import sys
+import tarfile
+import tempfile
 import textwrap
+import threading
 import time
 
 from cProfile import label
+from fnmatch import fnmatchcase
 from util.constants import *
 from curses import KEY_BACKSPACE, wrapper
 from curses.textpad import Textbox, rectangle
@@ -191,13 +204,6 @@ def get_docker_image(docker_socket, image_name):
     except (docker.errors.ImageNotFound, docker.errors.APIError):
         return None
 
-def check_image_creation_success(win, docker_socket, image_name, log_file):
-    image = get_docker_image(docker_socket, image_name)
-    if image is None:
-        win.addstr(image_creation_failed.format(image_name, log_file))
-        win.getch()
-        sys.exit(1)
-
 def pull_docker_image(docker_socket, image_name):
     try:
         docker_image = docker_socket.images.pull(image_name)
@@ -282,24 +288,997 @@ def get_common_args(workload_type):
 def get_insecure_args(workload_type):
     return get_file_contents(f'workloads/{workload_type}/insecure_args.txt')
 
+# Reads the os-release file straight from the image filesystem: the container is only created
+# (so that its filesystem can be archived) but never started, thus the image's entrypoint and
+# available binaries don't matter.
+def read_image_os_release(docker_socket, image_name):
+    container = docker_socket.containers.create(image_name, entrypoint=['/os-release-probe'])
+    try:
+        for os_release_path in os_release_paths:
+            try:
+                bits, _ = container.get_archive(os_release_path)
+            except docker.errors.NotFound:
+                continue
+            with tarfile.open(fileobj=io.BytesIO(b''.join(bits))) as tar:
+                member = tar.next()
+                # e.g. `/etc/os-release` is typically a symlink to `/usr/lib/os-release`
+                if member is None or not member.isfile():
+                    continue
+                return tar.extractfile(member).read().decode('UTF-8')
+    finally:
+        container.remove(force=True)
+    return ''
+
+# Distro detection results are cached by image ID (the digest of the image config), so that
+# repeated and batch curations of the same image don't have to inspect its filesystem again.
+distro_cache_lock = threading.Lock()
+
+def load_distro_cache():
+    try:
+        with open(distro_cache_file, 'r') as pfile:
+            return json.load(pfile)
+    except (OSError, ValueError):
+        return {}
+
+def save_distro_cache_entry(image_id, distro):
+    with distro_cache_lock:
+        cache = load_distro_cache()
+        cache[image_id] = distro
+        os.makedirs(os.path.dirname(distro_cache_file), exist_ok=True)
+        tmp_file = f'{distro_cache_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as pfile:
+            json.dump(cache, pfile, indent=4)
+        os.replace(tmp_file, distro_cache_file)
+
+# Raises RuntimeError if the distro of `image_name` can't be determined
 def get_image_distro(docker_socket, image_name):
-    output = docker_socket.containers.run(image_name, entrypoint='cat /etc/os-release', remove=True)
-    output = output.decode('UTF-8')
+    image_id = docker_socket.images.get(image_name).id
+    with distro_cache_lock:
+        distro = load_distro_cache().get(image_id)
+    if distro:
+        return distro
+
+    output = read_image_os_release(docker_socket, image_name)
 
-    pattern_id = re.compile('^ID=(.*)', flags=re.MULTILINE)
+    pattern_id = re.compile('^ID=\"?([^\"\\n]*)\"?$', flags=re.MULTILINE)
     match = pattern_id.search(output)
     if match is None:
-        print(f'Error: Could not find distro ID')
-        exit(1)
+        raise RuntimeError('Could not find distro ID')
     distro_id = match.group(1)
 
-    pattern_version_id = re.compile('^VERSION_ID=\"(.*)\"', flags=re.MULTILINE)
+    pattern_version_id = re.compile('^VERSION_ID=\"?([^\"\\n]*)\"?$', flags=re.MULTILINE)
     match = pattern_version_id.search(output)
     if match is None:
-        print(f'Error: Could not find distro VERSION_ID')
-        exit(1)
+        raise RuntimeError('Could not find distro VERSION_ID')
     distro_version_id = match.group(1)
-    return distro_id + ':' + distro_version_id
+
+    distro = distro_id + ':' + distro_version_id
+    save_distro_cache_entry(image_id, distro)
+    return distro
+
+def get_args_json(user_args):
+    if not user_args:
+        return ''
+    return 'CMD ' + json.dumps(shlex.split(user_args))
+
+def start_verifier_helper(attestation_input, ef_required, enc_key_path_in_verifier,
+                          log_file_pointer, step=''):
+    return subprocess.Popen(['verifier/helper.sh', attestation_input, ef_required,
+                             enc_key_path_in_verifier, step], stdout=log_file_pointer,
+                            stderr=log_file_pointer)
+
+def run_verifier_helper(attestation_input, ef_required, enc_key_path_in_verifier,
+                        log_file_pointer, step=''):
+    return start_verifier_helper(attestation_input, ef_required, enc_key_path_in_verifier,
+                                 log_file_pointer, step).wait()
+
+# Tees the output of a curation script run into its log file line by line, and incrementally
+# extracts the current build stage (as announced by `log_stage` in the script) and the enclave
+# measurements (as printed by `gsc info-image`), so that neither the UI nor the run commands need
+# to read back the whole (potentially multi-GB) log file.
+class BuildLogParser:
+    def __init__(self, process, log_file_pointer):
+        self.process = process
+        self.log_file_pointer = log_file_pointer
+        self.stage = ''
+        self.stages = []
+        self.measurements = {}
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self.parse, daemon=True)
+        self.thread.start()
+
+    def parse(self):
+        for line in self.process.stdout:
+            self.log_file_pointer.write(line)
+            self.log_file_pointer.flush()
+            if line.startswith(stage_marker):
+                self.stage = line[len(stage_marker):].strip()
+                self.stages.append({'name': self.stage, 'start': time.time() - self.start_time})
+                continue
+            for name, pattern in measurement_patterns.items():
+                if name not in self.measurements:
+                    match = pattern.search(line)
+                    if match:
+                        self.measurements[name] = match.group(1).strip()
+
+    def wait(self):
+        exit_code = self.process.wait()
+        self.thread.join()
+        return exit_code
+
+    def get_measurements(self):
+        return {name: self.measurements.get(name, f'<{name}>') for name in measurement_patterns}
+
+    def write_build_record(self, record_file, workload_type, base_image_name, gsc_app_image,
+                           buildtype, build_options=None):
+        end = time.time() - self.start_time
+        stages = []
+        for i, stage in enumerate(self.stages):
+            stage_end = self.stages[i + 1]['start'] if i + 1 < len(self.stages) else end
+            stages.append({'name': stage['name'],
+                           'duration_s': round(stage_end - stage['start'], 3)})
+        record = {
+            'workload': workload_type,
+            'base_image': base_image_name,
+            'gsc_image': gsc_app_image,
+            'buildtype': buildtype,
+            'exit_code': self.process.returncode,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.start_time)),
+            'duration_s': round(end, 3),
+            'stages': stages,
+            'measurements': self.measurements,
+        }
+        if build_options:
+            record['startup_profile'] = build_options['startup_profile']
+            if build_options['sizing']:
+                record['enclave_sizing'] = build_options['sizing']
+            if build_options['file_trace']:
+                record['file_trace'] = build_options['file_trace']
+            if build_options['encryption']:
+                record['encryption'] = build_options['encryption']
+            if build_options['docker_host']:
+                record['docker_host'] = build_options['docker_host']
+        with open(record_file, 'w') as pfile:
+            json.dump(record, pfile, indent=4)
+
+def start_script_with_parser(cmd, log_file_pointer, build_options=None):
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                               errors='replace', env=get_curation_env(build_options))
+    return BuildLogParser(process, log_file_pointer)
+
+def start_test_curation_script(workload_type, base_image_name, image_distro, buildtype,
+                               log_file_pointer, build_options=None):
+    return start_script_with_parser(['util/curation_script.sh', workload_type, base_image_name,
+                                     image_distro, 'test', '', 'test-image', buildtype],
+                                    log_file_pointer, build_options)
+
+def get_test_run_command(workload_type, gsc_app_image):
+    args = get_insecure_args(workload_type) + ' ' + get_common_args(workload_type)
+    docker_run_flags = get_docker_run_flags(workload_type)
+    return test_run_cmd.format(docker_run_flags, gsc_app_image + ' ' + args)
+
+def start_curation_script(workload_type, base_image_name, image_distro, key_path, args_json,
+                          attestation_required, buildtype, ca_cert_path, env_required, envs,
+                          ef_required, encrypted_files, encryption_key_path, passphrase,
+                          log_file_pointer, build_options=None):
+    return start_script_with_parser(['util/curation_script.sh', workload_type, base_image_name,
+                                     image_distro, key_path, args_json, attestation_required,
+                                     buildtype, ca_cert_path, env_required, envs, ef_required,
+                                     encrypted_files, encryption_key_path, passphrase],
+                                    log_file_pointer, build_options)
+
+# Waits for the concurrently running image builds `builds` (list of (image name, Popen object,
+# log file, BuildLogParser or None) tuples), showing the state of each build in the user console.
+def wait_for_image_builds(user_console, guide_win, builds):
+    start = time.monotonic()
+    help_text = [log_progress.format(log_file) for _, _, log_file, _ in builds]
+    while True:
+        states = []
+        for image, process, _, parser in builds:
+            exit_code = process.poll()
+            if exit_code is None:
+                state = build_state_running.format(int(time.monotonic() - start))
+                if parser and parser.stage:
+                    state += f' - {parser.stage}'
+            else:
+                state = build_state_finished if exit_code == 0 else build_state_failed
+            states.append(build_progress_line.format(image, state))
+        update_user_and_commentary_win_array(user_console, guide_win, wait_message + states,
+                                             help_text)
+        if all(process.poll() is not None for _, process, _, _ in builds):
+            break
+        time.sleep(1)
+    for _, _, _, parser in builds:
+        if parser:
+            parser.wait()
+
+def check_images_creation_success(win, docker_socket, images):
+    failed = [(image, log_file) for image, log_file in images
+              if get_docker_image(docker_socket, image) is None]
+    if failed:
+        for image, log_file in failed:
+            win.addstr(image_creation_failed.format(image, log_file))
+        win.getch()
+        sys.exit(1)
+
+def get_run_commands(gsc_app_image, buildtype, flags, attestation_input, encryption_key_path,
+                     test_config, measurements):
+    host_net = ''
+    verifier_server = '<verifier-dns-name:port>'
+    if attestation_input == 'test':
+        host_net, verifier_server = '--net=host', '"localhost:4433"'
+    if host_net and host_net not in flags:
+        flags = flags + " " + host_net
+
+    if attestation_input not in ('done', 'test'):
+        return run_command_no_att.format(flags, gsc_app_image)
+
+    verifier_env_vars = ' -e RA_TLS_ALLOW_SW_HARDENING_NEEDED=1 '
+    if attestation_input == 'test':
+        verifier_env_vars += ' -e RA_TLS_ALLOW_OUTDATED_TCB_INSECURE=1 '
+    if buildtype != 'release':
+        verifier_env_vars += ' -e RA_TLS_ALLOW_DEBUG_ENCLAVE_INSECURE=1 '
+
+    ssl_folder_abs_path_on_host = os.path.abspath(ssl_folder_path_on_host)
+    verifier_cert_mount_str = verifier_cert_mount.format(ssl_folder_abs_path_on_host)
+    enc_keys_mount_str = ''
+    if encryption_key_path:
+        key_name_and_path = encryption_key_path.rsplit('/', 1)
+        enc_keys_mount_str =  enc_keys_mount.format(key_name_and_path[0])
+
+    m = measurements
+    verifier_run_command = (f'Execute below command to start verifier on a trusted system:\n'
+                            f'$ docker run {host_net} --device=/dev/sgx/enclave '
+                            f'-e RA_TLS_MRENCLAVE={m["mr_enclave"]} '
+                            f'-e RA_TLS_MRSIGNER={m["mr_signer"]} '
+                            f'-e RA_TLS_ISV_PROD_ID={m["isv_prod_id"]} '
+                            f'-e RA_TLS_ISV_SVN={m["isv_svn"]} '
+                            f'{verifier_env_vars}' + verifier_cert_mount_str + ' ' +
+                            enc_keys_mount_str + ' -it verifier:latest')
+    custom_image_dns_info = ''
+    if not test_config:
+        custom_image_dns_info = ('. Assign the correct DNS information of the verifier server'
+                                 ' to the environment variable SECRET_PROVISION_SERVERS')
+    return (f'{verifier_run_command} \n \n'
+            f'Execute below command to deploy the curated GSC image'
+            f'{custom_image_dns_info}:\n'
+            f'{workload_run.format(flags, verifier_server, gsc_app_image)}')
+
+# --------enclave sizing (profiling) interfaces---------------------------------------------------
+# With `--profile`, the base image is run once natively with a representative command and its
+# processes are sampled via the host's procfs. Each Gramine process runs in its own enclave, so the
+# sizing is based on the largest per-process peaks (virtual memory as the enclave must hold all
+# mappings, data segment/heap, resident memory, threads). The resulting values replace
+# `sgx.enclave_size` and `sgx.max_threads` of the manifest template (see `curation_script.sh`).
+
+# Returns the memory counters (in bytes) and the thread count of the host process `pid`, or None if
+# the process is gone
+def read_process_status(pid):
+    try:
+        with open(f'/proc/{pid}/status', 'r') as pfile:
+            status = pfile.read()
+    except OSError:
+        return None
+    values = {}
+    for name, field in profile_status_fields.items():
+        match = re.search(rf'^{field}:\s+(\d+)', status, flags=re.MULTILINE)
+        if match:
+            values[name] = int(match.group(1)) * (1 if field == 'Threads' else 1024)
+    return values
+
+def profile_workload(docker_socket, image_name, args, flags, duration):
+    container_name = 'curation-profile-' + re.sub('[:/]', '_', image_name)
+    subprocess.run(['docker', 'rm', '-f', container_name], stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    result = subprocess.run(['docker', 'run', '-d', '--name', container_name, *shlex.split(flags),
+                             image_name, *shlex.split(args)], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stdout.strip())
+
+    container = docker_socket.containers.get(container_name)
+    peaks = dict.fromkeys(list(profile_status_fields) + ['processes'], 0)
+    start = time.monotonic()
+    try:
+        while time.monotonic() - start < duration:
+            container.reload()
+            if container.status != 'running':
+                break
+            try:
+                top = container.top()
+            except docker.errors.APIError:
+                break
+            pid_index = top['Titles'].index('PID')
+            processes = 0
+            for process in top['Processes'] or []:
+                status = read_process_status(process[pid_index])
+                if status is None:
+                    continue
+                processes += 1
+                for name, value in status.items():
+                    peaks[name] = max(peaks[name], value)
+            peaks['processes'] = max(peaks['processes'], processes)
+            time.sleep(profile_sample_interval)
+
+        container.reload()
+        if container.status == 'exited' and container.attrs['State']['ExitCode'] != 0:
+            logs = container.logs(tail=10).decode('UTF-8', errors='replace').strip()
+            raise RuntimeError(f'exited with code {container.attrs["State"]["ExitCode"]}\n{logs}')
+    finally:
+        container.remove(force=True)
+
+    if not peaks['processes']:
+        raise RuntimeError('no processes observed (is procfs of the Docker host accessible?)')
+    peaks['duration_s'] = round(time.monotonic() - start, 1)
+    return peaks
+
+def format_size(size):
+    if size >= 1024 ** 3 and size % 1024 ** 3 == 0:
+        return f'{size // 1024 ** 3}G'
+    return f'{math.ceil(size / 1024 ** 2)}M'
+
+def compute_enclave_sizing(peaks, headroom):
+    needed = math.ceil(peaks['mapped'] * (1 + headroom)) + enclave_size_overhead
+    enclave_size = max(enclave_size_min, 1 << (needed - 1).bit_length())
+    max_threads = math.ceil(peaks['threads'] * (1 + headroom)) + enclave_internal_threads
+    return {
+        'enclave_size': format_size(enclave_size),
+        'max_threads': max_threads,
+        'headroom': headroom,
+        'observed': peaks,
+    }
+
+def describe_peaks(peaks):
+    return (f'mapped {format_size(peaks["mapped"])}, heap {format_size(peaks["heap"])}, '
+            f'rss {format_size(peaks["rss"])}, {peaks["threads"]} threads, '
+            f'{peaks["processes"]} processes')
+
+def profile_enclave_sizing(docker_socket, image_name, args, flags, duration, headroom):
+    peaks = profile_workload(docker_socket, image_name, args, flags, duration)
+    sizing = compute_enclave_sizing(peaks, headroom)
+    sizing['profile_args'] = args
+    return sizing
+
+def get_sizing_report(image_name, sizing):
+    return profile_report.format(image_name, sizing['enclave_size'], sizing['max_threads'],
+                                 describe_peaks(sizing['observed']), sizing['headroom'])
+
+# --------file access tracing interfaces----------------------------------------------------------
+# With `--trace-files`, the base image is run once natively under strace (installed into an image
+# derived from the base image, see `trace_dockerfile`) and the files opened and executed by the
+# workload are collected. By default, GSC lists every file of the image (except for the directories
+# in `gsc_untrusted_dirs`) in `sgx.trusted_files`, so all of them are hashed at signing time, listed
+# in the manifest and checked at run time. Instead, only the traced files (plus the files matching
+# the include patterns, minus the ones matching the exclude patterns) become trusted files, and the
+# files and directories written to become allowed files. The lists are stored as manifest snippet
+# `workloads/<workload>/<image>.files.toml`, which `curation_script.sh` appends to the manifest.
+
+def build_trace_image(docker_socket, image_name):
+    image = docker_socket.images.get(image_name)
+    trace_image = f'curation-trace:{image.id.split(":")[-1][:16]}'
+    dockerfile = trace_dockerfile.format(image_name, image.attrs['Config'].get('User') or 'root')
+    result = subprocess.run(['docker', 'build', '-q', '-t', trace_image, '-'], input=dockerfile,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'could not build the tracing image:\n{result.stdout.strip()}')
+    return trace_image, image.attrs['Config']
+
+# Collects the paths the traced processes successfully opened or executed (relative paths are
+# resolved against the working directory of the image) from the strace output files
+def parse_trace_files(trace_dir, workdir):
+    reads, writes = set(), set()
+    for trace_file in os.listdir(trace_dir):
+        with open(os.path.join(trace_dir, trace_file), 'r', errors='replace') as pfile:
+            for line in pfile:
+                match = trace_line_pattern.match(line)
+                if not match or int(match.group(3)) < 0:
+                    continue
+                syscall, call_args = match.group(1), match.group(2)
+                quoted = trace_path_pattern.search(call_args)
+                if not quoted or '\\' in quoted.group(1):
+                    continue
+                file_path = posixpath.normpath(posixpath.join(workdir, quoted.group(1)))
+                if syscall == 'creat' or trace_write_flags_pattern.search(call_args):
+                    writes.add(file_path)
+                else:
+                    reads.add(file_path)
+    return reads, writes
+
+def run_traced_workload(docker_socket, image_name, args, flags, duration):
+    trace_image, config = build_trace_image(docker_socket, image_name)
+    command = (config.get('Entrypoint') or []) + (shlex.split(args) if args.strip() else
+                                                  config.get('Cmd') or [])
+    if not command:
+        raise RuntimeError('the image has neither an entrypoint nor a command')
+
+    container_name = 'curation-trace-' + re.sub('[:/]', '_', image_name)
+    subprocess.run(['docker', 'rm', '-f', container_name], stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    with tempfile.TemporaryDirectory(prefix='curation-trace-') as trace_dir:
+        os.chmod(trace_dir, 0o777)
+        result = subprocess.run(['docker', 'run', '-d', '--name', container_name,
+                                 '--cap-add', 'SYS_PTRACE', '--security-opt', 'seccomp=unconfined',
+                                 '-v', f'{trace_dir}:/curation-trace', *shlex.split(flags),
+                                 '--entrypoint', 'strace', trace_image, *trace_strace_args,
+                                 '-o', '/curation-trace/trace', '--', *command],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stdout.strip())
+
+        container = docker_socket.containers.get(container_name)
+        try:
+            exited = False
+            start = time.monotonic()
+            while time.monotonic() - start < duration and not exited:
+                container.reload()
+                exited = container.status != 'running'
+                time.sleep(profile_sample_interval)
+            if exited and container.attrs['State']['ExitCode'] != 0:
+                logs = container.logs(tail=10).decode('UTF-8', errors='replace').strip()
+                raise RuntimeError(f'exited with code {container.attrs["State"]["ExitCode"]}'
+                                   f'\n{logs}')
+            # strace flushes its output and terminates the traced processes on SIGTERM
+            container.stop(timeout=10)
+        finally:
+            container.remove(force=True)
+        return parse_trace_files(trace_dir, config.get('WorkingDir') or '/')
+
+# Returns the sizes of all regular files of the image, and the canonical paths of `paths` inside of
+# the image
+def inspect_image_files(image_name, paths):
+    result = subprocess.run(['docker', 'run', '--rm', '-i', '--user', '0', '--entrypoint', 'sh',
+                             image_name, '-c', trace_inspect_script], input='\n'.join(paths),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                            errors='replace')
+    files_output, _, realpaths_output = result.stdout.partition('\n---\n')
+    if result.returncode != 0 or not files_output:
+        raise RuntimeError(f'could not list the files of `{image_name}`')
+    image_files = {}
+    for line in files_output.splitlines():
+        size, _, file_path = line.partition(' ')
+        image_files[file_path] = int(size)
+    return image_files, dict(zip(paths, realpaths_output.splitlines()))
+
+def is_under(file_path, dirs):
+    return any(file_path == d or file_path.startswith(d.rstrip('/') + '/') for d in dirs)
+
+def get_encrypted_paths(encrypted_files, workdir):
+    return [posixpath.normpath(posixpath.join(workdir, f.strip()))
+            for f in encrypted_files.split(':') if f.strip()]
+
+def write_files_snippet(snippet_file, trusted, allowed):
+    lines = [trace_snippet_comment, 'sgx.trusted_files = [']
+    lines += [f'  {json.dumps("file:" + file_path)},' for file_path in sorted(trusted)]
+    lines += [']', 'sgx.allowed_files = [']
+    lines += [f'  {json.dumps("file:" + file_path)},' for file_path in sorted(allowed)]
+    lines += [']']
+    with open(snippet_file, 'w') as pfile:
+        pfile.write('\n'.join(lines) + '\n')
+
+def trace_file_accesses(docker_socket, image_name, args, flags, duration, encrypted_files,
+                        include, exclude, snippet_file):
+    workdir = docker_socket.images.get(image_name).attrs['Config'].get('WorkingDir') or '/'
+    reads, writes = run_traced_workload(docker_socket, image_name, args, flags, duration)
+    image_files, realpaths = inspect_image_files(image_name, sorted(reads | writes))
+    skipped = get_encrypted_paths(encrypted_files, workdir)
+
+    allowed = set()
+    for file_path in writes:
+        real_path = realpaths.get(file_path, file_path)
+        if is_under(real_path, trace_ignored_dirs + tuple(skipped)):
+            continue
+        allowed.add(real_path if real_path in image_files else
+                    posixpath.dirname(real_path).rstrip('/') + '/')
+    allowed = {f for f in allowed if not any(fnmatchcase(f, pattern) for pattern in exclude)}
+
+    trusted = set()
+    for file_path in reads:
+        real_path = realpaths.get(file_path, file_path)
+        if real_path in image_files:
+            # the file may be opened through a symlink, so trust both paths
+            trusted.update({file_path, real_path})
+    trusted.update(f for f in image_files if any(fnmatchcase(f, pattern) for pattern in include))
+    trusted = {f for f in trusted
+               if not is_under(f, gsc_untrusted_dirs + tuple(skipped) + tuple(allowed))
+               and not any(fnmatchcase(f, pattern) for pattern in exclude)}
+    write_files_snippet(snippet_file, trusted, allowed)
+
+    default_trusted = [f for f in image_files if not is_under(f, gsc_untrusted_dirs)]
+    trusted_real = {realpaths.get(f, f) for f in trusted} & set(image_files)
+    default_bytes = sum(image_files[f] for f in default_trusted)
+    trusted_bytes = sum(image_files[f] for f in trusted_real)
+    return {
+        'traced_paths': len(reads | writes),
+        'trusted_files': len(trusted_real),
+        'trusted_bytes': trusted_bytes,
+        'allowed_files': sorted(allowed),
+        'default_trusted_files': len(default_trusted),
+        'default_trusted_bytes': default_bytes,
+        'removed_files': len(default_trusted) - len(trusted_real),
+        'removed_bytes': default_bytes - trusted_bytes,
+        'include': list(include),
+        'exclude': list(exclude),
+        'manifest_snippet': snippet_file,
+    }
+
+def get_trace_report(image_name, file_trace):
+    return trace_report.format(image_name, file_trace['trusted_files'],
+                               format_size(file_trace['trusted_bytes']),
+                               len(file_trace['allowed_files']), file_trace['removed_files'],
+                               file_trace['default_trusted_files'],
+                               format_size(file_trace['removed_bytes']),
+                               file_trace['manifest_snippet'])
+
+def get_files_snippet_file(log_file):
+    return log_file[:-len('.log')] + '.files.toml'
+
+# --------file encryption interfaces--------------------------------------------------------------
+# With `--encrypt SRC:DST`, the plaintext file or directory SRC is encrypted into DST before the
+# image is curated. DST is the path under which the encrypted files are mounted into the container,
+# so it must be one of the (absolute) encrypted files or lie inside of one. Every file is encrypted
+# by its own `pf_crypt_tool` process, up to `encrypt_jobs` (by default, the number of CPUs) at a
+# time. A file is not encrypted again if its ciphertext was produced from the same plaintext with
+# the same key and hasn't been modified since; ciphertexts of plaintext files that no longer exist
+# are removed.
+encryption_state_lock = threading.Lock()
+
+def load_encryption_state():
+    try:
+        with open(encryption_state_file, 'r') as pfile:
+            return json.load(pfile)
+    except (OSError, ValueError):
+        return {}
+
+def save_encryption_state(updates, removed):
+    with encryption_state_lock:
+        state = load_encryption_state()
+        state.update(updates)
+        for output_file in removed:
+            state.pop(output_file, None)
+        os.makedirs(os.path.dirname(encryption_state_file), exist_ok=True)
+        tmp_file = f'{encryption_state_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as pfile:
+            json.dump(state, pfile, indent=4)
+        os.replace(tmp_file, encryption_state_file)
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as pfile:
+        for chunk in iter(lambda: pfile.read(encryption_hash_chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_test_encryption_key(workload_type):
+    key_file = test_encryption_key.format(workload_type)
+    if not path.isfile(key_file):
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as pfile:
+            pfile.write(os.urandom(encryption_key_size))
+    return key_file
+
+def parse_encrypt_mapping(mapping, encrypted_files):
+    source, _, target = mapping.partition(':')
+    if not source or not target.startswith('/'):
+        raise RuntimeError(f'invalid encryption mapping `{mapping}` (expected SRC:DST with an '
+                           f'absolute DST)')
+    mounted = [posixpath.normpath(f.strip()) for f in encrypted_files.split(':')
+               if f.strip().startswith('/')]
+    target = posixpath.normpath(target)
+    if not is_under(target, mounted):
+        raise RuntimeError(f'`{target}` is not one of the encrypted files mounted from the host '
+                           f'{mounted}')
+    return os.path.abspath(source), target
+
+# Returns the plaintext file of every ciphertext to produce
+def get_encryption_pairs(mappings, encrypted_files):
+    pairs = {}
+    for mapping in mappings:
+        source, target = parse_encrypt_mapping(mapping, encrypted_files)
+        if path.isdir(source):
+            for root, _, files in os.walk(source):
+                for name in files:
+                    source_file = path.join(root, name)
+                    pairs[posixpath.join(target, path.relpath(source_file, source))] = source_file
+        elif path.isfile(source):
+            pairs[target] = source
+        else:
+            raise RuntimeError(f'`{source}` does not exist')
+    return pairs
+
+def is_ciphertext_current(record, source_file, output_file, key_hash):
+    if not record or record['source'] != source_file or record['key'] != key_hash:
+        return False
+    try:
+        output_stat = os.stat(output_file)
+    except OSError:
+        return False
+    return (output_stat.st_size, output_stat.st_mtime_ns) == (record['output_size'],
+                                                              record['output_mtime_ns'])
+
+# Encrypts `source_file` into `output_file` unless the ciphertext is current; returns the new
+# state record and whether the file was encrypted
+def encrypt_file(source_file, output_file, key_file, key_hash, record):
+    source_stat = os.stat(source_file)
+    source_hash = None
+    if is_ciphertext_current(record, source_file, output_file, key_hash):
+        if (source_stat.st_size, source_stat.st_mtime_ns) == (record['size'], record['mtime_ns']):
+            return record, False
+        source_hash = hash_file(source_file)
+        if source_hash == record['sha256']:
+            return dict(record, size=source_stat.st_size, mtime_ns=source_stat.st_mtime_ns), False
+
+    os.makedirs(path.dirname(output_file), exist_ok=True)
+    if path.lexists(output_file):
+        os.remove(output_file)
+    result = subprocess.run([pf_crypt_tool, 'encrypt', '-w', key_file, '-i', source_file, '-o',
+                             output_file], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(f'encryption of `{source_file}` failed: {result.stdout.strip()}')
+    output_stat = os.stat(output_file)
+    return {
+        'source': source_file,
+        'size': source_stat.st_size,
+        'mtime_ns': source_stat.st_mtime_ns,
+        'sha256': source_hash or hash_file(source_file),
+        'key': key_hash,
+        'output_size': output_stat.st_size,
+        'output_mtime_ns': output_stat.st_mtime_ns,
+    }, True
+
+def encrypt_files(mappings, encrypted_files, key_file, jobs, log=print):
+    if shutil.which(pf_crypt_tool) is None:
+        raise RuntimeError(f'`{pf_crypt_tool}` not found, please install Gramine')
+    if not path.isfile(key_file):
+        raise RuntimeError(f'encryption key `{key_file}` does not exist')
+    pairs = get_encryption_pairs(mappings, encrypted_files)
+    key_file = os.path.abspath(key_file)
+    key_hash = hash_file(key_file)
+    jobs = jobs or os.cpu_count()
+    with encryption_state_lock:
+        state = load_encryption_state()
+
+    targets = [parse_encrypt_mapping(mapping, encrypted_files)[1] for mapping in mappings]
+    removed = [f for f in state if f not in pairs and is_under(f, targets)]
+    for output_file in removed:
+        if path.lexists(output_file):
+            os.remove(output_file)
+
+    total_bytes = sum(os.path.getsize(f) for f in pairs.values())
+    log(encryption_msg.format(len(pairs), format_size(total_bytes), jobs))
+    stats = {'mappings': mappings, 'jobs': jobs, 'encrypted_files': 0, 'encrypted_bytes': 0,
+             'current_files': 0, 'current_bytes': 0, 'removed_files': len(removed)}
+    updates = {}
+    errors = []
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(encrypt_file, source_file, output_file, key_file, key_hash,
+                                   state.get(output_file)): output_file
+                   for output_file, source_file in pairs.items()}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                record, encrypted = future.result()
+            except (OSError, RuntimeError) as e:
+                errors.append(str(e))
+                continue
+            updates[futures[future]] = record
+            kind = 'encrypted' if encrypted else 'current'
+            stats[f'{kind}_files'] += 1
+            stats[f'{kind}_bytes'] += record['size']
+    duration = time.monotonic() - start
+    save_encryption_state(updates, removed)
+    if errors:
+        raise RuntimeError(f'{len(errors)} of {len(pairs)} files could not be encrypted, '
+                           f'first error: {errors[0]}')
+
+    stats['duration_s'] = round(duration, 3)
+    stats['throughput_bytes_s'] = round(stats['encrypted_bytes'] / duration) if duration else 0
+    return stats
+
+def get_encryption_report(image_name, encryption):
+    return encryption_report.format(image_name, encryption['encrypted_files'],
+                                    format_size(encryption['encrypted_bytes']),
+                                    encryption['duration_s'],
+                                    format_size(encryption['throughput_bytes_s']),
+                                    encryption['current_files'],
+                                    format_size(encryption['current_bytes']),
+                                    encryption['removed_files'])
+
+# --------build options interfaces-----------------------------------------------------------------
+# The pre-build steps (`--encrypt`, `--profile`, `--trace-files`) and the start-up profile are
+# configured by the same keys in batch spec entries and on the command line (see
+# `batch_entry_keys`).
+
+def get_cmdline_build_settings(cmdline_args):
+    return {
+        'profile': cmdline_args.profile,
+        'profile_args': cmdline_args.profile_args,
+        'profile_docker_run_flags': cmdline_args.profile_docker_run_flags,
+        'profile_duration': cmdline_args.profile_duration,
+        'profile_headroom': cmdline_args.headroom,
+        'startup_profile': cmdline_args.startup_profile,
+        'trace_files': cmdline_args.trace_files,
+        'trace_include': cmdline_args.trace_include,
+        'trace_exclude': cmdline_args.trace_exclude,
+        'encrypt': cmdline_args.encrypt,
+        'encrypt_jobs': cmdline_args.encrypt_jobs,
+    }
+
+# Encrypts the requested files with `encryption_key` (by default, the key of the test image), runs
+# the requested analyses of the base image with the representative command (`profile_args` and
+# `profile_docker_run_flags`, by default `args` and `flags`) and returns the build options that
+# are passed to `curation_script.sh` and stored in the build record
+def prepare_build_options(docker_socket, workload_type, base_image_name, args, flags, settings,
+                          log_file, encrypted_files=None, encryption_key=None, log=print):
+    if settings['profile_args'] is not None:
+        args = settings['profile_args']
+    if settings['profile_docker_run_flags'] is not None:
+        flags = settings['profile_docker_run_flags']
+    if encrypted_files is None:
+        encrypted_files = get_encrypted_files(workload_type)
+
+    build_options = {'startup_profile': settings['startup_profile'], 'sizing': None,
+                     'file_trace': None, 'encryption': None, 'docker_host': None}
+    if settings['encrypt']:
+        if encryption_key is None:
+            encryption_key = get_test_encryption_key(workload_type)
+        if not encrypted_files.strip() or not encryption_key:
+            raise RuntimeError('encrypting files requires encrypted files and an encryption key')
+        build_options['encryption'] = encrypt_files(settings['encrypt'], encrypted_files,
+                                                    encryption_key, settings['encrypt_jobs'], log)
+        log(get_encryption_report(base_image_name, build_options['encryption']))
+    if settings['profile']:
+        log(profile_msg.format(base_image_name, settings['profile_duration']))
+        build_options['sizing'] = profile_enclave_sizing(docker_socket, base_image_name, args,
+                                                         flags, settings['profile_duration'],
+                                                         settings['profile_headroom'])
+        log(get_sizing_report(base_image_name, build_options['sizing']))
+    if settings['trace_files']:
+        log(trace_msg.format(base_image_name, settings['profile_duration']))
+        build_options['file_trace'] = trace_file_accesses(
+            docker_socket, base_image_name, args, flags, settings['profile_duration'],
+            encrypted_files.strip(), settings['trace_include'], settings['trace_exclude'],
+            os.path.abspath(get_files_snippet_file(log_file)))
+        log(get_trace_report(base_image_name, build_options['file_trace']))
+    return build_options
+
+# Passes the build options to `curation_script.sh` via the environment
+def get_curation_env(build_options):
+    if not build_options:
+        return None
+    env = dict(os.environ, CURATION_STARTUP_PROFILE=build_options['startup_profile'])
+    sizing = build_options['sizing']
+    if sizing:
+        env.update(CURATION_ENCLAVE_SIZE=sizing['enclave_size'],
+                   CURATION_MAX_THREADS=str(sizing['max_threads']),
+                   CURATION_SIZING_NOTE=f'observed peaks: {describe_peaks(sizing["observed"])}, '
+                                        f'headroom {sizing["headroom"]:.0%}')
+    if build_options['file_trace']:
+        env.update(CURATION_FILES_SNIPPET=build_options['file_trace']['manifest_snippet'])
+    if build_options['docker_host']:
+        env.update(DOCKER_HOST=build_options['docker_host'])
+    return env
+
+# --------start-up probe interfaces---------------------------------------------------------------
+# With `--probe N`, the curated image is started N times and its time to readiness is broken down
+# into the following phases (phases whose start or end is not observed are reported as null):
+# - container: from `docker run` until the Gramine loader starts (Docker and GSC entrypoint),
+# - enclave: from the Gramine loader start until the first sign of life from inside the enclave
+#   (Gramine's warning on insecure configurations, as printed by test and debug images, or the
+#   first connection to the secret provisioning server),
+# - attestation: from the first connection to the secret provisioning server until the last one is
+#   closed (only with `--probe-verifier`, see `ProbeProxy`),
+# - application: from the end of the previous phases until the application is ready, i.e. its port
+#   accepts connections or, for workloads without a port, the container has exited successfully.
+
+# TCP relay between the curated image and the secret provisioning server which records the time of
+# each connection
+class ProbeProxy(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, upstream):
+        host, _, port = upstream.rpartition(':')
+        self.upstream = (host, int(port))
+        self.connections = []
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), ProbeProxyHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def get_connections(self):
+        with self.lock:
+            connections = self.connections
+            self.connections = []
+        return connections
+
+class ProbeProxyHandler(socketserver.BaseRequestHandler):
+    def relay(self, src, dst):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data:
+                    break
+                dst.sendall(data)
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def handle(self):
+        opened = time.time()
+        with socket.create_connection(self.server.upstream) as upstream:
+            thread = threading.Thread(target=self.relay, args=(upstream, self.request), daemon=True)
+            thread.start()
+            self.relay(self.request, upstream)
+            thread.join()
+        with self.server.lock:
+            self.server.connections.append((opened, time.time()))
+
+def get_sgx_device():
+    for device in sgx_devices:
+        if path.exists(device):
+            return device
+    return None
+
+def is_port_open(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+# Returns the port the workload listens on when it is ready (see `benchmark.json`), or 0 if the
+# workload is ready once it has exited
+def get_probe_ready_port(workload_type, probe_port):
+    if probe_port is not None:
+        return probe_port
+    try:
+        with open(f'workloads/{workload_type}/benchmark.json', 'r') as pfile:
+            return json.load(pfile).get('port', 0)
+    except (OSError, ValueError):
+        return 0
+
+def probe_startup_once(image_name, args, flags, ready_port, timeout, proxy):
+    container_name = 'curation-probe-' + re.sub('[:/]', '_', image_name)
+    subprocess.run(['docker', 'rm', '-f', container_name], stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    if ready_port and is_port_open(ready_port):
+        raise RuntimeError(f'port {ready_port} is already in use')
+    if proxy:
+        proxy.get_connections()
+
+    lines = []
+    def read_output(process):
+        for line in process.stdout:
+            lines.append((time.time(), line))
+
+    start = time.time()
+    process = subprocess.Popen(['docker', 'run', '--rm', '--name', container_name,
+                                *shlex.split(flags), image_name, *shlex.split(args)],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                               errors='replace')
+    reader = threading.Thread(target=read_output, args=(process,), daemon=True)
+    reader.start()
+    ready = None
+    try:
+        while time.time() - start < timeout:
+            if ready_port and is_port_open(ready_port):
+                ready = time.time()
+                break
+            if process.poll() is not None:
+                if not ready_port and process.returncode == 0:
+                    ready = time.time()
+                break
+            time.sleep(probe_poll_interval)
+    finally:
+        subprocess.run(['docker', 'rm', '-f', container_name], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        process.wait()
+        reader.join()
+
+    if ready is None:
+        output = ''.join(line for _, line in lines[-10:]).strip()
+        raise RuntimeError(f'`{image_name}` did not become ready (exit code '
+                           f'{process.returncode})\n{output}')
+
+    gramine_start = next((t for t, line in lines if probe_gramine_start_marker.search(line)),
+                         None)
+    connections = proxy.get_connections() if proxy else []
+    enclave_ready_candidates = [t for t, line in lines if probe_enclave_ready_marker.search(line)]
+    enclave_ready_candidates += [opened for opened, _ in connections]
+    enclave_ready = min(enclave_ready_candidates, default=None)
+    attested = max((closed for _, closed in connections), default=None)
+
+    attestation_start = min((opened for opened, _ in connections), default=None)
+    application_start = next(t for t in (attested, enclave_ready, gramine_start, start)
+                             if t is not None)
+
+    phases = {
+        'container_s': None if gramine_start is None else gramine_start - start,
+        'enclave_s': (None if gramine_start is None or enclave_ready is None
+                      else enclave_ready - gramine_start),
+        'attestation_s': None if attested is None else attested - attestation_start,
+        'application_s': ready - application_start,
+        'total_s': ready - start,
+    }
+    return {name: None if value is None else round(value, 3) for name, value in phases.items()}
+
+def summarize_probe_runs(runs):
+    summary = {}
+    for phase in probe_phases:
+        values = [run[phase] for run in runs if run[phase] is not None]
+        if values:
+            summary[phase] = {'median': round(statistics.median(values), 3),
+                              'mean': round(statistics.mean(values), 3),
+                              'min': min(values), 'max': max(values)}
+        else:
+            summary[phase] = None
+    return summary
+
+# Probes the start-up of `image_name` and writes the result next to the build record; returns
+# False if the probe failed
+def run_startup_probe(workload_type, image_name, log_file, args, flags, startup_profile,
+                      options):
+    sgx_device = get_sgx_device()
+    if sgx_device:
+        flags = f'--device={sgx_device} {flags}'
+    else:
+        # without SGX, only the start-up overheads outside of the enclave can be measured
+        flags = f'-e GSC_PAL=Linux --security-opt seccomp=unconfined {flags}'
+
+    proxy = None
+    if options.probe_verifier:
+        proxy = ProbeProxy(options.probe_verifier)
+        flags = f'-e SECRET_PROVISION_SERVERS=localhost:{proxy.server_address[1]} {flags}'
+        if '--net=host' not in flags:
+            flags = f'--net=host {flags}'
+
+    ready_port = get_probe_ready_port(workload_type, options.probe_port)
+    print(probe_msg.format(image_name, options.probe))
+    runs = []
+    try:
+        for _ in range(options.probe):
+            runs.append(probe_startup_once(image_name, args, flags, ready_port,
+                                           options.probe_timeout, proxy))
+    except (RuntimeError, OSError) as e:
+        print(probe_failed.format(image_name, e))
+        return False
+    finally:
+        if proxy:
+            proxy.shutdown()
+            proxy.server_close()
+
+    report = {
+        'image': image_name,
+        'mode': 'sgx' if sgx_device else 'direct',
+        'startup_profile': startup_profile,
+        'ready_port': ready_port or None,
+        'runs': runs,
+        'summary': summarize_probe_runs(runs),
+    }
+    report_file = get_startup_report_file(log_file)
+    with open(report_file, 'w') as pfile:
+        json.dump(report, pfile, indent=4)
+
+    print(probe_header.format(image_name, report['mode'], startup_profile, len(runs)))
+    print(probe_table_header)
+    for phase, values in report['summary'].items():
+        if values:
+            print(probe_row.format(phase[:-len('_s')], values['median'], values['mean'],
+                                   values['min'], values['max']))
+        else:
+            print(probe_row_unobserved.format(phase[:-len('_s')]))
+    print(probe_report_written.format(report_file))
+    return True
+
+def get_log_file(workload_type, base_image_name):
+    log_file_name, n = re.subn('[:/]', '_', base_image_name)
+    return f'workloads/{workload_type}/{log_file_name}.log'
+
+def get_build_record_file(log_file):
+    return log_file[:-len('.log')] + '.build.json'
+
+def get_startup_report_file(log_file):
+    return log_file[:-len('.log')] + '.startup.json'
 
 def curate_gsc_image(args):
     base_image_name = args.base_image_name
@@ -314,39 +1293,55 @@ def curate_gsc_image(args):
         if pull_docker_image(docker_socket, base_image_name) == -1:
             return -1
 
-    image_distro = get_image_distro(docker_socket, base_image_name)
+    try:
+        image_distro = get_image_distro(docker_socket, base_image_name)
+    except RuntimeError as e:
+        print(f'Error: {e}')
+        exit(1)
     if image_distro not in supported_distros:
         print(f'Error: Unsupported distro "{image_distro}".')
         exit(1)
 
-    log_file_name, n = re.subn('[:/]', '_', base_image_name)
-    log_file = f'workloads/{workload_type}/{log_file_name}.log'
+    log_file = get_log_file(workload_type, base_image_name)
     log_file_pointer = open(log_file, 'w')
 
     gsc_app_image ='gsc-{}'.format(base_image_name)
 
     if is_test_image:
+        test_args = get_insecure_args(workload_type) + ' ' + get_common_args(workload_type)
+        try:
+            build_options = prepare_build_options(docker_socket, workload_type, base_image_name,
+                                                  test_args, get_docker_run_flags(workload_type),
+                                                  get_cmdline_build_settings(args), log_file)
+        except (RuntimeError, docker.errors.DockerException) as e:
+            print(build_options_failed.format(base_image_name, e))
+            exit(1)
         create_test_image(docker_socket, workload_type, base_image_name, image_distro, buildtype,
-                          gsc_app_image, log_file, log_file_pointer)
+                          gsc_app_image, log_file, log_file_pointer, build_options)
+        if args.probe:
+            if not run_startup_probe(workload_type, gsc_app_image, log_file, test_args,
+                                     get_docker_run_flags(workload_type), args.startup_profile,
+                                     args):
+                exit(1)
     else:
         wrapper(create_custom_image, docker_socket, workload_type, base_image_name, image_distro,
-                buildtype, gsc_app_image, log_file, log_file_pointer)
+                buildtype, gsc_app_image, log_file, log_file_pointer, args)
 
 def create_test_image(docker_socket, workload_type, base_image_name, image_distro, buidtype,
-                      gsc_app_image, log_file, log_file_pointer):
+                      gsc_app_image, log_file, log_file_pointer, build_options=None):
     print(f'{test_image_msg}')
     print(f'{log_progress.format(log_file)}')
-    subprocess.call(['util/curation_script.sh', workload_type, base_image_name, image_distro,
-                        'test', '', 'test-image', buidtype], stdout=log_file_pointer,
-                        stderr=log_file_pointer)
+    parser = start_test_curation_script(workload_type, base_image_name, image_distro, buidtype,
+                                        log_file_pointer, build_options)
+    parser.wait()
+    parser.write_build_record(get_build_record_file(log_file), workload_type, base_image_name,
+                              gsc_app_image, buidtype, build_options)
 
     if get_docker_image(docker_socket, gsc_app_image) is None:
         print(f'{image_creation_failed.format(gsc_app_image, log_file)}')
         exit(-1)
 
-    args = get_insecure_args(workload_type) + ' ' + get_common_args(workload_type)
-    docker_run_flags = get_docker_run_flags(workload_type)
-    docker_run_cmd = test_run_cmd.format(docker_run_flags, gsc_app_image + ' ' + args)
+    docker_run_cmd = get_test_run_command(workload_type, gsc_app_image)
     print(f'{test_run_instr.format(gsc_app_image, docker_run_cmd)}')
 
     commands_fp = open(commands_file, 'w')
@@ -356,7 +1351,7 @@ def create_test_image(docker_socket, workload_type, base_image_name, image_distr
     return 0
 
 def create_custom_image(stdscr, docker_socket, workload_type, base_image_name, image_distro,
-                        buidtype, gsc_app_image, log_file, log_file_pointer):
+                        buidtype, gsc_app_image, log_file, log_file_pointer, cmdline_args):
     stdscr.clear()
     resize_screen(screen_height, screen_width)
     stdscr = curses.initscr()
@@ -374,10 +1369,7 @@ def create_custom_image(stdscr, docker_socket, workload_type, base_image_name, i
     if user_args:
         user_args += ' '
     user_args += get_common_args(workload_type)
-    args_json = ''
-    if user_args:
-        args_list = shlex.split(user_args)
-        args_json = 'CMD ' + json.dumps(args_list)
+    args_json = get_args_json(user_args)
 
     # 2. Provide environment variables
     env_vars = get_env_vars(workload_type)
@@ -419,18 +1411,13 @@ def create_custom_image(stdscr, docker_socket, workload_type, base_image_name, i
     # 5. Remote Attestation with RA-TLS
     ca_cert_path = ''
     config = ''
-    verifier_server = '<verifier-dns-name:port>'
     attestation_required = 'n'
-    host_net = ''
     attestation_input = get_attestation_input(user_console, guide_win)
-    if attestation_input == 'done':
-        attestation_required = 'y'
-        ca_cert_path = ssl_folder_path_on_host+'/ca.crt'
-
-    elif attestation_input == 'test':
-        ca_cert_path, verifier_server = ssl_folder_path_on_host+'/ca.crt', '"localhost:4433"'
-        host_net, config = '--net=host', 'test'
+    if attestation_input in ('done', 'test'):
         attestation_required = 'y'
+        ca_cert_path = ssl_folder_path_on_host + '/ca.crt'
+    if attestation_input == 'test':
+        config = 'test'
 
     # 6. Obtain enclave signing key
     key_path = get_enclave_signing_input(user_console, guide_win)
@@ -447,87 +1434,62 @@ def create_custom_image(stdscr, docker_socket, workload_type, base_image_name, i
         passphrase = update_user_input(secure=True)
 
     # 7. Generation of the final curated images
+    try:
+        build_options = prepare_build_options(
+            docker_socket, workload_type, base_image_name, user_args, flags,
+            get_cmdline_build_settings(cmdline_args), log_file,
+            encrypted_files=encrypted_files, encryption_key=encryption_key_path,
+            log=lambda text: update_user_and_commentary_win_array(user_console, guide_win,
+                                                                  [text], []))
+    except (RuntimeError, docker.errors.DockerException) as e:
+        update_user_error_win(user_console, build_options_failed.format(base_image_name, e))
+        user_console.getch()
+        sys.exit(1)
+
+    builds = []
     if attestation_required == 'y':
-        os.chdir('verifier')
-        verifier_log_file_pointer = open(verifier_log_file, 'w')
-        update_user_and_commentary_win_array(user_console, guide_win, [verifier_build_messg],
+        # The GSC image only needs `ca.crt` from the verifier, so generate the certs first and
+        # then build the verifier image and the GSC image concurrently
+        verifier_log_file_pointer = open('verifier/' + verifier_log_file, 'w')
+        update_user_and_commentary_win_array(user_console, guide_win, [verifier_certs_messg],
                                              [verifier_log_help.format(verifier_log_file)])
-        subprocess.call(['./helper.sh', attestation_input, ef_required,
-                         enc_key_path_in_verifier], stdout=verifier_log_file_pointer,
-                         stderr=verifier_log_file_pointer)
-        os.chdir('../')
-        check_image_creation_success(user_console, docker_socket,'verifier:latest',
-                                     'verifier/'+verifier_log_file)
-
-    update_user_and_commentary_win_array(user_console, guide_win, wait_message,
-                                         [log_progress.format(log_file)])
-    subprocess.call(['util/curation_script.sh', workload_type, base_image_name, image_distro,
-                     key_path, args_json, attestation_required, buidtype, ca_cert_path,
-                     env_required, envs, ef_required, encrypted_files, encryption_key_path,
-                     passphrase], stdout=log_file_pointer, stderr=log_file_pointer)
-    image = gsc_app_image
-    check_image_creation_success(user_console, docker_socket, image, log_file)
+        run_verifier_helper(attestation_input, ef_required, enc_key_path_in_verifier,
+                            verifier_log_file_pointer, step='certs')
+        if not path.isfile(ssl_folder_path_on_host + '/ca.crt'):
+            user_console.addstr(verifier_certs_failed.format('verifier/' + verifier_log_file))
+            user_console.getch()
+            sys.exit(1)
+        verifier_build = start_verifier_helper(attestation_input, ef_required,
+                                               enc_key_path_in_verifier,
+                                               verifier_log_file_pointer, step='image')
+        builds.append(('verifier:latest', verifier_build, 'verifier/' + verifier_log_file,
+                       None))
+
+    gsc_build = start_curation_script(workload_type, base_image_name, image_distro, key_path,
+                                      args_json, attestation_required, buidtype, ca_cert_path,
+                                      env_required, envs, ef_required, encrypted_files,
+                                      encryption_key_path, passphrase, log_file_pointer,
+                                      build_options)
+    builds.append((gsc_app_image, gsc_build.process, log_file, gsc_build))
+    wait_for_image_builds(user_console, guide_win, builds)
+    gsc_build.write_build_record(get_build_record_file(log_file), workload_type, base_image_name,
+                                 gsc_app_image, buidtype, build_options)
+    check_images_creation_success(user_console, docker_socket,
+                                  [(image, log) for image, _, log, _ in builds])
 
     # 8. Generation of docker run commands
-    if host_net and host_net not in flags:
-        flags = flags + " " + host_net
+    run_command = get_run_commands(gsc_app_image, buidtype, flags, attestation_input,
+                                   encryption_key_path, config == 'test',
+                                   gsc_build.get_measurements())
     commands_fp = open(commands_file, 'w')
-
-    if attestation_required == 'y':
-        verifier_env_vars = ' -e RA_TLS_ALLOW_SW_HARDENING_NEEDED=1 '
-        if attestation_input == 'test':
-            verifier_env_vars += ' -e RA_TLS_ALLOW_OUTDATED_TCB_INSECURE=1 '
-        if buidtype != 'release':
-            verifier_env_vars += ' -e RA_TLS_ALLOW_DEBUG_ENCLAVE_INSECURE=1 '
-
-        ssl_folder_abs_path_on_host = os.path.abspath(ssl_folder_path_on_host)
-        verifier_cert_mount_str = verifier_cert_mount.format(ssl_folder_abs_path_on_host)
-        enc_keys_mount_str, enc_keys_path_str = '' , ''
-        if encryption_key_path:
-            key_name_and_path = encryption_key_path.rsplit('/', 1)
-            enc_keys_mount_str =  enc_keys_mount.format(key_name_and_path[0])
-
-        mr_enclave = '<mr_enclave>'
-        mr_signer = '<mr_signer>'
-        isv_prod_id = '<isv_prod_id>'
-        isv_svn = '<isv_svn>'
-
-        with open(log_file, 'r') as pfile:
-            lines = pfile.read()
-        pattern_enclave = re.compile('mr_enclave = \"(.*)\"')
-        pattern_signer = re.compile('mr_signer = \"(.*)\"')
-        pattern_isv_prod_id = re.compile('isv_prod_id = (.*)')
-        pattern_isv_svn = re.compile('isv_svn = (.*)')
-
-        mr_enclave_list = pattern_enclave.findall(lines)
-        mr_signer_list = pattern_signer.findall(lines)
-        isv_prod_id_list = pattern_isv_prod_id.findall(lines)
-        isv_svn_list = pattern_isv_svn.findall(lines)
-
-        if len(mr_enclave_list) > 0: mr_enclave = mr_enclave_list[0]
-        if len(mr_signer_list) > 0: mr_signer = mr_signer_list[0]
-        if len(isv_prod_id_list) > 0: isv_prod_id = isv_prod_id_list[0]
-        if len(isv_svn_list) > 0: isv_svn = isv_svn_list[0]
-
-        verifier_run_command = (f'Execute below command to start verifier on a trusted system:\n'
-                                f'$ docker run {host_net} --device=/dev/sgx/enclave '
-                                f'-e RA_TLS_MRENCLAVE={mr_enclave} -e RA_TLS_MRSIGNER={mr_signer} '
-                                f'-e RA_TLS_ISV_PROD_ID={isv_prod_id} -e RA_TLS_ISV_SVN={isv_svn} '
-                                f'{verifier_env_vars}' + verifier_cert_mount_str + ' ' +
-                                enc_keys_mount_str + ' -it verifier:latest')
-        custom_image_dns_info = ''
-        if config != 'test':
-            custom_image_dns_info = ('. Assign the correct DNS information of the verifier server'
-                                     ' to the environment variable SECRET_PROVISION_SERVERS')
-        run_command = (f'{verifier_run_command} \n \n'
-                       f'Execute below command to deploy the curated GSC image'
-                       f'{custom_image_dns_info}:\n'
-                       f'{workload_run.format(flags, verifier_server, gsc_app_image)}')
-    else:
-        run_command = run_command_no_att.format(flags, gsc_app_image)
-
     user_info = [image_ready_messg.format(gsc_app_image), commands_file + color_set,
                 app_exit_messg]
+    if build_options['sizing']:
+        user_info.insert(2, get_sizing_report(base_image_name, build_options['sizing']))
+    if build_options['file_trace']:
+        user_info.insert(2, get_trace_report(base_image_name, build_options['file_trace']))
+    if build_options['encryption']:
+        user_info.insert(2, get_encryption_report(base_image_name, build_options['encryption']))
     commands_fp.write(run_command)
     commands_fp.close()
 
@@ -542,13 +1504,581 @@ def create_custom_image(stdscr, docker_socket, workload_type, base_image_name, i
         continue
     return 0
 
+# --------docker build host interfaces------------------------------------------------------------
+# In batch mode, the images can be curated on several Docker daemons (`--docker-host URL[=SLOTS]`
+# or `docker_hosts` of the batch spec, where `local` is the daemon configured in the environment).
+# Each daemon runs up to SLOTS builds at a time (by default, one per `docker_host_cpus_per_build`
+# CPUs of the daemon). A build is scheduled to a daemon with a free slot, preferring the daemons
+# that already have the prebuilt Gramine image and the base image (see `get_cache_scores()`), and
+# then the daemons with the most free slots. `curation_script.sh` and GSC reach the daemon via
+# DOCKER_HOST. The profiling and tracing runs read the procfs and files of the Docker host, so they
+# always use the local daemon. Finished GSC images are collected to `--collect-to` (`local`, the
+# URL of a daemon, or a registry prefix to which they are pushed).
+
+def parse_docker_host_spec(spec):
+    url, sep, slots = spec.rpartition('=')
+    if not sep:
+        return spec, None
+    if not slots.isdigit() or int(slots) <= 0 or not url:
+        raise ValueError(f'Invalid Docker host `{spec}` (expected URL[=SLOTS])')
+    return url, int(slots)
+
+def is_daemon_target(target):
+    return target == 'local' or '://' in target
+
+def connect_docker_daemon(url):
+    if url == 'local':
+        return docker.from_env()
+    return docker.from_env(environment=dict(os.environ, DOCKER_HOST=url),
+                           use_ssh_client=url.startswith('ssh://'))
+
+class DockerHost:
+    def __init__(self, spec):
+        self.name, slots = parse_docker_host_spec(spec)
+        self.client = connect_docker_daemon(self.name)
+        self.slots = slots or max(1, self.client.info()['NCPU'] // docker_host_cpus_per_build)
+        self.running = 0
+
+    def get_docker_host_env(self):
+        return None if self.name == 'local' else self.name
+
+    def has_gramine_image(self, distro, buildtype):
+        prefix = f'gsc-gramine:{distro.replace(":", "")}-{buildtype}-'
+        return any(tag.startswith(prefix) for image in self.client.images.list(name='gsc-gramine')
+                   for tag in image.tags)
+
+class DockerHostPool:
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.condition = threading.Condition()
+
+    # Blocks until a host has a free slot and returns the free host with the highest score
+    def acquire(self, scores):
+        with self.condition:
+            free = []
+            while not free:
+                free = [host for host in self.hosts if host.running < host.slots]
+                if not free:
+                    self.condition.wait()
+            host = max(free, key=lambda host: (scores.get(host.name, 0), host.slots - host.running))
+            host.running += 1
+            return host
+
+    def release(self, host):
+        with self.condition:
+            host.running -= 1
+            self.condition.notify_all()
+
+# Compiling Gramine takes much longer than pulling a base image, so a host with the prebuilt
+# Gramine image scores higher than a host with (only) the base image. The distro of the base image
+# is taken from the distro cache of any host that has the image.
+def get_cache_scores(hosts, base_image_name, buildtype):
+    images = {host.name: get_docker_image(host.client, base_image_name) for host in hosts}
+    with distro_cache_lock:
+        distro_cache = load_distro_cache()
+    distros = [distro_cache.get(image.id) for image in images.values() if image is not None]
+    distro = next(filter(None, distros), None)
+
+    scores = {}
+    for host in hosts:
+        scores[host.name] = 1 if images[host.name] is not None else 0
+        try:
+            if distro and host.has_gramine_image(distro, buildtype):
+                scores[host.name] += 2
+        except docker.errors.APIError:
+            pass
+    return scores
+
+# Copies the image from the build host to the target daemon, or pushes it to the target registry;
+# returns the name of the collected image
+def collect_image(host, image_name, target, target_client):
+    if not is_daemon_target(target):
+        repository, tag = docker.utils.parse_repository_tag(f'{target.rstrip("/")}/{image_name}')
+        host.client.images.get(image_name).tag(repository, tag or 'latest')
+        for status in host.client.images.push(repository, tag=tag or 'latest', stream=True,
+                                              decode=True):
+            if 'error' in status:
+                raise RuntimeError(status['error'])
+        return f'{repository}:{tag or "latest"}'
+    if target != host.name:
+        target_client.images.load(host.client.images.get(image_name).save(named=True))
+    return image_name
+
+# --------batch (non-interactive) curation support interfaces-------------------------------------
+# A batch spec is a JSON file of the following form (only `workload` and `base_image` are
+# required for each entry; top-level `jobs` and `buildtype` act as defaults):
+#
+# {
+#     "jobs": 4,
+#     "buildtype": "release",
+#     "docker_hosts": ["local=2", "ssh://builder@build-host-1=4"],
+#     "collect_to": "local",
+#     "images": [
+#         {
+#             "workload": "redis",
+#             "base_image": "redis:7.0.10",
+#             "test": false,
+#             "args": "",
+#             "env_vars": "-e ENV_NAME1=\"value1\"",
+#             "docker_run_flags": "--net=host",
+#             "encrypted_files": "",
+#             "encryption_key": "",
+#             "signing_key": "enclave-key.pem",
+#             "signing_key_passphrase_env": "REDIS_KEY_PASSPHRASE",
+#             "attestation": "test",
+#             "profile": true,
+#             "profile_args": null,
+#             "profile_docker_run_flags": null,
+#             "profile_duration": 30,
+#             "profile_headroom": 0.25,
+#             "startup_profile": "default",
+#             "trace_files": true,
+#             "trace_include": ["/usr/lib/ssl/*"],
+#             "trace_exclude": [],
+#             "encrypt": ["plain_db:/var/run/db_encrypted"],
+#             "encrypt_jobs": null
+#         }
+#     ]
+# }
+#
+# `test: true` generates the insecure test image (same as `--test`), in which case all other
+# per-image inputs except for the `profile*`, `startup_profile`, `trace*` and `encrypt*` ones are
+# ignored. `encrypt` lists the SRC:DST mappings of plaintext files to encrypt into the encrypted
+# files with the entry's encryption key (the test key for test images, see `encrypt_files()`).
+# `profile: true` (or `--profile`) sizes the enclave by profiling the base image (see
+# `profile_workload()`); by default, the image is profiled with the arguments and docker run flags
+# it is curated with. `startup_profile` is one of `startup_profiles` (`minimal` implies `profile:
+# true`). `trace_files: true` (or `--trace-files`) trusts only the files accessed by the profiling
+# command (see `trace_file_accesses()`). `attestation` is one of '' (no attestation), 'test' or
+# 'done' (see the interactive flow). All attested images share a single verifier image, so they must
+# agree on the attestation mode and on the encryption key. Entries are curated concurrently, also
+# those of the same workload type, each in its own build directory `build/<image>/`. The top-level
+# `docker_hosts` and `collect_to` (or `--docker-host` and `--collect-to`) distribute the builds
+# across several Docker daemons (see `DockerHost`).
+
+def load_batch_spec(spec_file):
+    with open(spec_file, 'r') as pfile:
+        spec = json.load(pfile)
+
+    images = spec.get('images', [])
+    if not images:
+        raise ValueError(f'No images to curate in batch spec `{spec_file}`')
+
+    default_buildtype = spec.get('buildtype', 'release')
+    entries = []
+    for image in images:
+        unknown_keys = set(image) - set(batch_entry_keys)
+        if unknown_keys:
+            raise ValueError(f'Unknown key(s) {sorted(unknown_keys)} in batch spec entry {image}')
+        if 'workload' not in image or 'base_image' not in image:
+            raise ValueError(f'Batch spec entry {image} lacks `workload` and/or `base_image`')
+        if not path.isdir(f'workloads/{image["workload"]}'):
+            raise ValueError(f'Unknown workload type `{image["workload"]}`')
+        if any(e['base_image'] == image['base_image'] for e in entries):
+            raise ValueError(f'Base image `{image["base_image"]}` appears more than once in batch '
+                             f'spec `{spec_file}`')
+
+        entry = dict(batch_entry_keys)
+        entry['buildtype'] = default_buildtype
+        entry.update(image)
+        if entry['buildtype'] not in ('release', 'debug', 'debugoptimized'):
+            raise ValueError(f'Invalid buildtype `{entry["buildtype"]}` for {entry["base_image"]}')
+        if not isinstance(entry['profile_duration'], (int, float)) or \
+                not isinstance(entry['profile_headroom'], (int, float)) or \
+                entry['profile_duration'] <= 0 or entry['profile_headroom'] < 0:
+            raise ValueError(f'Invalid profile_duration or profile_headroom for '
+                             f'{entry["base_image"]}')
+        if not isinstance(entry['trace_include'], list) or \
+                not isinstance(entry['trace_exclude'], list):
+            raise ValueError(f'trace_include and trace_exclude must be lists of patterns for '
+                             f'{entry["base_image"]}')
+        if not isinstance(entry['encrypt'], list) or (entry['encrypt_jobs'] is not None and
+                (not isinstance(entry['encrypt_jobs'], int) or entry['encrypt_jobs'] <= 0)):
+            raise ValueError(f'encrypt must be a list of SRC:DST mappings and encrypt_jobs a '
+                             f'positive number for {entry["base_image"]}')
+        if entry['encrypt'] and not entry['test'] and not entry['encrypted_files']:
+            raise ValueError(f'encrypt requires encrypted_files for {entry["base_image"]}')
+        if entry['startup_profile'] not in startup_profiles:
+            raise ValueError(f'Invalid startup_profile `{entry["startup_profile"]}` for '
+                             f'{entry["base_image"]}')
+        if entry['attestation'] not in ('', 'test', 'done'):
+            raise ValueError(f'Invalid attestation mode `{entry["attestation"]}` for '
+                             f'{entry["base_image"]}')
+        if not entry['test'] and entry['signing_key'] != 'test':
+            if not path.isfile(entry['signing_key']):
+                raise ValueError(file_not_found_error.format(entry['signing_key']))
+        if entry['encrypted_files'] and not path.isfile(entry['encryption_key']):
+            raise ValueError(file_not_found_error.format(entry['encryption_key']))
+        entries.append(entry)
+
+    attested = [e for e in entries if not e['test'] and e['attestation']]
+    if len({e['attestation'] for e in attested}) > 1:
+        raise ValueError('All attested images in a batch must use the same attestation mode')
+    if len({os.path.abspath(e['encryption_key']) for e in attested
+            if e['encrypted_files']}) > 1:
+        raise ValueError('All attested images in a batch must use the same encryption key')
+
+    docker_hosts = spec.get('docker_hosts', [])
+    if not isinstance(docker_hosts, list) or not isinstance(spec.get('collect_to', ''), str):
+        raise ValueError('docker_hosts must be a list of Docker hosts and collect_to a string')
+    for docker_host in docker_hosts:
+        parse_docker_host_spec(docker_host)
+
+    return entries, spec.get('jobs'), docker_hosts, spec.get('collect_to', '')
+
+# Prepares the verifier certs and starts the verifier image build in the background (the GSC
+# images only need `ca.crt`); returns the verifier build process, None if no image in the batch
+# requires attestation, or -1 on failure.
+def start_batch_verifier(entries, log_file_pointer):
+    attested = [e for e in entries if not e['test'] and e['attestation']]
+    if not attested:
+        return None
+
+    attestation_input = attested[0]['attestation']
+    if attestation_input == 'done':
+        for cert in ('ca.crt', 'server.crt', 'server.key'):
+            if not path.isfile(f'verifier/ssl/{cert}'):
+                print(f'Error: `verifier/ssl/{cert}` does not exist.')
+                return -1
+
+    ef_required, enc_key_path_in_verifier = 'n', ''
+    encrypted = [e for e in attested if e['encrypted_files']]
+    if encrypted:
+        ef_required = 'y'
+        enc_key_path_in_verifier = enc_key_path.format(
+            os.path.basename(encrypted[0]['encryption_key']))
+
+    run_verifier_helper(attestation_input, ef_required, enc_key_path_in_verifier,
+                        log_file_pointer, step='certs')
+    if not path.isfile(ssl_folder_path_on_host + '/ca.crt'):
+        print(verifier_certs_failed.format('verifier/' + verifier_log_file))
+        return -1
+
+    print(verifier_build_messg)
+    return start_verifier_helper(attestation_input, ef_required, enc_key_path_in_verifier,
+                                 log_file_pointer, step='image')
+
+# Returns the build options of a batch entry (see `prepare_build_options()`)
+def get_batch_entry_build_options(docker_socket, entry, log_file):
+    workload_type = entry['workload']
+    if entry['test']:
+        args = get_insecure_args(workload_type) + ' ' + get_common_args(workload_type)
+        flags = get_docker_run_flags(workload_type)
+        encrypted_files = get_encrypted_files(workload_type)
+        encryption_key = None
+    else:
+        args = ' '.join(filter(None, [entry['args'], get_common_args(workload_type)]))
+        flags = entry['docker_run_flags']
+        encrypted_files = entry['encrypted_files']
+        encryption_key = entry['encryption_key']
+    return prepare_build_options(docker_socket, workload_type, entry['base_image'], args, flags,
+                                 entry, log_file, encrypted_files=encrypted_files,
+                                 encryption_key=encryption_key,
+                                 log=lambda text: print(f'[{entry["base_image"]}] {text}'))
+
+def curate_batch_entry(pool, entry, collect_to, collect_client):
+    base_image_name = entry['base_image']
+    host = pool.acquire(get_cache_scores(pool.hosts, base_image_name, entry['buildtype']))
+    try:
+        if len(pool.hosts) > 1:
+            print(batch_host_msg.format(base_image_name, host.name))
+        exit_code, log_file, commands_file_name = build_batch_entry(host, entry)
+    finally:
+        pool.release(host)
+
+    if commands_file_name and collect_to:
+        try:
+            collected = collect_image(host, f'gsc-{base_image_name}', collect_to, collect_client)
+        except (RuntimeError, docker.errors.DockerException) as e:
+            print(batch_collect_failed.format(base_image_name, collect_to, e))
+            return exit_code or -1, log_file, None
+        print(batch_collected_msg.format(base_image_name, collected, collect_to))
+    return exit_code, log_file, commands_file_name
+
+def build_batch_entry(host, entry):
+    docker_socket = host.client
+    workload_type = entry['workload']
+    base_image_name = entry['base_image']
+    buildtype = entry['buildtype']
+    gsc_app_image = f'gsc-{base_image_name}'
+    log_file = get_log_file(workload_type, base_image_name)
+    commands_file_name = log_file[:-len('.log')] + '.commands.txt'
+
+    if get_docker_image(docker_socket, base_image_name) is None:
+        if pull_docker_image(docker_socket, base_image_name) == -1:
+            return -1, log_file, None
+
+    try:
+        image_distro = get_image_distro(docker_socket, base_image_name)
+    except RuntimeError as e:
+        print(f'Error: {e} for `{base_image_name}`.')
+        return -1, log_file, None
+    if image_distro not in supported_distros:
+        print(f'Error: Unsupported distro "{image_distro}" for `{base_image_name}`.')
+        return -1, log_file, None
+
+    analysis_socket = docker_socket
+    if host.name != 'local' and (entry['profile'] or entry['trace_files']):
+        analysis_socket = docker.from_env()
+        if get_docker_image(analysis_socket, base_image_name) is None:
+            if pull_docker_image(analysis_socket, base_image_name) == -1:
+                return -1, log_file, None
+
+    try:
+        build_options = get_batch_entry_build_options(analysis_socket, entry, log_file)
+    except (RuntimeError, docker.errors.DockerException) as e:
+        print(build_options_failed.format(base_image_name, e))
+        return -1, log_file, None
+    build_options['docker_host'] = host.get_docker_host_env()
+
+    with open(log_file, 'w') as log_file_pointer:
+        if entry['test']:
+            parser = start_test_curation_script(workload_type, base_image_name, image_distro,
+                                                buildtype, log_file_pointer, build_options)
+        else:
+            user_args = entry['args']
+            if user_args:
+                user_args += ' '
+            user_args += get_common_args(workload_type)
+
+            attestation_input = entry['attestation']
+            attestation_required = 'y' if attestation_input else 'n'
+            ca_cert_path = ssl_folder_path_on_host + '/ca.crt' if attestation_input else ''
+
+            ef_required, encryption_key_path = 'n', ''
+            if entry['encrypted_files']:
+                ef_required = 'y'
+                encryption_key_path = os.path.abspath(entry['encryption_key'])
+
+            key_path = entry['signing_key']
+            if key_path != 'test':
+                key_path = os.path.abspath(key_path)
+            passphrase = ''
+            if entry['signing_key_passphrase_env']:
+                passphrase = os.environ.get(entry['signing_key_passphrase_env'], '')
+
+            parser = start_curation_script(workload_type, base_image_name, image_distro,
+                                           key_path, get_args_json(user_args),
+                                           attestation_required, buildtype, ca_cert_path,
+                                           'y' if entry['env_vars'] else 'n', entry['env_vars'],
+                                           ef_required, entry['encrypted_files'],
+                                           encryption_key_path, passphrase, log_file_pointer,
+                                           build_options)
+        exit_code = parser.wait()
+    parser.write_build_record(get_build_record_file(log_file), workload_type, base_image_name,
+                              gsc_app_image, buildtype, build_options)
+
+    if get_docker_image(docker_socket, gsc_app_image) is None:
+        return exit_code or -1, log_file, None
+
+    if entry['test']:
+        run_command = get_test_run_command(workload_type, gsc_app_image)
+    else:
+        test_config = entry['attestation'] == 'test' or entry['signing_key'] == 'test'
+        run_command = get_run_commands(gsc_app_image, buildtype, entry['docker_run_flags'],
+                                       entry['attestation'], encryption_key_path, test_config,
+                                       parser.get_measurements())
+    with open(commands_file_name, 'w') as commands_fp:
+        commands_fp.write(run_command)
+    return exit_code, log_file, commands_file_name
+
+# Probes the start-up of the successfully curated images of a batch one after another (so that the
+# measurements don't interfere with each other); returns the number of failed probes. The probe
+# runs on the local daemon, so images that were built on another daemon and not collected to the
+# local one are skipped.
+def probe_batch(docker_socket, entries, results, options):
+    failed = 0
+    for entry in entries:
+        _, status, _, _, log_file, _ = results[entry['base_image']]
+        if status != 'ok':
+            continue
+        if get_docker_image(docker_socket, f'gsc-{entry["base_image"]}') is None:
+            print(probe_skipped_not_local.format(entry['base_image']))
+            continue
+        workload_type = entry['workload']
+        if entry['test']:
+            args = get_insecure_args(workload_type) + ' ' + get_common_args(workload_type)
+            flags = get_docker_run_flags(workload_type)
+        else:
+            if entry['attestation'] and not options.probe_verifier:
+                print(probe_skipped_attestation.format(entry['base_image']))
+                continue
+            args, flags = '', entry['docker_run_flags']
+        if not run_startup_probe(workload_type, f'gsc-{entry["base_image"]}', log_file, args,
+                                 flags, entry['startup_profile'], options):
+            failed += 1
+    return failed
+
+def curate_batch(spec_file, jobs, options):
+    try:
+        entries, spec_jobs, docker_hosts, collect_to = load_batch_spec(spec_file)
+        docker_hosts = options.docker_host or docker_hosts
+        collect_to = options.collect_to or collect_to
+        for docker_host in docker_hosts:
+            parse_docker_host_spec(docker_host)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}')
+        return -1
+    for entry in entries:
+        if options.startup_profile:
+            entry['startup_profile'] = options.startup_profile
+        if options.profile or entry['startup_profile'] == 'minimal':
+            entry['profile'] = True
+        if options.trace_files:
+            entry['trace_files'] = True
+        entry['trace_include'] = entry['trace_include'] + options.trace_include
+        entry['trace_exclude'] = entry['trace_exclude'] + options.trace_exclude
+        if options.encrypt_jobs:
+            entry['encrypt_jobs'] = options.encrypt_jobs
+
+    docker_socket = docker.from_env()
+    try:
+        hosts = [DockerHost(docker_host) for docker_host in docker_hosts]
+        collect_client = None
+        if collect_to and is_daemon_target(collect_to):
+            collect_client = connect_docker_daemon(collect_to)
+    except docker.errors.DockerException as e:
+        print(f'Error: Cannot connect to Docker host: {e}')
+        return -1
+    jobs = jobs or spec_jobs or sum(host.slots for host in hosts) or os.cpu_count()
+    if not hosts:
+        hosts = [DockerHost(f'local={jobs}')]
+    pool = DockerHostPool(hosts)
+
+    verifier_log_file_pointer = open('verifier/' + verifier_log_file, 'w')
+    verifier_build = start_batch_verifier(entries, verifier_log_file_pointer)
+    if verifier_build == -1:
+        return -1
+
+    results = {}
+    print(batch_start_msg.format(len(entries), jobs))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for entry in entries:
+            future = executor.submit(curate_batch_entry, pool, entry, collect_to,
+                                     collect_client)
+            futures[future] = (entry, time.monotonic())
+        for future in concurrent.futures.as_completed(futures):
+            entry, start = futures[future]
+            try:
+                exit_code, log_file, commands_file_name = future.result()
+            except Exception as e:
+                print(batch_entry_failed.format(entry['base_image'], e))
+                exit_code, commands_file_name = -1, None
+                log_file = get_log_file(entry['workload'], entry['base_image'])
+            duration = time.monotonic() - start
+            status = 'ok' if commands_file_name else 'FAILED'
+            results[entry['base_image']] = (entry, status, exit_code, duration, log_file,
+                                            commands_file_name)
+            print(batch_progress_msg.format(entry['base_image'], status, duration))
+
+    print(batch_summary_header)
+    for entry in entries:
+        _, status, exit_code, duration, log_file, commands_file_name = \
+            results[entry['base_image']]
+        print(batch_summary_row.format(entry['base_image'], entry['workload'], status, exit_code,
+                                       duration, commands_file_name or log_file))
+    failed = sum(1 for r in results.values() if r[1] != 'ok')
+    print(batch_summary_footer.format(len(entries) - failed, failed))
+
+    if verifier_build is not None:
+        verifier_build.wait()
+        if get_docker_image(docker_socket, 'verifier:latest') is None:
+            print(image_creation_failed.format('verifier:latest', 'verifier/' + verifier_log_file))
+            failed += 1
+
+    if options.probe:
+        failed += probe_batch(docker_socket, entries, results, options)
+    return 1 if failed else 0
+
 parser = argparse.ArgumentParser()
-parser.add_argument('workload_type', help='Name of the application, e.g., redis or pytorch. Name '
-                    'has to correspond to the application\'s folder name in \'workloads/\'.')
-parser.add_argument('base_image_name', help='Name of the base image to be graminized.')
+parser.add_argument('workload_type', nargs='?', help='Name of the application, e.g., redis or '
+                    'pytorch. Name has to correspond to the application\'s folder name in '
+                    '\'workloads/\'.')
+parser.add_argument('base_image_name', nargs='?', help='Name of the base image to be graminized.')
 parser.add_argument('-t', '--test', action='store_true',
     help='To generate an insecure image with a test enclave signing key.')
 parser.add_argument('-b', '--buildtype', choices=['release', 'debug', 'debugoptimized'],
     default='release', help='Compile Gramine in release, debug or debugoptimized mode.')
 
-curate_gsc_image(parser.parse_args())
+parser.add_argument('--batch', metavar='SPEC',
+    help='Non-interactively curate all images described in the JSON batch spec SPEC.')
+parser.add_argument('-j', '--jobs', type=int, default=0,
+    help='Number of images curated in parallel in batch mode (default: `jobs` from the spec, '
+         'the total number of slots of the Docker hosts, or the number of CPUs).')
+parser.add_argument('--docker-host', action='append', default=[], metavar='URL[=SLOTS]',
+    help='Docker daemon to curate on in batch mode, running up to SLOTS builds at a time (can be '
+         'repeated; `local` is the daemon of the environment; default: `docker_hosts` from the '
+         'spec, or the local daemon).')
+parser.add_argument('--collect-to', metavar='TARGET', default=None,
+    help='In batch mode, copy the curated images to the Docker daemon TARGET (`local` or a URL), '
+         'or push them to the registry prefix TARGET (default: `collect_to` from the spec).')
+
+parser.add_argument('--profile', action='store_true',
+    help='Size the enclave (sgx.enclave_size and sgx.max_threads) by running the base image once '
+         'natively and measuring its peak memory and thread count.')
+parser.add_argument('--profile-args', default=None,
+    help='Representative command-line arguments for the profiling and tracing runs (default: the '
+         'arguments the image is curated with).')
+parser.add_argument('--profile-docker-run-flags', default=None,
+    help='Docker run flags for the profiling and tracing runs (default: the docker run flags of '
+         'the workload).')
+parser.add_argument('--profile-duration', type=float, default=profile_default_duration,
+    help='Maximum duration of the profiling and tracing runs in seconds (default: %(default)s).')
+parser.add_argument('--headroom', type=float, default=profile_default_headroom,
+    help='Headroom added to the observed peaks, as a fraction (default: %(default)s).')
+
+parser.add_argument('--trace-files', action='store_true',
+    help='Trust only the files that the workload opens when it is run once natively under '
+         'strace, instead of all files of the image.')
+parser.add_argument('--trace-include', action='append', default=[], metavar='PATTERN',
+    help='Additionally trust the files of the image matching the glob PATTERN (can be repeated).')
+parser.add_argument('--trace-exclude', action='append', default=[], metavar='PATTERN',
+    help='Neither trust nor allow the traced paths matching the glob PATTERN (can be repeated).')
+
+parser.add_argument('--encrypt', action='append', default=[], metavar='SRC:DST',
+    help='Before curation, encrypt the plaintext file or directory SRC into DST, which must be one '
+         'of the encrypted files mounted from the host (absolute paths; encrypted files inside of '
+         'the base image are not supported) (can be repeated; `encrypt` of the entries in batch '
+         'mode).')
+parser.add_argument('--encrypt-jobs', type=int, default=None, metavar='N',
+    help='Number of files encrypted in parallel (default: the number of CPUs).')
+
+parser.add_argument('--startup-profile', choices=list(startup_profiles), default=None,
+    help='Start-up tuning of the enclave: ' + '; '.join(f'`{name}`: {description}' for
+         name, description in startup_profiles.items()) + ' (default: `default`, or '
+         '`startup_profile` of the batch spec entries).')
+parser.add_argument('--probe', type=int, default=0, metavar='N',
+    help='After curation, start the image N times and report the time spent in enclave creation, '
+         'attestation and application start-up (only with --test or --batch).')
+parser.add_argument('--probe-port', type=int, default=None,
+    help='Port on which the workload accepts connections once it is ready (default: `port` from '
+         '`workloads/<workload>/benchmark.json`; 0 means the workload is ready when it exits).')
+parser.add_argument('--probe-verifier', metavar='HOST:PORT', default=None,
+    help='Secret provisioning server of attested images; the probe relays the connections to '
+         'it to measure the attestation time.')
+parser.add_argument('--probe-timeout', type=float, default=probe_default_timeout,
+    help='Maximum time to wait for the workload to become ready in seconds (default: '
+         '%(default)s).')
+
+cmdline_args = parser.parse_args()
+if cmdline_args.profile_duration <= 0 or cmdline_args.headroom < 0:
+    parser.error('--profile-duration must be positive and --headroom must not be negative')
+if cmdline_args.probe < 0 or cmdline_args.probe_timeout <= 0:
+    parser.error('--probe must not be negative and --probe-timeout must be positive')
+if cmdline_args.probe and not (cmdline_args.test or cmdline_args.batch):
+    parser.error('--probe requires --test or --batch')
+if cmdline_args.encrypt_jobs is not None and cmdline_args.encrypt_jobs <= 0:
+    parser.error('--encrypt-jobs must be positive')
+if (cmdline_args.docker_host or cmdline_args.collect_to) and not cmdline_args.batch:
+    parser.error('--docker-host and --collect-to require --batch')
+if cmdline_args.encrypt and cmdline_args.batch:
+    parser.error('--encrypt is not supported with --batch, use `encrypt` of the batch spec entries')
+if cmdline_args.batch:
+    sys.exit(curate_batch(cmdline_args.batch, cmdline_args.jobs, cmdline_args))
+if not cmdline_args.workload_type or not cmdline_args.base_image_name:
+    parser.error('workload_type and base_image_name are required unless --batch is given')
+cmdline_args.startup_profile = cmdline_args.startup_profile or 'default'
+if cmdline_args.startup_profile == 'minimal':
+    cmdline_args.profile = True
+curate_gsc_image(cmdline_args)
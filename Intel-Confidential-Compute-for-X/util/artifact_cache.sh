@@ -0,0 +1,148 @@
+#!/bin/bash
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# Copyright (C) 2024 Intel Corporation
+
+# Local artifact cache for the base image helper scripts
+# (`workloads/*/base_image_helper/helper.sh`), which source this file.
+#
+# Downloaded files and generated artifacts (datasets, models; directories are stored as tar
+# archives) are stored once per content as `$ARTIFACT_CACHE/blobs/<sha256>`. A key (the URL of a
+# download, or the name, version and generator hash of a generated artifact) maps to its blob via
+# `$ARTIFACT_CACHE/keys/<sha256 of the key>`; blobs are verified against their hash when they are
+# used. Python packages are downloaded as wheels into `$ARTIFACT_CACHE/wheels`, from which the
+# Docker builds of the helpers install them through a bind mount instead of accessing PyPI.
+#
+# The cache is located in $CURATION_ARTIFACT_CACHE (default: ~/.cache/gsc-curation/artifacts).
+# Set CURATION_OFFLINE=1 to serve artifacts only from the cache and to fail on cache misses instead
+# of accessing the network, e.g. on a disconnected build host to which the cache directory was
+# copied from a connected one.
+
+ARTIFACT_CACHE=${CURATION_ARTIFACT_CACHE:-${XDG_CACHE_HOME:-$HOME/.cache}/gsc-curation/artifacts}
+mkdir -p $ARTIFACT_CACHE/blobs $ARTIFACT_CACHE/keys $ARTIFACT_CACHE/refs $ARTIFACT_CACHE/wheels
+
+# The helpers' Docker builds use named build contexts and `RUN --mount`
+export DOCKER_BUILDKIT=1
+
+artifact_hash () {
+    printf '%s' "$1" | sha256sum | cut -d' ' -f1
+}
+
+# Fails (and removes the blob) if blob $1 doesn't match its hash
+artifact_verify () {
+    [[ -f $1 ]] || return 1
+    if [[ $(sha256sum $1 | cut -d' ' -f1) != $(basename $1) ]]; then
+        echo "Removing corrupted cache blob $1" >&2
+        rm -f $1
+        return 1
+    fi
+}
+
+# Prints the blob of key $1; fails if the key isn't cached
+artifact_lookup () {
+    local key_file=$ARTIFACT_CACHE/keys/$(artifact_hash "$1")
+    [[ -f $key_file ]] || return 1
+    local blob=$ARTIFACT_CACHE/blobs/$(head -n 1 $key_file)
+    artifact_verify $blob || return 1
+    echo $blob
+}
+
+# Moves file $2 into the cache as the blob of key $1
+artifact_store () {
+    local checksum
+    checksum=$(sha256sum $2 | cut -d' ' -f1)
+    mv -f $2 $ARTIFACT_CACHE/blobs/$checksum
+    local key_file=$ARTIFACT_CACHE/keys/$(artifact_hash "$1")
+    printf '%s\n%s\n' $checksum "$1" > $key_file.$$.tmp
+    mv -f $key_file.$$.tmp $key_file
+}
+
+artifact_require_online () {
+    if [[ "$CURATION_OFFLINE" = "1" ]]; then
+        echo "Error: \`$1\` is not in the artifact cache ($ARTIFACT_CACHE) and CURATION_OFFLINE=1"
+        return 1
+    fi
+}
+
+# Downloads URL $1 to file $3, verifying it against the SHA256 checksum $2 (if not empty)
+artifact_fetch () {
+    local url=$1 checksum=$2 dest=$3 blob='' tmp
+    if [[ -n "$checksum" ]]; then
+        artifact_verify $ARTIFACT_CACHE/blobs/$checksum && blob=$ARTIFACT_CACHE/blobs/$checksum
+    else
+        blob=$(artifact_lookup "$url") || blob=''
+    fi
+    if [[ -z "$blob" ]]; then
+        artifact_require_online "$url" || return 1
+        echo "Downloading $url"
+        tmp=$(mktemp $ARTIFACT_CACHE/blobs/.download.XXXXXX)
+        curl -fL --retry 3 -o $tmp "$url" || { rm -f $tmp; return 1; }
+        if [[ -n "$checksum" && $(sha256sum $tmp | cut -d' ' -f1) != "$checksum" ]]; then
+            echo "Error: checksum mismatch for $url"
+            rm -f $tmp
+            return 1
+        fi
+        artifact_store "$url" $tmp
+        blob=$(artifact_lookup "$url")
+    fi
+    echo "Using cached $url ($(basename $blob))"
+    cp -f --reflink=auto $blob "$dest"
+}
+
+# Restores directory $2 as the artifact with key $1; on a cache miss, the command $3... is run to
+# generate the directory, which is then stored in the cache
+artifact_run () {
+    local key=$1 dest=$2 blob tmp
+    shift 2
+    if blob=$(artifact_lookup "$key"); then
+        echo "Using cached $key ($(basename $blob))"
+        rm -rf "$dest" && mkdir -p "$dest"
+        tar -xf $blob -C "$dest"
+        return
+    fi
+    artifact_require_online "$key" || return 1
+    "$@"
+    tmp=$(mktemp $ARTIFACT_CACHE/blobs/.archive.XXXXXX)
+    tar --sort=name --mtime=@0 --owner=0 --group=0 --numeric-owner -C "$dest" -cf $tmp .
+    artifact_store "$key" $tmp
+}
+
+# Prints the newest tag of git repository $1 matching pattern $2 (as of the last online run in
+# offline mode)
+artifact_latest_tag () {
+    local ref_file=$ARTIFACT_CACHE/refs/$(artifact_hash "$1 $2") tag
+    if [[ "$CURATION_OFFLINE" != "1" ]]; then
+        tag=$(git ls-remote --tags --refs --sort=-version:refname "$1" "$2" | head -n 1 |
+              sed 's|.*refs/tags/||')
+        [[ -n "$tag" ]] && echo $tag > $ref_file
+    fi
+    [[ -f $ref_file ]] || { artifact_require_online "$1 $2" >&2; return 1; }
+    cat $ref_file
+}
+
+# Prints the commit of ref $2 (default: HEAD) of git repository $1 (as of the last online run in
+# offline mode)
+artifact_latest_commit () {
+    local ref=${2:-HEAD}
+    local ref_file=$ARTIFACT_CACHE/refs/$(artifact_hash "$1 $ref") commit
+    if [[ "$CURATION_OFFLINE" != "1" ]]; then
+        commit=$(git ls-remote "$1" "$ref" | head -n 1 | cut -f1)
+        [[ -n "$commit" ]] && echo $commit > $ref_file
+    fi
+    [[ -f $ref_file ]] || { artifact_require_online "$1 $ref" >&2; return 1; }
+    cat $ref_file
+}
+
+# Downloads the wheels of the Python packages $2... (and of their dependencies) for the Python
+# interpreter of image $1 into the wheel cache; builds install them with
+# `RUN --mount=type=bind,from=wheels,target=/wheels pip3 install --no-index --find-links /wheels`
+# and `docker build --build-context wheels=$ARTIFACT_CACHE/wheels`
+artifact_pip_wheels () {
+    local image=$1
+    shift
+    if [[ "$CURATION_OFFLINE" = "1" ]]; then
+        echo "Offline mode, installing $* from the wheel cache only"
+        return
+    fi
+    docker run --rm --entrypoint pip3 --user $(id -u):$(id -g) -e HOME=/tmp \
+        -v $ARTIFACT_CACHE/wheels:/wheels $image download --dest /wheels "$@"
+}
@@ -2,6 +2,8 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
 # Copyright (C) 2022 Intel Corporation
 
+import re
+
 title_height = 3
 screen_height = 46
 screen_width = 120
@@ -23,6 +25,8 @@ partition_height = screen_height - (user_input_height + partition_y + 1)
 color_set = '::reverse'
 
 supported_distros = ('ubuntu:20.04', 'ubuntu:22.04', 'debian:10', 'debian:11')
+os_release_paths = ('/etc/os-release', '/usr/lib/os-release')
+distro_cache_file = 'build/distro_cache.json'
 test_image_msg = ('\nYour test GSC image is being generated. This image is not supposed to be'
                    ' used in production\n')
 
@@ -66,6 +70,9 @@ signing_key_help = ['SGX requires RSA 3072 keys with public exponent equal to 3.
                     'openssl genrsa -3 -aes128 -passout pass:test@123 -out enclave-key.pem 3072'
                     + color_set]
 verifier_build_messg = 'Building the RA-TLS Verifier image, this might take couple of minutes'
+verifier_certs_messg = 'Preparing the RA-TLS Verifier certificates'
+verifier_certs_failed = ('\n\n\nPreparation of the RA-TLS Verifier certificates failed, exiting....\n\n'
+                         'For more info, look at the log file here: {}\n\n')
 verifier_log_help = 'You may monitor verifier/{} for progress'
 attestation_prompt = ['>> Remote Attestation:' , 'To enable remote attestation using Intel SGX DCAP'
                       ' libs, use another terminal to copy the ca.crt, server.crt, and'
@@ -133,6 +140,17 @@ flags_help =  ['At the end of this Curation app, it writes instructions into com
 
 wait_message = ['Image Creation:', 'Your Gramine Shielded Container image is being created.'
                 ' This might take a few minutes.']
+stage_marker = 'CURATION STAGE: '
+measurement_patterns = {
+    'mr_enclave': re.compile('mr_enclave = \"(.*)\"'),
+    'mr_signer': re.compile('mr_signer = \"(.*)\"'),
+    'isv_prod_id': re.compile('isv_prod_id = (.*)'),
+    'isv_svn': re.compile('isv_svn = (.*)'),
+}
+build_progress_line = '{}: {}'
+build_state_running = 'building ({} s)'
+build_state_finished = 'done'
+build_state_failed = 'FAILED'
 system_config_message = ['System config by default is assumed to be an SGX enabled system.']
 run_command_no_att = '$ docker run {} --device=/dev/sgx/enclave -it {}'
 run_with_debug = 'python3 curate.py {} {} debug' + color_set
@@ -157,3 +175,127 @@ verifier_cert_mount = '-v {}:/ra-tls-secret-prov/ssl'
 verifier_log_file = 'verifier.log'
 file_not_found_error = 'Error: {} file does not exist.'
 CTRL_G = 7
+
+# Enclave sizing by profiling (`--profile`): the observed per-process peaks are scaled by the
+# headroom, Gramine's own memory (LibOS, PAL, internal heap, thread stacks) and helper threads are
+# added on top, and the enclave size is rounded up to a power of two (as required by Gramine)
+profile_default_duration = 30
+profile_default_headroom = 0.25
+profile_sample_interval = 0.2
+profile_status_fields = {
+    'mapped': 'VmPeak',
+    'heap': 'VmData',
+    'rss': 'VmHWM',
+    'threads': 'Threads',
+}
+enclave_size_overhead = 256 * 1024 * 1024
+enclave_size_min = 256 * 1024 * 1024
+enclave_internal_threads = 4
+profile_msg = 'Profiling `{}` for up to {} s to size the enclave ...'
+profile_report = ('Enclave sizing for `{}`: sgx.enclave_size = "{}", sgx.max_threads = {} '
+                  '(observed peaks: {}, headroom {:.0%})')
+
+# Start-up profiles (`--startup-profile`), see `curation_script.sh` for the resulting manifest
+# options
+startup_profiles = {
+    'default': 'keep the start-up options of the manifest template',
+    'preheat': 'pre-fault all enclave pages at start-up (slower start, no page faults later)',
+    'edmm': 'allocate enclave pages on demand (requires EDMM support of the CPU and the kernel)',
+    'minimal': 'smallest enclave that fits the profiled workload, no pre-faulting (implies '
+               '--profile)',
+}
+
+# Start-up probe (`--probe`)
+sgx_devices = ('/dev/sgx_enclave', '/dev/sgx/enclave')
+probe_default_timeout = 600
+probe_poll_interval = 0.02
+probe_gramine_start_marker = re.compile('Gramine is starting')
+probe_enclave_ready_marker = re.compile('Gramine detected the following insecure configurations')
+probe_phases = ('container_s', 'enclave_s', 'attestation_s', 'application_s', 'total_s')
+probe_msg = 'Probing the start-up of `{}` ({} runs) ...'
+probe_failed = 'Error: Start-up probe of `{}` failed: {}'
+probe_header = '\nStart-up of `{}` ({}, start-up profile `{}`, {} runs):'
+probe_table_header = '{:<12} {:>8} {:>8} {:>8} {:>8}'.format('Phase [s]', 'Median', 'Mean',
+                                                            'Min', 'Max')
+probe_row = '{:<12} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f}'
+probe_row_unobserved = '{:<12} {:>8}'.format('{}', 'n/a')
+probe_report_written = 'Start-up report written to {}'
+probe_skipped_attestation = ('Skipping the start-up probe of `{}`: attested images require '
+                             '--probe-verifier')
+probe_skipped_not_local = ('Skipping the start-up probe of `{}`: the image was curated on another '
+                           'Docker daemon and is not on the local one (use --collect-to local)')
+
+# File access tracing (`--trace-files`); GSC doesn't list the files in `gsc_untrusted_dirs` as
+# trusted files (see `generate_trusted_files()` in GSC's `finalize_manifest.py`), and accesses to
+# the pseudo filesystems in `trace_ignored_dirs` are never checked
+gsc_untrusted_dirs = ('/boot', '/dev', '/proc', '/sys', '/var')
+trace_ignored_dirs = ('/dev', '/proc', '/sys')
+trace_dockerfile = '''FROM {}
+USER root
+RUN apt-get update && DEBIAN_FRONTEND=noninteractive apt-get install -y --no-install-recommends \\
+    strace && rm -rf /var/lib/apt/lists/*
+USER {}
+'''
+trace_strace_args = ('-ff', '-qq', '-e', 'trace=execve,execveat,open,openat,creat', '-e',
+                     'signal=none')
+trace_line_pattern = re.compile(r'^(\w+)\((.*)\)\s+=\s+(-?\d+)')
+trace_path_pattern = re.compile(r'"((?:[^"\\]|\\.)*)"')
+trace_write_flags_pattern = re.compile('O_WRONLY|O_RDWR|O_CREAT')
+trace_inspect_script = ("find / -xdev -type f -printf '%s %p\\n' 2>/dev/null; echo ---; "
+                        "xargs -r -d '\\n' realpath -m --")
+trace_snippet_comment = ('# Trusted and allowed files from tracing the workload '
+                         '(curate.py --trace-files)')
+trace_msg = 'Tracing the file accesses of `{}` for up to {} s ...'
+trace_report = ('Trusted files for `{}`: {} files ({}) trusted, {} paths allowed; {} of {} files '
+                '({}) removed from measurement, see {}')
+
+# Pre-encryption of the encrypted files (`--encrypt SRC:DST`); the files are encrypted with
+# `pf_crypt_tool` (which writes Gramine's protected-files format) into the path under which they
+# are mounted into the container, and `encryption_state_file` records the plaintext and ciphertext
+# of every encrypted file so that unchanged files are not encrypted again
+pf_crypt_tool = 'gramine-sgx-pf-crypt'
+test_encryption_key = 'workloads/{}/base_image_helper/encryption_key'
+encryption_key_size = 16
+encryption_state_file = 'build/encryption_state.json'
+encryption_hash_chunk_size = 1 << 20
+encryption_msg = 'Encrypting {} files ({}) with up to {} parallel job(s) ...'
+encryption_report = ('Encrypted files for `{}`: {} files ({}) encrypted in {:.1f} s ({}/s), {} '
+                     'files ({}) up to date, {} stale files removed')
+
+batch_entry_keys = {
+    'workload': '',
+    'base_image': '',
+    'test': False,
+    'buildtype': 'release',
+    'args': '',
+    'env_vars': '',
+    'docker_run_flags': '',
+    'encrypted_files': '',
+    'encryption_key': '',
+    'signing_key': 'test',
+    'signing_key_passphrase_env': '',
+    'attestation': '',
+    'profile': False,
+    'profile_args': None,
+    'profile_docker_run_flags': None,
+    'profile_duration': profile_default_duration,
+    'profile_headroom': profile_default_headroom,
+    'startup_profile': 'default',
+    'trace_files': False,
+    'trace_include': [],
+    'trace_exclude': [],
+    'encrypt': [],
+    'encrypt_jobs': None,
+}
+build_options_failed = 'Error: Preparing the curation of `{}` failed: {}'
+docker_host_cpus_per_build = 8
+batch_host_msg = '[{}] curating on Docker host `{}`'
+batch_collected_msg = '[{}] collected `{}` to `{}`'
+batch_collect_failed = '[{}] Error: Collecting the image to `{}` failed: {}'
+batch_entry_failed = '[{}] Error: Curation failed: {}'
+batch_start_msg = 'Curating {} image(s) with up to {} parallel job(s) ...\n'
+batch_progress_msg = '[{}] {} after {:.0f} s'
+batch_summary_header = ('\n{:<40} {:<22} {:<7} {:>5} {:>8}  {}'.format('Base image', 'Workload',
+                        'Status', 'Exit', 'Time (s)', 'Commands / log file'))
+batch_summary_row = '{:<40} {:<22} {:<7} {:>5} {:>8.0f}  {}'
+batch_summary_footer = '\n{} image(s) curated successfully, {} failed.'
@@ -43,16 +43,60 @@ workload_type=$1
 wrapper_dockerfile=$workload_type'-gsc.dockerfile'
 app_image_manifest=$workload_type'.manifest'
 
+base_image="$2"
+distro="$3"
+
+# Each base image gets its own scratch directory (GSC checkout, generated wrapper dockerfile,
+# manifest and CA certificate), so that several curations (e.g. `curate.py --batch`), also of the
+# same workload, can run concurrently
 CUR_DIR=$(pwd)
+BUILD_DIR=$CUR_DIR'/build/'$(echo $base_image | sed 's|[:/]|_|g')
 WORKLOAD_DIR=$CUR_DIR'/workloads/'$workload_type
 cd $WORKLOAD_DIR
-rm -rf $CUR_DIR'/test' && mkdir $CUR_DIR'/test' >/dev/null 2>&1
+rm -rf $BUILD_DIR && mkdir -p $BUILD_DIR >/dev/null 2>&1
 
-cp -f $wrapper_dockerfile'.template' $wrapper_dockerfile
-cp -f $app_image_manifest'.template' $app_image_manifest
+cp -f $wrapper_dockerfile'.template' $BUILD_DIR/$wrapper_dockerfile
+cp -f $app_image_manifest'.template' $BUILD_DIR/$app_image_manifest
+wrapper_dockerfile=$BUILD_DIR/$wrapper_dockerfile
+app_image_manifest=$BUILD_DIR/$app_image_manifest
+
+# Replaces (or adds) the manifest option $1 with the TOML value $2
+set_manifest_option () {
+    sed -i '/^'${1//./\\.}'[[:space:]]*=/d' $app_image_manifest
+    echo "$1 = $2" >> $app_image_manifest
+}
+
+# Enclave sizing determined by profiling the workload (`curate.py --profile`) replaces the sizing of
+# the manifest template
+if [[ -n "$CURATION_ENCLAVE_SIZE" ]]; then
+    echo '' >> $app_image_manifest
+    echo "# Enclave sizing from profiling ($CURATION_SIZING_NOTE)" >> $app_image_manifest
+    set_manifest_option sgx.enclave_size '"'$CURATION_ENCLAVE_SIZE'"'
+    set_manifest_option sgx.max_threads $CURATION_MAX_THREADS
+fi
+
+# Start-up profile (`curate.py --startup-profile`): `preheat` pre-faults all enclave pages at
+# start-up, `edmm` adds enclave pages on demand (requires EDMM support of the CPU and the kernel),
+# `minimal` uses the profiled enclave size (see above) without pre-faulting
+case "$CURATION_STARTUP_PROFILE" in
+    preheat)
+        set_manifest_option sgx.preheat_enclave true
+        ;;
+    edmm)
+        set_manifest_option sgx.edmm_enable true
+        set_manifest_option sgx.preheat_enclave false
+        ;;
+    minimal)
+        set_manifest_option sgx.preheat_enclave false
+        ;;
+esac
+
+# Trusted and allowed files from tracing the workload (`curate.py --trace-files`)
+if [[ -n "$CURATION_FILES_SNIPPET" ]]; then
+    echo '' >> $app_image_manifest
+    cat "$CURATION_FILES_SNIPPET" >> $app_image_manifest
+fi
 
-base_image="$2"
-distro="$3"
 # Set base image name in the dockerfile
 sed -i 's|^FROM <base_image_name>$|FROM '$base_image'|' $wrapper_dockerfile
 
@@ -65,11 +109,65 @@ fi
 # Delete existing GSC image for the base image
 docker rmi -f gsc-$base_image >/dev/null 2>&1
 
+# Announces a new build stage to curate.py (which parses the output of this script line by line)
+log_stage () {
+    echo "CURATION STAGE: $*"
+}
+
+# Build cache: each stage (wrapper image, unsigned GSC image, signed GSC image) is keyed by a hash
+# of all of its inputs, and the resulting image is additionally tagged as
+# `$CACHE_REPO:<stage>-<key>`. When a stage's key matches an existing tag, the cached image is
+# reused instead of being rebuilt. Set CURATION_NO_CACHE=1 to always rebuild. Cached images can be
+# pruned with `docker rmi $(docker images -q $CACHE_REPO)`.
+CACHE_REPO='gsc-curation-cache'
+
+stage_key () {
+    printf '%s\n' "$@" | sha256sum | cut -d' ' -f1
+}
+
+file_hash () {
+    if [[ -e "$1" ]]; then
+        sha256sum "$1" | cut -d' ' -f1
+    fi
+}
+
+# Tag the cached image for stage $1 with key $2 as $3; fails if there is no such cached image
+restore_from_cache () {
+    if [[ "$CURATION_NO_CACHE" = "1" ]]; then
+        return 1
+    fi
+    docker image inspect $CACHE_REPO:$1-$2 >/dev/null 2>&1 || return 1
+    echo "Reusing cached $1 image $CACHE_REPO:$1-$2 for $3"
+    docker tag $CACHE_REPO:$1-$2 $3
+}
+
+save_to_cache () {
+    docker tag $3 $CACHE_REPO:$1-$2
+}
+
+# Hash of the public part of the signing key (so that re-encrypting the same key with a different
+# passphrase does not invalidate the cache); falls back to the hash of the key file
+signing_key_fingerprint () {
+    local pubkey
+    pubkey=$(openssl rsa -in $signing_key_path -pubout -passin "pass:$1" 2>/dev/null) ||
+        pubkey=$(file_hash $signing_key_path)
+    stage_key "$pubkey"
+}
+
 copy_cert_files=''
+wrapper_key=''
 create_base_wrapper_image () {
+    log_stage "Building wrapper image"
     sed -i "s|<copy_cert_files>|$copy_cert_files|" $wrapper_dockerfile
     docker rmi -f $app_image_x >/dev/null 2>&1
-    docker build -f $wrapper_dockerfile -t $app_image_x .
+
+    wrapper_key=$(stage_key "$(docker image inspect -f '{{.Id}}' $base_image)" \
+                            "$(file_hash $wrapper_dockerfile)" "$(file_hash $BUILD_DIR/ca.crt)")
+    if restore_from_cache wrapper $wrapper_key $app_image_x; then
+        return
+    fi
+    docker build -f $wrapper_dockerfile -t $app_image_x $BUILD_DIR
+    save_to_cache wrapper $wrapper_key $app_image_x
 }
 
 add_encrypted_files_to_manifest() {
@@ -119,32 +217,115 @@ process_encrypted_files() {
     add_encryption_key_to_manifest $encryption_key
 }
 
+# GSC is used from a persistent local checkout at $CURATION_GSC_DIR (default: `gsc/`), which is
+# cloned on first use and pinned to $CURATION_GSC_TAG (default: the newest release tag at clone
+# time). Pre-populating this directory allows curation without access to GitHub.
+GSC_DIR=${CURATION_GSC_DIR:-$CUR_DIR/gsc}
+GSC_TAG=${CURATION_GSC_TAG:-}
+
+# Copy the pinned GSC checkout to $BUILD_DIR/gsc (so that each curation has its own config.yaml and
+# GSC build directory)
+prepare_gsc_checkout () {
+    mkdir -p $CUR_DIR/build
+    (
+        flock 9
+        if [[ ! -d $GSC_DIR/.git ]]; then
+            rm -rf $GSC_DIR
+            git clone https://github.com/gramineproject/gsc.git $GSC_DIR
+            if [[ -z "$GSC_TAG" ]]; then
+                GSC_TAG=$(git -C $GSC_DIR tag --list 'v*.*' --sort=taggerdate | tail -1)
+            fi
+        fi
+        if [[ -n "$GSC_TAG" ]]; then
+            if ! git -C $GSC_DIR rev-parse -q --verify "refs/tags/$GSC_TAG" >/dev/null; then
+                git -C $GSC_DIR fetch --tags
+            fi
+            git -C $GSC_DIR checkout -q $GSC_TAG
+        fi
+        echo "Using GSC $(git -C $GSC_DIR describe --tags --always) from $GSC_DIR"
+        cp -a $GSC_DIR $BUILD_DIR/gsc
+    ) 9>$CUR_DIR/build/.gsc.lock
+}
+
+# All workloads with the same distro and buildtype are built on top of one shared Gramine image
+# (created via `gsc build-gramine`), so Gramine is compiled only once per Docker daemon (the local
+# one, or $DOCKER_HOST when curate.py distributes the builds). Must be called from the GSC checkout
+# after config.yaml is created; switches config.yaml to the prebuilt image.
+gramine_image=''
+prepare_gramine_image () {
+    local gramine_key=$(stage_key "$(git rev-parse HEAD)" "$(file_hash config.yaml)" $1)
+    gramine_image=gsc-gramine:$(echo $distro | sed 's|:||')-$1-${gramine_key:0:16}
+    local lock_name=${gramine_image//[:\/]/_}
+    if [[ -n "$DOCKER_HOST" ]]; then
+        lock_name+=.$(stage_key "$DOCKER_HOST" | cut -c1-16)
+    fi
+    log_stage "Preparing Gramine image"
+    (
+        flock 9
+        if [[ "$CURATION_NO_CACHE" = "1" ]] ||
+                ! docker image inspect $gramine_image >/dev/null 2>&1; then
+            ./gsc build-gramine --buildtype $1 -c config.yaml $gramine_image
+        else
+            echo "Reusing prebuilt Gramine image $gramine_image"
+        fi
+    ) 9>$CUR_DIR/build/.$lock_name.lock
+
+    sed -i -e '/^Gramine:/,/^$/{/^[[:space:]]*Repository:/d;/^[[:space:]]*Branch:/d}' \
+           -e 's|^Gramine:.*|&\n    Image: "'$gramine_image'"|' config.yaml
+}
+
+# GSC adds all files of the image to `sgx.trusted_files` (see `generate_trusted_files()` in
+# finalize_manifest.py). With traced trusted files, the GSC copy of this build is changed to only
+# keep the trusted files listed in the manifest.
+restrict_gsc_trusted_files () {
+    if ! grep -q '^def generate_trusted_files(.*):$' finalize_manifest.py; then
+        echo "Error: This GSC version does not allow to restrict the trusted files"
+        exit 1
+    fi
+    sed -i 's|^def generate_trusted_files(\(.*\)):$|def generate_trusted_files(\1):\n    return []\n\ndef generate_all_trusted_files(\1):|' \
+        finalize_manifest.py
+}
+
 cmdline_flag=""
 create_gsc_image () {
     echo
-    cd $CUR_DIR
-    rm -rf gsc >/dev/null 2>&1
-    git clone https://github.com/gramineproject/gsc.git
-    cd gsc
-    git checkout $(git tag --list 'v*.*' --sort=taggerdate | tail -1)
+    log_stage "Preparing GSC"
+    prepare_gsc_checkout
+    cd $BUILD_DIR/gsc
+    if [[ -n "$CURATION_FILES_SNIPPET" ]]; then
+        restrict_gsc_trusted_files
+    fi
     cp -f config.yaml.template config.yaml
     sed -i 's|ubuntu:.*|'$distro'"|' config.yaml
-
-    ./gsc build $cmdline_flag --buildtype $1 $app_image_x  $WORKLOAD_DIR/$app_image_manifest
+    prepare_gramine_image $1
+
+    build_key=$(stage_key $wrapper_key "$(file_hash $app_image_manifest)" \
+                          "$(git rev-parse HEAD)" "$(file_hash config.yaml)" $1 "$cmdline_flag")
+    log_stage "Building GSC image"
+    if ! restore_from_cache unsigned $build_key gsc-$base_image-unsigned; then
+        ./gsc build $cmdline_flag --buildtype $1 -c config.yaml $app_image_x $app_image_manifest
+        docker tag gsc-$app_image_x-unsigned gsc-$base_image-unsigned
+        save_to_cache unsigned $build_key gsc-$base_image-unsigned
+    fi
 
     echo
-    docker tag gsc-$app_image_x-unsigned gsc-$base_image-unsigned
+    log_stage "Signing GSC image"
     password_arg=''
     if [[ "$signing_input" != "test" && "$2" != "" ]]; then
         password_arg="-p $2"
     fi
-    ./gsc sign-image $base_image $signing_key_path $password_arg
+    sign_key=$(stage_key $build_key "$(signing_key_fingerprint "$2")")
+    if ! restore_from_cache signed $sign_key gsc-$base_image; then
+        ./gsc sign-image $base_image $signing_key_path $password_arg
+        save_to_cache signed $sign_key gsc-$base_image
+    fi
     docker rmi -f gsc-$base_image-unsigned gsc-$app_image_x-unsigned $app_image_x >/dev/null 2>&1
 
+    log_stage "Reading enclave measurements"
     ./gsc info-image gsc-$base_image
 
-    cd ../
-    rm -rf $CUR_DIR'/test' >/dev/null 2>&1
+    cd $CUR_DIR
+    rm -rf $BUILD_DIR >/dev/null 2>&1
 }
 
 # Signing key
@@ -152,9 +333,17 @@ echo ""
 read -r signing_input signing_key_path <<<$(echo "$4 $4")
 if [ "$signing_input" = "test" ]; then
     cmdline_flag="--insecure-args"
-    echo 'Generating signing key'
-    openssl genrsa -3 -out $CUR_DIR'/test/enclave-key.pem' 3072
-    signing_key_path=$CUR_DIR'/test/enclave-key.pem'
+    # The test key is generated once and reused, so that the signed images of unchanged test
+    # builds are reused from the build cache and keep their MRSIGNER
+    signing_key_path=$CUR_DIR/build/test-enclave-key.pem
+    (
+        flock 9
+        if [[ ! -f $signing_key_path ]]; then
+            echo 'Generating signing key'
+            openssl genrsa -3 -out $signing_key_path.tmp 3072
+            mv -f $signing_key_path.tmp $signing_key_path
+        fi
+    ) 9>$CUR_DIR/build/.test-enclave-key.lock
     grep -qxF 'sgx.file_check_policy = "allow_all_but_log"' $app_image_manifest ||
      echo 'sgx.file_check_policy = "allow_all_but_log"' >> $app_image_manifest
 fi
@@ -173,14 +362,14 @@ if [ "$6" = "test-image" ]; then
     process_encrypted_files
     create_base_wrapper_image
     create_gsc_image $7
-    exit 1
+    exit 0
 fi
 
 # Get Attestation Input
 attestation_required=$6
 if [ "$attestation_required" = "y" ]; then
     ca_cert_path=$8
-    cp -f $CUR_DIR/$ca_cert_path ca.crt
+    cp -f $CUR_DIR/$ca_cert_path $BUILD_DIR/ca.crt
     copy_cert_files='COPY ca.crt /'
     echo '' >> $app_image_manifest
     echo '# Attestation related entries' >> $app_image_manifest
@@ -235,6 +424,6 @@ fi
 echo ""
 create_base_wrapper_image
 if [ "$attestation_required" = "y" ]; then
-    rm ca.crt
+    rm $BUILD_DIR/ca.crt
 fi
 create_gsc_image $7 ${14}
@@ -13,6 +13,10 @@
 # -- arg2    : y or n (encrypted files to be used with workload?)
 # -- arg3    : Encryption key path. `CMD ["key-path"]` instruction will be appended to
 #              verifier.dockerfile when this variable is set.
+# -- arg4    : (optional) 'certs' to only prepare the certs in ssl_common directory, or 'image' to
+#              only build the verifier image from previously prepared certs. Both steps are
+#              performed if not specified. Splitting the steps allows curate.py to build the
+#              verifier image concurrently with the GSC image (which needs ssl_common/ca.crt).
 
 set -e
 echo printing args $0 $@
@@ -20,20 +24,28 @@ echo printing args $0 $@
 MY_PATH=$(dirname "$0")
 pushd ${MY_PATH}
 
-docker rmi -f verifier >/dev/null 2>&1
-rm -rf  ssl_common >/dev/null 2>&1
-mkdir -p ssl_common
-
-if [ "$1" = "done" ]; then
-    cp -f ssl/ca.crt ssl/server.crt ssl/server.key ssl_common/
-else
-    openssl genrsa -out ssl_common/ca.key 2048
-    openssl req -x509 -new -nodes -key ssl_common/ca.key -sha256 -days 1024 -out ssl_common/ca.crt -config ca_config.conf
-    openssl genrsa -out ssl_common/server.key 2048
-    openssl req -new -key ssl_common/server.key -out ssl_common/server.csr -config ca_config.conf
-    openssl x509 -req -days 360 -in ssl_common/server.csr -CA ssl_common/ca.crt -CAkey ssl_common/ca.key -CAcreateserial -out ssl_common/server.crt
+step=$4
+
+if [ "$step" != "image" ]; then
+    rm -rf  ssl_common >/dev/null 2>&1
+    mkdir -p ssl_common
+
+    if [ "$1" = "done" ]; then
+        cp -f ssl/ca.crt ssl/server.crt ssl/server.key ssl_common/
+    else
+        openssl genrsa -out ssl_common/ca.key 2048
+        openssl req -x509 -new -nodes -key ssl_common/ca.key -sha256 -days 1024 -out ssl_common/ca.crt -config ca_config.conf
+        openssl genrsa -out ssl_common/server.key 2048
+        openssl req -new -key ssl_common/server.key -out ssl_common/server.csr -config ca_config.conf
+        openssl x509 -req -days 360 -in ssl_common/server.csr -CA ssl_common/ca.crt -CAkey ssl_common/ca.key -CAcreateserial -out ssl_common/server.crt
+    fi
+fi
+
+if [ "$step" = "certs" ]; then
+    exit 0
 fi
 
+docker rmi -f verifier >/dev/null 2>&1
 cp -f verifier.dockerfile.template verifier.dockerfile
 
 args=''
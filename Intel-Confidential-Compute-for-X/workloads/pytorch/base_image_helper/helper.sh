@@ -7,16 +7,22 @@ set -e
 CUR_DIR=$(pwd)
 MY_PATH=$(dirname "$0")
 cd $MY_PATH
+source ../../../util/artifact_cache.sh
 
 image_name='pytorch-encrypted'
+examples_repo='https://github.com/gramineproject/examples.git'
+examples_tag=$(artifact_latest_tag $examples_repo 'v*.*')
+
+# Clone the PyTorch example and download and save the pre-trained model
+download_example () {
+    rm -rf examples
+    git clone --depth 1 --branch $examples_tag $examples_repo examples
+    cd examples/pytorch
+    python3 download-pretrained-model.py
+    cd ../../
+}
 rm -rf examples
-git clone https://github.com/gramineproject/examples.git
-cd examples/pytorch
-git checkout $(git tag --list 'v*.*' --sort=taggerdate | tail -1)
-
-# Download and save the pre-trained model
-python3 download-pretrained-model.py
-cd ../../
+artifact_run "$examples_repo@$examples_tag:pytorch" examples/pytorch download_example
 
 dd if=/dev/urandom bs=16 count=1 > encryption_key
 
@@ -2,12 +2,24 @@
 # Copyright (c) 2021 Intel Corporation
 #                    Andrey Morkovkin <andrey.morkovkin@intel.com>
 
+import numpy as np
 from sklearn.datasets import fetch_openml
 
+def compact(array):
+    # store integral data (e.g. MNIST pixels 0..255 and digit labels) in the smallest integer type
+    # that holds it, otherwise as float32
+    if np.issubdtype(array.dtype, np.number) and np.all(np.mod(array, 1) == 0):
+        for dtype in (np.uint8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if array.min() >= info.min and array.max() <= info.max:
+                return array.astype(dtype)
+    return array.astype(np.float32)
+
 def main():
     X, y = fetch_openml(name='mnist_784', version=1, return_X_y=True, data_home='data')
-    X.to_csv('data/X.csv', index=False)
-    y.to_csv('data/y.csv', index=False)
+    # binary NumPy format, which the benchmark can memory-map or read in chunks without parsing
+    np.save('data/X.npy', compact(X.to_numpy()))
+    np.save('data/y.npy', compact(y.astype(np.int64).to_numpy()))
 
 if __name__ == '__main__':
     main()
@@ -7,18 +7,24 @@ set -e
 CUR_DIR=$(pwd)
 MY_PATH=$(dirname "$0")
 cd $MY_PATH
+source ../../../util/artifact_cache.sh
 
 image_name='sklearn-base'
+base_image=$(sed -n 's/^FROM //p' Dockerfile)
 
 echo "Downloading datasets..."
 
-# Download and save the datasets
-python3 download_dataset.py
+# Download and save the datasets (cached per version of the dataset and of the conversion script)
+artifact_run "openml:mnist_784@1:$(sha256sum download_dataset.py | cut -d' ' -f1)" data \
+    python3 download_dataset.py
+
+# Download the Python packages installed by the Dockerfile
+artifact_pip_wheels $base_image pandas
 
 # Build Scikit-learn base image
 echo "Base image creation started"
 docker rmi -f $image_name >/dev/null 2>&1
-docker build -t $image_name .
+docker build --build-context wheels=$ARTIFACT_CACHE/wheels -t $image_name .
 
 cd $CUR_DIR
 
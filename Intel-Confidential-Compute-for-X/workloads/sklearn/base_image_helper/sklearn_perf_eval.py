@@ -0,0 +1,411 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# Copyright (c) 2021 Intel Corporation
+#                    Andrey Morkovkin <andrey.morkovkin@intel.com>
+
+# Scikit-learn benchmark suite: times several algorithms with stock Scikit-learn and with Intel®
+# extension for Scikit-learn, optionally sweeping over thread counts and dataset sizes, and writes
+# the results as JSON (to stdout by default; progress is printed to stderr).
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+IMPLEMENTATIONS = ('stock', 'sklearnex')
+LOADERS = ('auto', 'mmap', 'stream')
+
+# DBSCAN is quadratic in the number of samples, so it runs on a subset of the dataset
+DBSCAN_MAX_SAMPLES = 20000
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def detect_environment():
+    # Gramine emulates `/dev/attestation/`; only Gramine-SGX provides the SGX-specific files
+    if not os.path.exists('/dev/attestation/attestation_type'):
+        return 'native'
+    if os.path.exists('/dev/attestation/my_target_info'):
+        return 'gramine-sgx'
+    return 'gramine-direct'
+
+
+def reset_peak_rss():
+    # Linux allows to reset the peak RSS (VmHWM) of the process; not available in Gramine
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss or None
+
+
+def read_npy(path, chunk_size):
+    """Read a .npy file with sequential reads of `chunk_size` bytes directly into the resulting
+    array (no memory mapping, no intermediate copies); suitable for Gramine encrypted files."""
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.hasobject:
+            raise ValueError(f'`{path}` contains Python objects')
+
+        array = np.empty(shape, dtype=dtype, order='F' if fortran_order else 'C')
+        buffer = memoryview(array.reshape(-1, order='A').view(np.uint8))
+        offset = 0
+        while offset < len(buffer):
+            read_size = f.readinto(buffer[offset:offset + chunk_size])
+            if not read_size:
+                raise ValueError(f'`{path}` is truncated')
+            offset += read_size
+    return array
+
+
+def load_dataset(data_dir, loader, chunk_size):
+    """Load the dataset (`X.npy` and `y.npy`) via memory mapping or streaming; the legacy CSV
+    format (`X.csv` and `y.csv`) is still supported, but slow and memory-hungry to parse."""
+    x_path = os.path.join(data_dir, 'X.npy')
+    y_path = os.path.join(data_dir, 'y.npy')
+    if not os.path.exists(x_path):
+        import pandas as pd
+        log(f'*** `{x_path}` not found, falling back to the CSV format ***')
+        X = pd.read_csv(os.path.join(data_dir, 'X.csv')).to_numpy()
+        y = pd.read_csv(os.path.join(data_dir, 'y.csv')).to_numpy().ravel()
+        return X, y
+
+    if loader == 'mmap':
+        return np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+    return read_npy(x_path, chunk_size), read_npy(y_path, chunk_size)
+
+
+def split_dataset(X, y, n_samples, dtype, chunk_rows):
+    """Split the first `n_samples` samples into scaled train and test sets of type `dtype`; the
+    (possibly memory-mapped) samples are scaled in chunks of `chunk_rows`, so that the only large
+    allocations are the resulting sets."""
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import MinMaxScaler
+
+    train_indices, test_indices = train_test_split(np.arange(n_samples), test_size=0.1,
+                                                   random_state=123)
+
+    scaler_x = MinMaxScaler()
+    for start in range(0, len(train_indices), chunk_rows):
+        scaler_x.partial_fit(X[np.sort(train_indices[start:start + chunk_rows])])
+
+    def transform(indices):
+        result = np.empty((len(indices), X.shape[1]), dtype=dtype)
+        for start in range(0, len(indices), chunk_rows):
+            chunk = X[indices[start:start + chunk_rows]]
+            result[start:start + chunk_rows] = scaler_x.transform(chunk)
+        return result
+
+    return (transform(train_indices), transform(test_indices), np.asarray(y[train_indices]),
+            np.asarray(y[test_indices]))
+
+
+# Each benchmark runs one complete fit/predict cycle and returns the times of its stages (in
+# seconds) and quality metrics of the result. Estimators are looked up at call time, so that the
+# classes patched by `patch_sklearn()` are used.
+
+def bench_kmeans(x_train, x_test, y_train, y_test, n_jobs):
+    import sklearn.cluster
+
+    start = timer()
+    model = sklearn.cluster.KMeans(n_clusters=10, n_init=10, random_state=123,
+                                   copy_x=False).fit(x_train)
+    fit_time = timer() - start
+
+    start = timer()
+    model.predict(x_test)
+    predict_time = timer() - start
+
+    return ({'fit': fit_time, 'predict': predict_time},
+            {'inertia': float(model.inertia_), 'n_iter': int(model.n_iter_)})
+
+
+def bench_dbscan(x_train, x_test, y_train, y_test, n_jobs):
+    import sklearn.cluster
+
+    x_train = x_train[:DBSCAN_MAX_SAMPLES]
+    start = timer()
+    model = sklearn.cluster.DBSCAN(eps=5.0, min_samples=10, n_jobs=n_jobs).fit(x_train)
+    fit_time = timer() - start
+
+    labels = model.labels_
+    return ({'fit': fit_time},
+            {'n_samples': len(x_train),
+             'n_clusters': len(set(labels)) - (1 if -1 in labels else 0),
+             'n_noise': int(np.count_nonzero(labels == -1))})
+
+
+def bench_pca(x_train, x_test, y_train, y_test, n_jobs):
+    import sklearn.decomposition
+
+    start = timer()
+    model = sklearn.decomposition.PCA(n_components=50, random_state=123).fit(x_train)
+    fit_time = timer() - start
+
+    start = timer()
+    model.transform(x_test)
+    transform_time = timer() - start
+
+    return ({'fit': fit_time, 'transform': transform_time},
+            {'explained_variance_ratio': float(model.explained_variance_ratio_.sum())})
+
+
+def bench_logistic_regression(x_train, x_test, y_train, y_test, n_jobs):
+    import sklearn.linear_model
+
+    start = timer()
+    model = sklearn.linear_model.LogisticRegression(max_iter=200).fit(x_train, y_train)
+    fit_time = timer() - start
+
+    start = timer()
+    accuracy = model.score(x_test, y_test)
+    predict_time = timer() - start
+
+    return {'fit': fit_time, 'predict': predict_time}, {'accuracy': float(accuracy)}
+
+
+def bench_random_forest(x_train, x_test, y_train, y_test, n_jobs):
+    import sklearn.ensemble
+
+    start = timer()
+    model = sklearn.ensemble.RandomForestClassifier(n_estimators=100, random_state=123,
+                                                    n_jobs=n_jobs).fit(x_train, y_train)
+    fit_time = timer() - start
+
+    start = timer()
+    accuracy = model.score(x_test, y_test)
+    predict_time = timer() - start
+
+    return {'fit': fit_time, 'predict': predict_time}, {'accuracy': float(accuracy)}
+
+
+def bench_knn(x_train, x_test, y_train, y_test, n_jobs):
+    import sklearn.neighbors
+
+    start = timer()
+    model = sklearn.neighbors.KNeighborsClassifier(n_neighbors=5, n_jobs=n_jobs).fit(x_train,
+                                                                                    y_train)
+    fit_time = timer() - start
+
+    start = timer()
+    accuracy = model.score(x_test, y_test)
+    predict_time = timer() - start
+
+    return {'fit': fit_time, 'predict': predict_time}, {'accuracy': float(accuracy)}
+
+
+ALGORITHMS = {
+    'kmeans': bench_kmeans,
+    'dbscan': bench_dbscan,
+    'pca': bench_pca,
+    'logistic_regression': bench_logistic_regression,
+    'random_forest': bench_random_forest,
+    'knn': bench_knn,
+}
+
+
+def set_implementation(implementation):
+    if implementation == 'sklearnex':
+        from sklearnex import patch_sklearn
+        patch_sklearn()
+    else:
+        try:
+            from sklearnex import unpatch_sklearn
+            unpatch_sklearn()
+        except ImportError:
+            pass
+
+
+def limit_threads(threads, implementation):
+    """Return a context manager that limits the OpenMP/BLAS thread pools to `threads` (no limit
+    if `threads` is None)."""
+    from threadpoolctl import threadpool_limits
+
+    if threads and implementation == 'sklearnex':
+        # oneDAL (used by sklearnex) has its own thread pool
+        import daal4py
+        daal4py.daalinit(threads)
+    return threadpool_limits(limits=threads)
+
+
+def summarize(values):
+    return {
+        'mean': statistics.fmean(values),
+        'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'min': min(values),
+        'max': max(values),
+        'runs': values,
+    }
+
+
+def run_benchmark(bench, data, threads, warmup, repeat):
+    for _ in range(warmup):
+        bench(*data, n_jobs=threads)
+
+    peak_rss_per_run = reset_peak_rss()
+    stage_times = {}
+    for _ in range(repeat):
+        times, metrics = bench(*data, n_jobs=threads)
+        for stage, value in times.items():
+            stage_times.setdefault(stage, []).append(value)
+
+    return {
+        'stages': {stage: summarize(values) for stage, values in stage_times.items()},
+        'metrics': metrics,
+        'peak_rss_kb': get_peak_rss_kb(),
+        'peak_rss_scope': 'run' if peak_rss_per_run else 'process',
+    }
+
+
+def parse_list(value, item_type=str):
+    return [item_type(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scikit-learn benchmark suite.')
+    parser.add_argument('--data-dir', default='data',
+        help='Directory with the dataset (default: %(default)s)')
+    parser.add_argument('--loader', choices=LOADERS, default='auto',
+        help='How to read the dataset: `mmap` maps it into memory, `stream` reads it sequentially '
+             'in chunks (use for encrypted files); `auto` uses `stream` inside Gramine and `mmap` '
+             'otherwise (default: %(default)s)')
+    parser.add_argument('--chunk-rows', type=int, default=4096,
+        help='Number of samples processed at once while preparing the dataset; also determines '
+             'the read size of the `stream` loader (default: %(default)s)')
+    parser.add_argument('--dtype', choices=('float32', 'float64'), default='float32',
+        help='Floating-point type of the prepared dataset (default: %(default)s)')
+    parser.add_argument('--algorithms', type=parse_list, default=list(ALGORITHMS),
+        help='Comma-separated list of algorithms (default: ' + ','.join(ALGORITHMS) + ')')
+    parser.add_argument('--implementations', type=parse_list, default=list(IMPLEMENTATIONS),
+        help='Comma-separated list of implementations (default: ' + ','.join(IMPLEMENTATIONS) +
+             ')')
+    parser.add_argument('--threads', type=lambda value: parse_list(value, int), default=[None],
+        help='Comma-separated list of thread counts to sweep over (default: no limit)')
+    parser.add_argument('--sizes', type=lambda value: parse_list(value, int), default=[None],
+        help='Comma-separated list of dataset sizes (number of samples, including the 10%% test '
+             'split) to sweep over (default: whole dataset)')
+    parser.add_argument('--warmup', type=int, default=1,
+        help='Number of warm-up runs of each benchmark (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='Number of measured runs of each benchmark (default: %(default)s)')
+    parser.add_argument('--label', default=None,
+        help='Label stored in the results, e.g. to tell apart the runs (default: environment)')
+    parser.add_argument('--output', default='-',
+        help='File to write the JSON results to, `-` for stdout (default: %(default)s)')
+    args = parser.parse_args()
+
+    for algorithm in args.algorithms:
+        if algorithm not in ALGORITHMS:
+            parser.error(f'unknown algorithm `{algorithm}`')
+    for implementation in args.implementations:
+        if implementation not in IMPLEMENTATIONS:
+            parser.error(f'unknown implementation `{implementation}`')
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error('--repeat must be at least 1 and --warmup must not be negative')
+    if args.chunk_rows < 1:
+        parser.error('--chunk-rows must be at least 1')
+
+    import sklearn
+
+    environment = detect_environment()
+    loader = args.loader
+    if loader == 'auto':
+        loader = 'mmap' if environment == 'native' else 'stream'
+
+    start = timer()
+    X, y = load_dataset(args.data_dir, loader, chunk_size=args.chunk_rows * 1024)
+    load_time = timer() - start
+    log(f'Loaded dataset from `{args.data_dir}` ({X.shape[0]} samples, {X.shape[1]} features, '
+        f'{X.dtype}) with `{loader}` loader in {load_time:.3f} s')
+
+    report = {
+        'label': args.label or environment,
+        'environment': environment,
+        'python': platform.python_version(),
+        'sklearn': sklearn.__version__,
+        'cpu_count': os.cpu_count(),
+        'omp_num_threads': os.environ.get('OMP_NUM_THREADS'),
+        'dataset': {
+            'path': args.data_dir,
+            'n_samples': X.shape[0],
+            'n_features': X.shape[1],
+            'dtype': str(X.dtype),
+            'loader': loader,
+            'load_time_s': load_time,
+            'peak_rss_kb': get_peak_rss_kb(),
+        },
+        'warmup': args.warmup,
+        'repeat': args.repeat,
+        'results': [],
+    }
+
+    for implementation in args.implementations:
+        try:
+            set_implementation(implementation)
+        except ImportError:
+            log(f'*** Skipping `{implementation}` (not installed) ***')
+            continue
+        if implementation == 'sklearnex':
+            import sklearnex
+            report['sklearnex'] = getattr(sklearnex, '__version__', None)
+
+        for size in args.sizes:
+            n_samples = min(size, X.shape[0]) if size else X.shape[0]
+            start = timer()
+            data = split_dataset(X, y, n_samples, args.dtype, args.chunk_rows)
+            prepare_time = timer() - start
+            for threads in args.threads:
+                with limit_threads(threads, implementation):
+                    for algorithm in args.algorithms:
+                        result = run_benchmark(ALGORITHMS[algorithm], data, threads, args.warmup,
+                                               args.repeat)
+                        result.update({
+                            'implementation': implementation,
+                            'algorithm': algorithm,
+                            'n_samples': n_samples,
+                            'dtype': args.dtype,
+                            'prepare_time_s': prepare_time,
+                            'threads': threads,
+                        })
+                        report['results'].append(result)
+
+                        stages = ', '.join(f'{stage} {times["mean"]:.3f} ± {times["stdev"]:.3f} s'
+                                           for stage, times in result['stages'].items())
+                        log(f'{implementation} {algorithm} (samples: {n_samples}, threads: '
+                            f'{threads or "default"}): {stages}, peak RSS: '
+                            f'{result["peak_rss_kb"]} KiB')
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=4)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+            f.write('\n')
+    log('Scikit-learn perf evaluation finished')
+
+if __name__ == '__main__':
+    main()
@@ -5,47 +5,56 @@
 set -e
 MY_PATH=$(dirname "$0")
 pushd ${MY_PATH}
-
-if [ ! -d serving ]; then
-    git clone https://github.com/tensorflow/serving.git
-fi
+source ../../../util/artifact_cache.sh
 
 export TF_SERVING_ROOT=$(pwd)/serving
 export TF_SERVING_IMAGE_FINAL=tf-serving-base
 
-if [ -d /tmp/resnet ]; then
-    rm -rf /tmp/resnet
-fi
-mkdir -p /tmp/resnet
-resnet_checksum=c2c94887e54f8427716569385bc055d9e12e1608e8c65247fa5297d3f5ddc1bc
-if [ ! -f resnet_v1_fp32_savedmodel_NCHW_jpg.tar.gz ]; then
-    wget http://download.tensorflow.org/models/official/20181001_resnet/savedmodels/resnet_v1_fp32_savedmodel_NCHW_jpg.tar.gz || exit
-    sha256sum resnet_v1_fp32_savedmodel_NCHW_jpg.tar.gz > hash_resnet.txt
-    grep $resnet_checksum hash_resnet.txt
-    if [ $? -ne 0 ]; then
-        echo "File resnet_v1_fp32_savedmodel_NCHW_jpg.tar.gz checksum failure"
-        rm -f resnet_v1_fp32_savedmodel_NCHW_jpg.tar.gz
-        exit
+# The models are generated from (and cached for) the current commit of the repository, which is
+# only cloned to generate the models that are not in the artifact cache yet
+TF_SERVING_REPO=https://github.com/tensorflow/serving.git
+TF_SERVING_COMMIT=$(artifact_latest_commit $TF_SERVING_REPO)
+clone_serving () {
+    if [ ! -d serving ]; then
+        git clone $TF_SERVING_REPO
     fi
-fi
-tar --strip-components=2 -C /tmp/resnet -xvzf resnet_v1_fp32_savedmodel_NCHW_jpg.tar.gz
+    git -C serving fetch origin $TF_SERVING_COMMIT
+    git -C serving checkout --detach $TF_SERVING_COMMIT
+}
 
 if [ -d models ]; then
     rm -rf models
 fi
-mkdir -p models
-mv /tmp/resnet models/resnet
+mkdir -p models/resnet
 
-if [ -d /tmp/mnist ]; then
-    rm -rf /tmp/mnist
-fi
-pushd ${TF_SERVING_ROOT}
-tools/run_in_docker.sh python tensorflow_serving/example/mnist_saved_model.py /tmp/mnist
-popd
-mv /tmp/mnist models/mnist
+resnet_checksum=c2c94887e54f8427716569385bc055d9e12e1608e8c65247fa5297d3f5ddc1bc
+resnet_archive=resnet_v1_fp32_savedmodel_NCHW_jpg.tar.gz
+artifact_fetch \
+    http://download.tensorflow.org/models/official/20181001_resnet/savedmodels/$resnet_archive \
+    $resnet_checksum $resnet_archive
+tar --strip-components=2 -C models/resnet -xvzf $resnet_archive
+rm -f $resnet_archive
+
+export_mnist_model () {
+    clone_serving
+    if [ -d /tmp/mnist ]; then
+        rm -rf /tmp/mnist
+    fi
+    pushd ${TF_SERVING_ROOT}
+    tools/run_in_docker.sh python tensorflow_serving/example/mnist_saved_model.py /tmp/mnist
+    popd
+    mv /tmp/mnist models/mnist
+}
+artifact_run $TF_SERVING_REPO@$TF_SERVING_COMMIT:mnist_saved_model models/mnist \
+    export_mnist_model
 
-mkdir models/half_plus_two
-cp -r $TF_SERVING_ROOT/tensorflow_serving/servables/tensorflow/testdata/saved_model_half_plus_two_mkl/* models/half_plus_two
+copy_half_plus_two_model () {
+    clone_serving
+    mkdir models/half_plus_two
+    cp -r $TF_SERVING_ROOT/tensorflow_serving/servables/tensorflow/testdata/saved_model_half_plus_two_mkl/* models/half_plus_two
+}
+artifact_run $TF_SERVING_REPO@$TF_SERVING_COMMIT:saved_model_half_plus_two_mkl \
+    models/half_plus_two copy_half_plus_two_model
 
 docker build \
     -f Dockerfile \